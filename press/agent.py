@@ -5,13 +5,18 @@ from __future__ import annotations
 import _io  # type: ignore
 import json
 import os
+import random
+import threading
+import time
+from collections import Counter
 from contextlib import suppress
 from datetime import date
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Literal
 
 import frappe
 import requests
 from frappe.utils.password import get_decrypted_password
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
 
 from press.utils import get_mariadb_root_password, log_error, sanitize_config
@@ -24,6 +29,176 @@ if TYPE_CHECKING:
 	from press.press.doctype.site.site import Site
 
 
+class AgentSessionPool:
+	"""Process wide keep-alive sessions, one per agent
+
+	Each session carries the agent's auth header and CA bundle so they aren't
+	looked up on every request. Credentials are re-read every `auth_ttl`
+	seconds and the session is rebuilt if they have changed.
+	"""
+
+	max_sessions = 1024
+	pool_maxsize = 4
+	auth_ttl = 300
+
+	def __init__(self):
+		self.sessions = {}
+		self.stats = Counter()
+		self.lock = threading.Lock()
+
+	def get(self, server_type: str, server: str) -> requests.Session:
+		key = (frappe.local.site, server_type, server)
+		entry = self.sessions.get(key)
+		if entry and entry.expires_at > time.monotonic():
+			self.stats["hits"] += 1
+			return entry.session
+
+		password = get_decrypted_password(server_type, server, "agent_password")
+		verify = get_agent_ca_bundle()
+		if entry and entry.password == password and entry.verify == verify:
+			entry.expires_at = time.monotonic() + self.auth_ttl
+			self.stats["hits"] += 1
+			return entry.session
+
+		self.stats["misses"] += 1
+		session = requests.Session()
+		session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize))
+		session.headers["Authorization"] = f"bearer {password}"
+		session.verify = verify
+
+		with self.lock:
+			self._close(self.sessions.pop(key, None))
+			if len(self.sessions) >= self.max_sessions:
+				self._close(self.sessions.pop(next(iter(self.sessions))))
+			self.sessions[key] = frappe._dict(
+				session=session,
+				password=password,
+				verify=verify,
+				expires_at=time.monotonic() + self.auth_ttl,
+			)
+		return session
+
+	def evict(self, server_type: str, server: str):
+		with self.lock:
+			self._close(self.sessions.pop((frappe.local.site, server_type, server), None))
+
+	def _close(self, entry):
+		if entry:
+			self.stats["handshakes"] += self._count_connections(entry.session)
+			entry.session.close()
+
+	def _count_connections(self, session: requests.Session) -> int:
+		pools = session.get_adapter("https://").poolmanager.pools
+		# RecentlyUsedContainer can't be iterated over directly
+		return sum(pools[key].num_connections for key in pools.keys())  # noqa: SIM118
+
+	def get_stats(self) -> dict:
+		"""Return hits, misses and TLS handshakes made by this process"""
+		handshakes = self.stats["handshakes"] + sum(
+			self._count_connections(entry.session) for entry in list(self.sessions.values())
+		)
+		return {"hits": self.stats["hits"], "misses": self.stats["misses"], "handshakes": handshakes}
+
+
+agent_sessions = AgentSessionPool()
+
+
+class AgentCircuitBreaker:
+	"""Skip requests to agents that have been failing
+
+	Open circuits are the "Agent Request Failure" records, read from the database
+	at most once every `ttl` seconds. Once the backoff since the record's last failed
+	request has passed, the circuit is half open and a single probe request is let through. The record is
+	removed when the probe gets a response from the agent.
+	"""
+
+	cache_key = "agent_request_failures"
+	ttl = 30
+	base_backoff = 30
+	max_backoff = 30 * 60
+	probe_timeout = 60
+
+	def get_failures(self) -> dict:
+		failures = frappe.cache.get_value(self.cache_key)
+		if failures is None:
+			failures = {
+				failure.server: failure
+				for failure in frappe.get_all(
+					"Agent Request Failure",
+					["server", "failure_count", "last_failure_at", "creation"],
+					order_by="creation asc",
+				)
+			}
+			frappe.cache.set_value(self.cache_key, failures, expires_in_sec=self.ttl)
+		return failures
+
+	def invalidate(self):
+		frappe.cache.delete_value(self.cache_key)
+
+	def get_backoff(self, server: str, failure_count: int) -> float:
+		backoff = min(self.base_backoff * 2 ** min(failure_count - 1, 16), self.max_backoff)
+		# Jitter is stable for a server and failure count, so the state doesn't flap between calls
+		return backoff * random.Random(f"{server}:{failure_count}").uniform(0.8, 1.2)
+
+	def get_state(self, server: str) -> Literal["Closed", "Open", "Half Open"]:
+		failure = self.get_failures().get(server)
+		if not failure:
+			return "Closed"
+
+		backoff = self.get_backoff(server, failure.failure_count)
+		# Not `modified`, remove_old_failures keeps updating failure_count while the agent is down
+		last_failure_at = failure.last_failure_at or failure.creation
+		if frappe.utils.time_diff_in_seconds(frappe.utils.now_datetime(), last_failure_at) < backoff:
+			return "Open"
+		return "Half Open"
+
+	def allow_request(self, server: str) -> bool:
+		state = self.get_state(server)
+		if state == "Closed":
+			return True
+		if state == "Open":
+			return False
+
+		probes = frappe.flags.setdefault("agent_probes", set())
+		if server in probes:
+			return True
+
+		# Only one caller gets to probe a half open circuit
+		if frappe.cache.set(self.get_probe_key(server), 1, nx=True, ex=self.probe_timeout):
+			probes.add(server)
+			return True
+		return False
+
+	def record_success(self, server: str):
+		probes = frappe.flags.get("agent_probes") or set()
+		if server not in probes:
+			return
+
+		probes.discard(server)
+		frappe.db.delete("Agent Request Failure", {"server": server})
+		frappe.cache.delete(self.get_probe_key(server))
+		self.invalidate()
+
+	def record_failure(self, server: str):
+		(frappe.flags.get("agent_probes") or set()).discard(server)
+		frappe.cache.delete(self.get_probe_key(server))
+		self.invalidate()
+
+	def get_probe_key(self, server: str) -> str:
+		return frappe.cache.make_key(f"agent_request_probe:{server}")
+
+
+agent_circuit_breaker = AgentCircuitBreaker()
+
+
+def get_agent_ca_bundle():
+	intermediate_ca = frappe.db.get_value("Press Settings", "Press Settings", "backbone_intermediate_ca")
+	if frappe.conf.developer_mode and intermediate_ca:
+		root_ca = frappe.db.get_value("Certificate Authority", intermediate_ca, "parent_authority")
+		return frappe.get_doc("Certificate Authority", root_ca).certificate_file
+	return True
+
+
 class Agent:
 	if TYPE_CHECKING:
 		from typing import Optional
@@ -746,25 +921,37 @@ class Agent:
 		return self.request("POST", path, data, raises=raises)
 
 	def _make_req(self, method, path, data, files, agent_job_id):
-		password = get_decrypted_password(self.server_type, self.server, "agent_password")
-		headers = {"Authorization": f"bearer {password}", "X-Agent-Job-Id": agent_job_id}
+		streams = {
+			key: value for key, value in (files or {}).items() if isinstance(value, _io.BufferedReader)
+		}
+		# Uploads from streams can only be retried if they can be read again from the start
+		can_retry = all(stream.seekable() for stream in streams.values())
+		positions = {key: stream.tell() for key, stream in streams.items()} if can_retry else {}
+
+		response = self._send(method, path, data, files, agent_job_id)
+		if response.status_code == 401:
+			# Agent password might have been rotated, retry once with fresh credentials
+			agent_sessions.evict(self.server_type, self.server)
+			if can_retry:
+				for key, position in positions.items():
+					streams[key].seek(position)
+				response = self._send(method, path, data, files, agent_job_id)
+		return response
+
+	def _send(self, method, path, data, files, agent_job_id):
+		session = agent_sessions.get(self.server_type, self.server)
+		headers = {"X-Agent-Job-Id": agent_job_id}
 		url = f"https://{self.server}:{self.port}/agent/{path}"
-		intermediate_ca = frappe.db.get_value("Press Settings", "Press Settings", "backbone_intermediate_ca")
-		if frappe.conf.developer_mode and intermediate_ca:
-			root_ca = frappe.db.get_value("Certificate Authority", intermediate_ca, "parent_authority")
-			verify = frappe.get_doc("Certificate Authority", root_ca).certificate_file
-		else:
-			verify = True
 		if files:
 			file_objects = {
 				key: value
-				if isinstance(value, _io.BufferedReader)
+				if isinstance(value, (_io.BufferedReader, bytes))
 				else frappe.get_doc("File", {"file_url": url}).get_content()
 				for key, value in files.items()
 			}
 			file_objects["json"] = json.dumps(data).encode()
-			return requests.request(method, url, headers=headers, files=file_objects, verify=verify)
-		return requests.request(method, url, headers=headers, json=data, verify=verify, timeout=(10, 30))
+			return session.request(method, url, headers=headers, files=file_objects)
+		return session.request(method, url, headers=headers, json=data, timeout=(10, 30))
 
 	def request(self, method, path, data=None, files=None, agent_job=None, raises=True):
 		self.raise_if_past_requests_have_failed()
@@ -772,6 +959,7 @@ class Agent:
 		try:
 			agent_job_id = agent_job.name if agent_job else None
 			response = self._make_req(method, path, data, files, agent_job_id)
+			agent_circuit_breaker.record_success(self.server)
 			json_response = response.json()
 			if raises and response.status_code >= 400:
 				output = "\n\n".join([json_response.get("output", ""), json_response.get("traceback", "")])
@@ -796,9 +984,14 @@ class Agent:
 			)
 
 	def raise_if_past_requests_have_failed(self):
-		failures = frappe.db.get_value("Agent Request Failure", {"server": self.server}, "failure_count")
-		if failures:
-			raise AgentRequestSkippedException(f"Previous {failures} requests have failed. Try again later.")
+		if not agent_circuit_breaker.allow_request(self.server):
+			# The failure may have been cleared since allow_request looked at it
+			failure = agent_circuit_breaker.get_failures().get(self.server)
+			if failure:
+				message = f"Previous {failure.failure_count} requests have failed. Try again later."
+			else:
+				message = "Previous requests have failed. Try again later."
+			raise AgentRequestSkippedException(message)
 
 	def log_request_failure(self, exc):
 		filters = {
@@ -809,7 +1002,9 @@ class Agent:
 		)
 		if failure:
 			frappe.db.set_value(
-				"Agent Request Failure", failure.name, "failure_count", failure.failure_count + 1
+				"Agent Request Failure",
+				failure.name,
+				{"failure_count": failure.failure_count + 1, "last_failure_at": frappe.utils.now_datetime()},
 			)
 		else:
 			fields = filters
@@ -819,23 +1014,24 @@ class Agent:
 					"traceback": frappe.get_traceback(with_context=True),
 					"error": repr(exc),
 					"failure_count": 1,
+					"last_failure_at": frappe.utils.now_datetime(),
 				}
 			)
 			frappe.new_doc("Agent Request Failure", **fields).insert(ignore_permissions=True)
+		agent_circuit_breaker.record_failure(self.server)
 
 	def raw_request(self, method, path, data=None, raises=True, timeout=None):
 		url = f"https://{self.server}:{self.port}/agent/{path}"
-		password = get_decrypted_password(self.server_type, self.server, "agent_password")
-		headers = {"Authorization": f"bearer {password}"}
 		timeout = timeout or (10, 30)
-		response = requests.request(method, url, headers=headers, json=data, timeout=timeout)
+		session = agent_sessions.get(self.server_type, self.server)
+		response = session.request(method, url, json=data, timeout=timeout)
 		json_response = response.json()
 		if raises:
 			response.raise_for_status()
 		return json_response
 
 	def should_skip_requests(self):
-		return bool(frappe.db.count("Agent Request Failure", {"server": self.server}))
+		return not agent_circuit_breaker.allow_request(self.server)
 
 	def handle_request_failure(self, agent_job, result: Response | None):
 		if not agent_job:
@@ -1099,6 +1295,38 @@ Response: {reason or getattr(result, "text", "Unknown")}
 
 		return None
 
+	def start_build_context_upload(self, dc_name: str, data: dict) -> dict | None:
+		"""
+		Starts or resumes a chunked build context upload. Returns checksums
+		of the chunks the build server already has, keyed by chunk index.
+		"""
+		return self.request("POST", f"builder/upload/{dc_name}/chunks", data=data)
+
+	def upload_build_context_chunk(
+		self, dc_name: str, index: int, chunk: bytes, checksum: str
+	) -> dict | None:
+		return self.request(
+			"POST",
+			f"builder/upload/{dc_name}/chunks/{index}",
+			data={"checksum": checksum},
+			files={"chunk": chunk},
+		)
+
+	def complete_build_context_upload(self, dc_name: str, data: dict) -> str | None:
+		if res := self.request("POST", f"builder/upload/{dc_name}/complete", data=data):
+			return res.get("filename")
+
+		return None
+
+	def get_missing_build_context_blobs(self, digests: list[str]) -> list[str] | None:
+		if res := self.request("POST", "builder/blobs/missing", data={"digests": digests}):
+			return res.get("missing", [])
+
+		return None
+
+	def upload_build_context_blob(self, digest: str, file: "BufferedReader") -> bool:
+		return bool(self.request("POST", f"builder/blobs/{digest}", files={"blob": file}))
+
 	def run_build(self, data: dict):
 		reference_name = data.get("deploy_candidate")
 		return self.create_agent_job(
@@ -3,16 +3,20 @@
 
 from __future__ import annotations
 
+import hashlib
+import json
+import time
 from contextlib import suppress
 from datetime import datetime, timedelta
 from enum import Enum
+from functools import partial
 from typing import TYPE_CHECKING, Final, TypedDict
 
 import frappe
 import requests
 import sqlparse
 from elasticsearch import Elasticsearch
-from elasticsearch_dsl import A, Search
+from elasticsearch_dsl import A, MultiSearch, Search
 from frappe.utils import (
 	convert_utc_to_timezone,
 	flt,
@@ -30,7 +34,9 @@ from press.press.report.binary_log_browser.binary_log_browser import (
 from press.press.report.mariadb_slow_queries.mariadb_slow_queries import execute, normalize_query
 
 if TYPE_CHECKING:
-	from elasticsearch_dsl.response import AggResponse
+	from collections.abc import Callable
+
+	from elasticsearch_dsl.response import AggResponse, Response
 	from elasticsearch_dsl.response.aggs import FieldBucket, FieldBucketData
 
 	class Dataset(TypedDict):
@@ -60,6 +66,168 @@ class FilterByResource(Enum):
 	SERVER = "server"
 
 
+ELASTICSEARCH_CLIENT_TTL = 5 * 60
+_elasticsearch_clients = {}
+
+
+def get_elasticsearch_client() -> Elasticsearch | None:
+	"""Return the log server's client, shared by all requests in this worker process
+
+	The client keeps its own connection pool. The password is re-read every
+	`ELASTICSEARCH_CLIENT_TTL` seconds and the client rebuilt if it has changed.
+	"""
+	log_server = frappe.db.get_single_value("Press Settings", "log_server", cache=True)
+	if not log_server:
+		return None
+
+	key = (frappe.local.site, log_server)
+	cached = _elasticsearch_clients.get(key)
+	if cached and cached.expires_at > time.monotonic():
+		return cached.client
+
+	password = str(get_decrypted_password("Log Server", log_server, "kibana_password"))
+	if not cached or cached.password != password:
+		client = Elasticsearch(
+			f"https://{log_server}/elasticsearch", basic_auth=("frappe", password), connections_per_node=10
+		)
+		cached = frappe._dict(client=client, password=password)
+		_elasticsearch_clients[key] = cached
+
+	cached.expires_at = time.monotonic() + ELASTICSEARCH_CLIENT_TTL
+	return cached.client
+
+
+def run_searches(searches: dict[str, tuple[Search, Callable[[Response], dict]] | None]) -> dict:
+	"""Run searches in a single `_msearch` round trip and parse their responses
+
+	`searches` maps result keys to a `(search, parse)` pair, where `parse` turns the
+	search's response into the result. Keys mapped to None are returned as None.
+	"""
+	results = {key: None for key, search in searches.items() if not search}
+	pending = {key: search for key, search in searches.items() if search}
+	if not pending:
+		return results
+
+	multi_search = MultiSearch(using=get_elasticsearch_client(), index="filebeat-*")
+	for search, _ in pending.values():
+		multi_search = multi_search.add(search)
+
+	for (key, (_, parse)), response in zip(pending.items(), multi_search.execute()):
+		results[key] = parse(response=response)
+	return results
+
+
+def run_search(search: tuple[Search, Callable[[Response], dict]] | None):
+	if not search:
+		return {"datasets": [], "labels": []}
+
+	search, parse = search
+	return parse(response=search.execute())
+
+
+ANALYTICS_INGESTION_LAG = 5 * 60
+ANALYTICS_RESULT_TTL = 5 * 60
+
+
+def get_bucketed_values(key: str, timespan: int, timegrain: int, fetch: Callable[[int, int], dict]) -> dict:
+	"""Return values of `timegrain` wide buckets covering the last `timespan` seconds
+
+	Buckets start at multiples of `timegrain` since epoch. Buckets that ended more than
+	`ANALYTICS_INGESTION_LAG` seconds ago are sealed and kept in cache, so `fetch(start,
+	end)` is only called for buckets from the first one that isn't cached yet. It must
+	return a map of bucket start timestamps to bucket values. Empty buckets are None.
+	"""
+	now = int(time.time())
+	first = (now - timespan) // timegrain * timegrain
+	cache_key = f"analytics_buckets:{key}:{timegrain}"
+
+	cached = frappe.cache.get_value(cache_key) or {}
+	buckets = {start: value for start, value in cached.items() if start >= first}
+
+	fetch_from = first
+	while fetch_from in buckets:
+		fetch_from += timegrain
+
+	if fetch_from <= now:
+		buckets.update({start: None for start in range(fetch_from, now + 1, timegrain)})
+		buckets.update(fetch(fetch_from, now))
+
+	sealed = {
+		start: value for start, value in buckets.items() if start + timegrain <= now - ANALYTICS_INGESTION_LAG
+	}
+	if sealed != cached:
+		frappe.cache.set_value(cache_key, sealed, expires_in_sec=timespan)
+
+	return dict(sorted(buckets.items()))
+
+
+def get_bucket_aligned_result(key: str, timegrain: int, fn: Callable[[], dict]) -> dict:
+	"""Cache results that can't be merged bucket by bucket, e.g. top N aggregations
+
+	The result is kept until its newest bucket has moved on, or for at most
+	`ANALYTICS_RESULT_TTL` seconds while that bucket is still open.
+	"""
+	bucket = int(time.time()) // timegrain
+	cache_key = f"analytics_result:{key}:{timegrain}:{bucket}"
+	result = frappe.cache.get_value(cache_key)
+	if result is None:
+		result = fn()
+		frappe.cache.set_value(cache_key, result, expires_in_sec=min(timegrain, ANALYTICS_RESULT_TTL))
+	return result
+
+
+def get_prometheus_steps(query: str, start: int, end: int, timegrain: int) -> dict:
+	"""Map bucket starts to `{metric: value}` for the buckets between `start` and `end` that have ended"""
+	from press.utils.prometheus import prometheus
+
+	# A step evaluated at `t` covers the bucket (t - timegrain, t]
+	if start + timegrain > end:
+		return {}
+
+	buckets = {}
+	for series in prometheus.query_range(query, start + timegrain, end, f"{timegrain}s"):
+		metric = json.dumps(series["metric"], sort_keys=True)
+		for timestamp, value in series["values"]:
+			buckets.setdefault(int(timestamp) - timegrain, {})[metric] = value
+	return buckets
+
+
+def get_prometheus_range(query: str, timespan: int, timegrain: int) -> list[dict]:
+	"""Run a range query with sealed steps served from cache
+
+	Returns `[{"metric": {...}, "values": [(timestamp, value), ...]}]` like the
+	`result` of a query_range response, evaluated at multiples of `timegrain`.
+	The open tail bucket is evaluated at the current time instead.
+	"""
+	from press.utils.prometheus import prometheus
+
+	if not frappe.db.get_single_value("Press Settings", "monitor_server"):
+		return []
+
+	evaluated_at = {}
+
+	def fetch(start: int, end: int) -> dict:
+		buckets = get_prometheus_steps(query, start, end, timegrain)
+		# The open tail bucket has no step yet. It isn't sealed, so get_bucketed_values doesn't cache it
+		tail = end // timegrain * timegrain
+		if tail < end:
+			buckets[tail] = {
+				json.dumps(series["metric"], sort_keys=True): series["value"][1]
+				for series in prometheus.query(query, end)
+			}
+			evaluated_at[tail] = end
+		return buckets
+
+	key = f"prometheus:{hashlib.sha1(query.encode()).hexdigest()}"
+	series = {}
+	for start, values in get_bucketed_values(key, timespan, timegrain, fetch).items():
+		timestamp = evaluated_at.get(start, start + timegrain)
+		for metric, value in (values or {}).items():
+			series.setdefault(metric, []).append((timestamp, value))
+
+	return [{"metric": json.loads(metric), "values": values} for metric, values in series.items()]
+
+
 @frappe.whitelist()
 @protected("Site")
 def get(name, timezone, duration="7d"):
@@ -96,25 +264,34 @@ def get_advanced_analytics(name, timezone, duration="7d"):
 		"15d": (15 * 24 * 60 * 60, 6 * 60 * 60),
 	}[duration]
 
-	job_data = get_usage(name, "job", timezone, timespan, timegrain)
+	return get_bucket_aligned_result(
+		f"advanced:{name}:{timezone}",
+		timegrain,
+		lambda: _get_advanced_analytics(name, timezone, timespan, timegrain),
+	)
+
+
+def _get_advanced_analytics(name, timezone, timespan, timegrain):
+	args = (timezone, timespan, timegrain)
+	results = run_searches(
+		{
+			"request_count_by_path": get_request_by_search(name, "count", *args),
+			"request_duration_by_path": get_request_by_search(name, "duration", *args),
+			"average_request_duration_by_path": get_request_by_search(name, "average_duration", *args),
+			"background_job_count_by_method": get_background_job_by_method_search(name, "count", *args),
+			"background_job_duration_by_method": get_background_job_by_method_search(name, "duration", *args),
+			"average_background_job_duration_by_method": get_background_job_by_method_search(
+				name, "average_duration", *args
+			),
+			"slow_logs_by_count": get_slow_logs_search(name, "count", *args),
+			"slow_logs_by_duration": get_slow_logs_search(name, "duration", *args),
+			"job_data": get_usage_search(name, "job", *args),
+		}
+	)
+	job_data = results.pop("job_data") or []
 
 	return {
-		"request_count_by_path": get_request_by_(name, "count", timezone, timespan, timegrain),
-		"request_duration_by_path": get_request_by_(name, "duration", timezone, timespan, timegrain),
-		"average_request_duration_by_path": get_request_by_(
-			name, "average_duration", timezone, timespan, timegrain
-		),
-		"background_job_count_by_method": get_background_job_by_method(
-			name, "count", timezone, timespan, timegrain
-		),
-		"background_job_duration_by_method": get_background_job_by_method(
-			name, "duration", timezone, timespan, timegrain
-		),
-		"average_background_job_duration_by_method": get_background_job_by_method(
-			name, "average_duration", timezone, timespan, timegrain
-		),
-		"slow_logs_by_count": get_slow_logs(name, "count", timezone, timespan, timegrain),
-		"slow_logs_by_duration": get_slow_logs(name, "duration", timezone, timespan, timegrain),
+		**{key: chart or {"datasets": [], "labels": []} for key, chart in results.items()},
 		"job_count": [{"value": r.count, "date": r.date} for r in job_data],
 		"job_cpu_time": [{"value": r.duration, "date": r.date} for r in job_data],
 	}
@@ -172,30 +349,13 @@ def get_rounded_boundaries(timespan: int, timegrain: int, timezone: str = "UTC")
 
 
 def get_uptime(site, timezone, timespan, timegrain):
-	monitor_server = frappe.db.get_single_value("Press Settings", "monitor_server")
-	if not monitor_server:
-		return []
-
-	url = f"https://{monitor_server}/prometheus/api/v1/query_range"
-	password = get_decrypted_password("Monitor Server", monitor_server, "grafana_password")
-
-	end = datetime.now(pytz_timezone(timezone))
-	start = frappe.utils.add_to_date(end, seconds=-timespan)
-	query = {
-		"query": (
-			f'sum(sum_over_time(probe_success{{job="site", instance="{site}"}}[{timegrain}s])) by (instance) / sum(count_over_time(probe_success{{job="site", instance="{site}"}}[{timegrain}s])) by (instance)'
-		),
-		"start": start.timestamp(),
-		"end": end.timestamp(),
-		"step": f"{timegrain}s",
-	}
-
-	response = requests.get(url, params=query, auth=("frappe", password)).json()
+	query = f'sum(sum_over_time(probe_success{{job="site", instance="{site}"}}[{timegrain}s])) by (instance) / sum(count_over_time(probe_success{{job="site", instance="{site}"}}[{timegrain}s])) by (instance)'
+	result = get_prometheus_range(query, timespan, timegrain)
 
 	buckets = []
-	if not response["data"]["result"]:
+	if not result:
 		return []
-	for timestamp, value in response["data"]["result"][0]["values"]:
+	for timestamp, value in result[0]["values"]:
 		buckets.append(
 			frappe._dict(
 				{
@@ -230,8 +390,9 @@ def get_stacked_histogram_chart_result(
 	timegrain: int,
 	to_s_divisor: float = 1e6,
 	normalize_slow_logs: bool = False,
+	response: Response | None = None,
 ) -> dict[str, list[Dataset] | list[datetime]]:
-	aggs: AggResponse = search.execute().aggregations
+	aggs: AggResponse = (response or search.execute()).aggregations
 
 	timegrain_delta = timedelta(seconds=timegrain)
 	labels = [start + i * timegrain_delta for i in range((end - start) // timegrain_delta + 1)]
@@ -273,6 +434,12 @@ def get_stacked_histogram_chart_result(
 
 
 def get_request_by_(name, query_type, timezone, timespan, timegrain, filter_by=FilterByResource.SITE):
+	return run_search(get_request_by_search(name, query_type, timezone, timespan, timegrain, filter_by))
+
+
+def get_request_by_search(
+	name, query_type, timezone, timespan, timegrain, filter_by=FilterByResource.SITE
+) -> tuple[Search, Callable[[Response], dict]] | None:
 	"""
 	:param name: site/server name depending on filter_by
 	:param query_type: count, duration, average_duration
@@ -283,16 +450,12 @@ def get_request_by_(name, query_type, timezone, timespan, timegrain, filter_by=F
 	"""
 	MAX_NO_OF_PATHS = 10
 
-	log_server = frappe.db.get_single_value("Press Settings", "log_server")
-	if not log_server:
-		return {"datasets": [], "labels": []}
-
-	url = f"https://{log_server}/elasticsearch"
-	password = get_decrypted_password("Log Server", log_server, "kibana_password")
+	es = get_elasticsearch_client()
+	if not es:
+		return None
 
 	start, end = get_rounded_boundaries(timespan, timegrain, timezone)
 
-	es = Elasticsearch(url, basic_auth=("frappe", password))
 	search = (
 		Search(using=es, index="filebeat-*")
 		.filter("match_phrase", json__transaction_type="request")
@@ -357,22 +520,24 @@ def get_request_by_(name, query_type, timezone, timespan, timegrain, filter_by=F
 
 		search.aggs["method_path"].bucket("outside_avg", avg_of_duration)  # for sorting
 
-	return get_stacked_histogram_chart_result(search, query_type, start, end, timegrain)
+	return search, partial(get_stacked_histogram_chart_result, search, query_type, start, end, timegrain)
 
 
 def get_background_job_by_method(site, query_type, timezone, timespan, timegrain):
-	MAX_NO_OF_PATHS = 10
+	return run_search(get_background_job_by_method_search(site, query_type, timezone, timespan, timegrain))
 
-	log_server = frappe.db.get_single_value("Press Settings", "log_server")
-	if not log_server:
-		return {"datasets": [], "labels": []}
 
-	url = f"https://{log_server}/elasticsearch"
-	password = get_decrypted_password("Log Server", log_server, "kibana_password")
+def get_background_job_by_method_search(
+	site, query_type, timezone, timespan, timegrain
+) -> tuple[Search, Callable[[Response], dict]] | None:
+	MAX_NO_OF_PATHS = 10
+
+	es = get_elasticsearch_client()
+	if not es:
+		return None
 
 	start, end = get_rounded_boundaries(timespan, timegrain, timezone)
 
-	es = Elasticsearch(url, basic_auth=("frappe", password))
 	search = (
 		Search(using=es, index="filebeat-*")
 		.filter("match_phrase", json__site=site)
@@ -433,24 +598,28 @@ def get_background_job_by_method(site, query_type, timezone, timespan, timegrain
 
 		search.aggs["method_path"].bucket("outside_avg", avg_of_duration)  # for sorting
 
-	return get_stacked_histogram_chart_result(search, query_type, start, end, timegrain)
+	return search, partial(get_stacked_histogram_chart_result, search, query_type, start, end, timegrain)
 
 
 def get_slow_logs(
 	name, query_type, timezone, timespan, timegrain, filter_by=FilterByResource.SITE, normalize=False
 ):
-	MAX_NO_OF_PATHS = 10
+	return run_search(
+		get_slow_logs_search(name, query_type, timezone, timespan, timegrain, filter_by, normalize)
+	)
 
-	log_server = frappe.db.get_single_value("Press Settings", "log_server")
-	if not log_server:
-		return {"datasets": [], "labels": []}
 
-	url = f"https://{log_server}/elasticsearch/"
-	password = str(get_decrypted_password("Log Server", log_server, "kibana_password"))
+def get_slow_logs_search(
+	name, query_type, timezone, timespan, timegrain, filter_by=FilterByResource.SITE, normalize=False
+) -> tuple[Search, Callable[[Response], dict]] | None:
+	MAX_NO_OF_PATHS = 10
+
+	es = get_elasticsearch_client()
+	if not es:
+		return None
 
 	start, end = get_rounded_boundaries(timespan, timegrain, timezone)
 
-	es = Elasticsearch(url, basic_auth=("frappe", password))
 	search = (
 		Search(using=es, index="filebeat-*")
 		.filter(
@@ -475,7 +644,7 @@ def get_slow_logs(
 	elif filter_by == FilterByResource.SERVER:
 		search = search.filter("match", agent__name=name)
 	else:
-		return {"datasets": [], "labels": []}
+		return None
 
 	histogram_of_method = A(
 		"date_histogram",
@@ -510,23 +679,26 @@ def get_slow_logs(
 		).bucket("histogram_of_method", histogram_of_method).bucket("sum_of_duration", sum_of_duration)
 		search.aggs["method_path"].bucket("outside_sum", sum_of_duration)
 
-	return get_stacked_histogram_chart_result(
-		search, query_type, start, end, timegrain, to_s_divisor=1e9, normalize_slow_logs=normalize
+	return search, partial(
+		get_stacked_histogram_chart_result,
+		search,
+		query_type,
+		start,
+		end,
+		timegrain,
+		to_s_divisor=1e9,
+		normalize_slow_logs=normalize,
 	)
 
 
 def get_run_doc_method_methodnames(site, query_type, timezone, timespan, timegrain):
 	MAX_NO_OF_PATHS = 10
 
-	log_server = frappe.db.get_single_value("Press Settings", "log_server")
-	if not log_server:
+	es = get_elasticsearch_client()
+	if not es:
 		return {"datasets": [], "labels": []}
 
-	url = f"https://{log_server}/elasticsearch"
-	password = get_decrypted_password("Log Server", log_server, "kibana_password")
-
 	start, end = get_rounded_boundaries(timespan, timegrain, timezone)
-	es = Elasticsearch(url, basic_auth=("frappe", password))
 	search = (
 		Search(using=es, index="filebeat-*")
 		.filter("match_phrase", json__site=site)
@@ -594,15 +766,11 @@ def get_run_doc_method_methodnames(site, query_type, timezone, timespan, timegra
 def get_query_report_run_reports(site, query_type, timezone, timespan, timegrain):
 	MAX_NO_OF_PATHS = 10
 
-	log_server = frappe.db.get_single_value("Press Settings", "log_server")
-	if not log_server:
+	es = get_elasticsearch_client()
+	if not es:
 		return {"datasets": [], "labels": []}
 
-	url = f"https://{log_server}/elasticsearch"
-	password = get_decrypted_password("Log Server", log_server, "kibana_password")
-
 	start, end = get_rounded_boundaries(timespan, timegrain, timezone)
-	es = Elasticsearch(url, basic_auth=("frappe", password))
 	search = (
 		Search(using=es, index="filebeat-*")
 		.filter("match_phrase", json__site=site)
@@ -670,16 +838,12 @@ def get_query_report_run_reports(site, query_type, timezone, timespan, timegrain
 def get_generate_report_reports(site, query_type, timezone, timespan, timegrain):
 	MAX_NO_OF_PATHS = 10
 
-	log_server = frappe.db.get_single_value("Press Settings", "log_server")
-	if not log_server:
+	es = get_elasticsearch_client()
+	if not es:
 		return {"datasets": [], "labels": []}
 
-	url = f"https://{log_server}/elasticsearch"
-	password = get_decrypted_password("Log Server", log_server, "kibana_password")
-
 	start, end = get_rounded_boundaries(timespan, timegrain, timezone)
 
-	es = Elasticsearch(url, basic_auth=("frappe", password))
 	search = (
 		Search(using=es, index="filebeat-*")
 		.filter("match_phrase", json__site=site)
@@ -745,12 +909,48 @@ def get_generate_report_reports(site, query_type, timezone, timespan, timegrain)
 
 
 def get_usage(site, type, timezone, timespan, timegrain):
-	log_server = frappe.db.get_single_value("Press Settings", "log_server")
-	if not log_server:
-		return {"datasets": [], "labels": []}
+	if not get_elasticsearch_client():
+		return []
 
-	url = f"https://{log_server}/elasticsearch/filebeat-*/_search"
-	password = get_decrypted_password("Log Server", log_server, "kibana_password")
+	def fetch(start: int, end: int) -> dict:
+		search, _ = get_usage_search(site, type, timezone, timespan, timegrain, start=start, end=end)
+		response = search.execute().to_dict()
+		if not response.get("aggregations"):
+			return {}
+
+		return {
+			int(bucket["key"] / 1000): {
+				"count": bucket["count"]["value"],
+				"duration": bucket["duration"]["value"],
+				"max": bucket["max"]["value"],
+			}
+			for bucket in response["aggregations"]["date_histogram"]["buckets"]
+		}
+
+	buckets = get_bucketed_values(f"usage:{site}:{type}", timespan, timegrain, fetch)
+	return [
+		frappe._dict(
+			{
+				"date": convert_utc_to_timezone(datetime.utcfromtimestamp(start), timezone),
+				**bucket,
+			}
+		)
+		for start, bucket in buckets.items()
+		if bucket
+	]
+
+
+def get_usage_search(
+	site, type, timezone, timespan, timegrain, start=None, end=None
+) -> tuple[Search, Callable[[Response], list]] | None:
+	es = get_elasticsearch_client()
+	if not es:
+		return None
+
+	if start is None:
+		timestamp_range = {"gte": f"now-{timespan}s", "lte": "now"}
+	else:
+		timestamp_range = {"gte": start * 1000, "lte": end * 1000, "format": "epoch_millis"}
 
 	query = {
 		"aggs": {
@@ -772,18 +972,22 @@ def get_usage(site, type, timezone, timespan, timegrain):
 				"filter": [
 					{"match_phrase": {"json.transaction_type": type}},
 					{"match_phrase": {"json.site": site}},
-					{"range": {"@timestamp": {"gte": f"now-{timespan}s", "lte": "now"}}},
+					{"range": {"@timestamp": timestamp_range}},
 				]
 			}
 		},
 	}
 
-	response = requests.post(url, json=query, auth=("frappe", password)).json()
+	search = Search(using=es, index="filebeat-*").update_from_dict(query)
+	return search, partial(get_usage_result, timezone=timezone)
+
 
+def get_usage_result(response: Response, timezone) -> list:
+	response = response.to_dict()
 	buckets = []
 
 	if not response.get("aggregations"):
-		return {"datasets": [], "labels": []}
+		return []
 
 	for bucket in response["aggregations"]["date_histogram"]["buckets"]:
 		buckets.append(
@@ -8,12 +8,15 @@ from datetime import timezone as tz
 from typing import TYPE_CHECKING
 
 import frappe
-import requests
 from frappe.utils import convert_utc_to_timezone, flt
-from frappe.utils.password import get_decrypted_password
 
 from press.api.bench import all as all_benches
-from press.api.site import protected
+from press.api.site import (
+	get_cached_docs,
+	get_cluster_region_info,
+	get_tags_by_parent,
+	protected,
+)
 from press.press.doctype.site_plan.plan import Plan
 from press.press.doctype.team.team import get_child_team_members
 from press.utils import get_current_team
@@ -91,14 +94,18 @@ def all(server_filter=None):  # noqa: C901
 	# union isn't supported in qb for run method
 	# https://github.com/frappe/frappe/issues/15609
 	servers = frappe.db.sql(query.get_sql(), as_dict=True)
+
+	names = [server.name for server in servers]
+	plan_names = dict(
+		frappe.get_all("Server", {"name": ("in", names)}, ["name", "plan"], as_list=True) if names else []
+	)
+	plans = get_cached_docs("Server Plan", list(plan_names.values()))
+	tags = get_tags_by_parent(names)
 	for server in servers:
-		server_plan_name = frappe.get_value("Server", server.name, "plan")
-		server["plan"] = frappe.get_doc("Server Plan", server_plan_name) if server_plan_name else None
+		server["plan"] = plans.get(plan_names.get(server.name))
 		server["app_server"] = f"f{server.name[1:]}"
-		server["tags"] = frappe.get_all("Resource Tag", {"parent": server.name}, pluck="tag_name")
-		server["region_info"] = frappe.db.get_value(
-			"Cluster", server.cluster, ["title", "image"], as_dict=True
-		)
+		server["tags"] = tags[server.name]
+		server["region_info"] = get_cluster_region_info(server.cluster)
 	return servers
 
 
@@ -341,7 +348,7 @@ avg by (instance) (
 		),
 	}
 
-	return prometheus_query(query_map[query][0], query_map[query][1], timezone, timespan, timegrain)
+	return cached_prometheus_query(query_map[query][0], query_map[query][1], timezone, timespan, timegrain)
 
 
 @frappe.whitelist()
@@ -365,49 +372,63 @@ def get_slow_logs_by_site(name, query, timezone, duration, normalize=False):
 
 
 def prometheus_query(query, function, timezone, timespan, timegrain):
-	monitor_server = frappe.db.get_single_value("Press Settings", "monitor_server")
-	if not monitor_server:
-		return {"datasets": [], "labels": []}
-
-	url = f"https://{monitor_server}/prometheus/api/v1/query_range"
-	password = get_decrypted_password("Monitor Server", monitor_server, "grafana_password")
+	from press.utils.prometheus import prometheus
 
 	end = datetime.utcnow().replace(tzinfo=tz.utc)
 	start = frappe.utils.add_to_date(end, seconds=-timespan)
-	query = {
-		"query": query,
-		"start": start.timestamp(),
-		"end": end.timestamp(),
-		"step": f"{timegrain}s",
-	}
-
-	response = requests.get(url, params=query, auth=("frappe", password)).json()
+	result = prometheus.query_range(query, start.timestamp(), end.timestamp(), f"{timegrain}s")
 
 	datasets = []
 	labels = []
 
-	if not response["data"]["result"]:
+	if not result:
 		return {"datasets": datasets, "labels": labels}
 
-	for timestamp, _ in response["data"]["result"][0]["values"]:
+	for timestamp, _ in result[0]["values"]:
 		labels.append(
 			convert_utc_to_timezone(
 				datetime.fromtimestamp(timestamp, tz=tz.utc).replace(tzinfo=None), timezone
 			)
 		)
 
-	for index in range(len(response["data"]["result"])):
+	for series in result:
 		dataset = {
-			"name": function(response["data"]["result"][index]["metric"]),
+			"name": function(series["metric"]),
 			"values": [],
 		}
-		for _, value in response["data"]["result"][index]["values"]:
+		for _, value in series["values"]:
 			dataset["values"].append(flt(value, 2))
 		datasets.append(dataset)
 
 	return {"datasets": datasets, "labels": labels}
 
 
+def cached_prometheus_query(query, function, timezone, timespan, timegrain):
+	"""Same as `prometheus_query`, but steps are aligned to `timegrain` and sealed ones served from cache"""
+	from press.api.analytics import get_prometheus_range
+
+	result = get_prometheus_range(query, timespan, timegrain)
+	timestamps = sorted({timestamp for series in result for timestamp, _ in series["values"]})
+
+	datasets = []
+	for series in result:
+		values = dict(series["values"])
+		datasets.append(
+			{
+				"name": function(series["metric"]),
+				"values": [
+					flt(values[timestamp], 2) if timestamp in values else None for timestamp in timestamps
+				],
+			}
+		)
+
+	labels = [
+		convert_utc_to_timezone(datetime.fromtimestamp(timestamp, tz=tz.utc).replace(tzinfo=None), timezone)
+		for timestamp in timestamps
+	]
+	return {"datasets": datasets, "labels": labels}
+
+
 @frappe.whitelist()
 def options():
 	if not get_current_team(get_doc=True).servers_enabled:
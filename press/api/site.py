@@ -40,6 +40,7 @@ from press.utils import (
 from press.press.doctype.configuration_import.sheet_importer import get_sheet_importer
 
 if TYPE_CHECKING:
+	from frappe.model.document import Document
 	from frappe.types import DF
 
 	from press.press.doctype.bench.bench import Bench
@@ -1009,15 +1010,12 @@ def all(site_filter=None):
 
 	sites = get_sites_query(site_filter, benches_with_updates).run(as_dict=True)
 
+	plans = get_cached_docs("Site Plan", [site.plan for site in sites])
+	tags = get_tags_by_parent([site.name for site in sites])
 	for site in sites:
-		site.server_region_info = get_server_region_info(site)
-		site_plan_name = frappe.get_value("Site", site.name, "plan")
-		site.plan = frappe.get_doc("Site Plan", site_plan_name) if site_plan_name else None
-		site.tags = frappe.get_all(
-			"Resource Tag",
-			{"parent": site.name},
-			pluck="tag_name",
-		)
+		site.server_region_info = get_cluster_region_info(site.cluster)
+		site.plan = plans.get(site.plan)
+		site.tags = tags[site.name]
 		if site.bench in benches_with_updates:
 			site.update_available = True
 
@@ -1048,6 +1046,7 @@ def get_sites_query(site_filter, benches_with_updates):
 			Site.team,
 			Site.cluster,
 			Site.group,
+			Site.plan,
 			ReleaseGroup.title,
 			ReleaseGroup.version,
 			ReleaseGroup.public,
@@ -1393,7 +1392,36 @@ def get_installed_apps(site, query_filters: dict | None = None):
 
 def get_server_region_info(site) -> dict:
 	"""Return a Dict with `title` and `image`"""
-	return frappe.db.get_value("Cluster", site.cluster, ["title", "image"], as_dict=True)
+	return get_cluster_region_info(site.cluster)
+
+
+def get_cluster_region_info(cluster: str | None) -> dict | None:
+	"""Return a Dict with `title` and `image` from the document cache"""
+	if not cluster:
+		return None
+
+	return frappe.get_cached_value("Cluster", cluster, ["title", "image"], as_dict=True)
+
+
+def get_cached_docs(doctype: str, names: list[str | None]) -> dict[str, Document]:
+	"""Return cached docs keyed by name, loading each distinct name once"""
+	return {name: frappe.get_cached_doc(doctype, name) for name in set(names) if name}
+
+
+def get_tags_by_parent(parents: list[str]) -> dict[str, list[str]]:
+	"""Return Resource Tag names of each parent using a single query"""
+	tags = {parent: [] for parent in parents}
+	if not parents:
+		return tags
+
+	for tag in frappe.get_all(
+		"Resource Tag",
+		{"parent": ("in", parents)},
+		["parent", "tag_name"],
+	):
+		tags[tag.parent].append(tag.tag_name)
+
+	return tags
 
 
 @frappe.whitelist()
@@ -0,0 +1,122 @@
+# Copyright (c) 2026, Frappe and Contributors
+# See license.txt
+
+from __future__ import annotations
+
+from unittest.mock import Mock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from press.api.analytics import ANALYTICS_INGESTION_LAG, get_bucketed_values, get_prometheus_range
+from press.utils.prometheus import prometheus
+
+
+class TestAnalyticsCache(FrappeTestCase):
+	def setUp(self):
+		self.key = f"test:{frappe.generate_hash(length=8)}"
+
+	@patch("press.api.analytics.time.time")
+	def test_sealed_buckets_are_not_fetched_again(self, mock_time):
+		timespan, timegrain = 6 * 60 * 60, 60 * 60
+		now = 1_700_000_000 // timegrain * timegrain + 30 * 60
+		mock_time.return_value = now
+
+		def fetch(start, end):
+			return {bucket: {"count": 1} for bucket in range(start, end + 1, timegrain)}
+
+		fetch = Mock(side_effect=fetch)
+		buckets = get_bucketed_values(self.key, timespan, timegrain, fetch)
+		first = (now - timespan) // timegrain * timegrain
+		fetch.assert_called_once_with(first, now)
+		self.assertEqual(list(buckets), list(range(first, now + 1, timegrain)))
+
+		mock_time.return_value = now + 60
+		get_bucketed_values(self.key, timespan, timegrain, fetch)
+
+		# Only buckets that hadn't ended `ANALYTICS_INGESTION_LAG` before the first call are fetched again
+		last_sealed = (now - ANALYTICS_INGESTION_LAG) // timegrain * timegrain - timegrain
+		fetch.assert_called_with(last_sealed + timegrain, now + 60)
+
+	@patch("press.api.analytics.time.time")
+	def test_empty_buckets_are_sealed(self, mock_time):
+		timespan, timegrain = 6 * 60 * 60, 60 * 60
+		now = 1_700_000_000 // timegrain * timegrain + 30 * 60
+		mock_time.return_value = now
+
+		fetch = Mock(return_value={})
+		buckets = get_bucketed_values(self.key, timespan, timegrain, fetch)
+		self.assertTrue(all(bucket is None for bucket in buckets.values()))
+
+		get_bucketed_values(self.key, timespan, timegrain, fetch)
+		self.assertEqual(fetch.call_args[0][0], now // timegrain * timegrain)
+
+	@patch("press.api.analytics.time.time")
+	@patch("press.api.analytics.frappe.db.get_single_value", new=Mock(return_value="monitor.frappe.cloud"))
+	def test_prometheus_range_includes_open_tail_bucket(self, mock_time):
+		timespan, timegrain = 6 * 60 * 60, 60 * 60
+		now = 1_700_000_000 // timegrain * timegrain + 30 * 60
+		mock_time.return_value = now
+		tail = now // timegrain * timegrain
+		metric = {"instance": "f1.frappe.cloud"}
+
+		with patch.object(
+			prometheus, "query_range", return_value=[{"metric": metric, "values": [[tail, "1"]]}]
+		), patch.object(prometheus, "query", return_value=[{"metric": metric, "value": [now, "2"]}]) as query:
+			result = get_prometheus_range(self.key, timespan, timegrain)
+			query.assert_called_once_with(self.key, now)
+			self.assertEqual(result[0]["values"][-2:], [(tail, "1"), (now, "2")])
+
+			get_prometheus_range(self.key, timespan, timegrain)
+			# The tail bucket isn't cached, so it's evaluated on every call
+			self.assertEqual(query.call_count, 2)
+
+
+class TestSlowQueryFingerprint(FrappeTestCase):
+	def test_queries_differing_only_in_values_share_fingerprint(self):
+		from press.press.report.mariadb_slow_queries.mariadb_slow_queries import fingerprint_query
+
+		queries = [
+			"select `name` from `tabUser` where `email` = 'a@example.com' and enabled = 1 order by creation desc",
+			"SELECT `name`  FROM `tabUser`\nWHERE `email`='it\\'s@example.com' AND enabled=0 ORDER BY creation ASC",
+			'SELECT `name` FROM `tabUser` /* from a job */ WHERE `email` = "b@example.com" AND enabled = -1',
+		]
+		fingerprints = {fingerprint_query(query) for query in queries[:2]}
+		self.assertEqual(
+			fingerprints,
+			{"SELECT `name` FROM `tabUser` WHERE `email` = ? AND enabled = ? ORDER BY creation ?"},
+		)
+		self.assertEqual(
+			fingerprint_query(queries[2]), "SELECT `name` FROM `tabUser` WHERE `email` = ? AND enabled = ?"
+		)
+
+	def test_lists_of_values_collapse(self):
+		from press.press.report.mariadb_slow_queries.mariadb_slow_queries import fingerprint_query
+
+		self.assertEqual(
+			fingerprint_query("select count(*) from `tabItem` where name in ('a', 'b', 'c') and x in (1)"),
+			"SELECT COUNT(*) FROM `tabItem` WHERE name IN (?) AND x IN (?)",
+		)
+		self.assertEqual(
+			fingerprint_query(
+				"insert into `tabItem` (`name`, `qty`) values ('a', 1), ('b', 2.5), ('c', -3);"
+			),
+			"INSERT INTO `tabItem`(`name`, `qty`) VALUES (?)",
+		)
+
+	def test_summary_groups_by_fingerprint(self):
+		from press.press.report.mariadb_slow_queries.mariadb_slow_queries import summarize_by_query
+
+		rows = [
+			{
+				"query": f"SELECT * FROM `tabUser` WHERE name = 'user{i}'",
+				"duration": 1.0,
+				"rows_examined": 10,
+				"rows_sent": 1,
+			}
+			for i in range(3)
+		]
+		summary = summarize_by_query(rows)
+		self.assertEqual(len(summary), 1)
+		self.assertEqual(summary[0]["count"], 3)
+		self.assertEqual(summary[0]["duration"], 3.0)
@@ -1019,3 +1019,20 @@ class TestAPISiteList(unittest.TestCase):
 
 	def test_list_tagged_sites(self):
 		self.assertEqual(all(site_filter={"status": "", "tag": "test_tag"}), [self.tagged_site_dict])
+
+	def test_list_sites_query_count_does_not_grow_with_sites(self):
+		from press.press.doctype.press_tag.test_press_tag import create_and_add_test_tag
+
+		def count_queries():
+			all()  # Warm up the document cache
+			with patch.object(frappe.db, "sql", wraps=frappe.db.sql) as sql:
+				all()
+			return sql.call_count
+
+		queries = count_queries()
+		for _ in range(5):
+			site = create_test_site(bench=self.tagged_site_dict["bench"])
+			create_and_add_test_tag(site.name, "Site", "other_tag")
+
+		self.assertEqual(len(all()), 8)
+		self.assertEqual(count_queries(), queries)
@@ -1,15 +1,33 @@
 # Copyright (c) 2024, Frappe Technologies Pvt. Ltd. and Contributors
 # For license information, please see license.txt
 
+import time
+
 import frappe
-from frappe.utils import cint
+from frappe.query_builder.functions import Avg, Max
+from frappe.utils import add_to_date, cint
+from frappe.utils.background_jobs import get_queues
 from prometheus_client import (
 	CollectorRegistry,
 	Gauge,
 	generate_latest,
 )
+from pypika.terms import CustomFunction
 from werkzeug.wrappers import Response
 
+from press.press.doctype.agent_job.agent_job import AGENT_JOB_IN_FLIGHT_KEY
+
+METRICS_SNAPSHOT_KEY = "press_metrics_snapshot"
+METRICS_REFRESH_LOCK_KEY = "press_metrics_refresh_lock"
+# Seconds between refreshes, override with `press_metrics_refresh_interval` in site config
+METRICS_REFRESH_INTERVAL = 60
+# A snapshot not refreshed for this many intervals is dropped and rebuilt on the next scrape
+METRICS_SNAPSHOT_EXPIRY_INTERVALS = 10
+# Durations are averaged over jobs created in this many seconds
+DURATION_WINDOW = 60 * 60
+
+TimeToSec = CustomFunction("TIME_TO_SEC", ["time"])
+
 
 class MetricsRenderer:
 	def __init__(self, path, status_code=None):
@@ -31,6 +49,50 @@ class MetricsRenderer:
 		for row in rows:
 			c.labels(row[status_field]).set(row.count)
 
+	def get_queue_lengths(self):
+		length = Gauge(
+			"press_rq_queue_length", "Jobs waiting in background queue", ["queue"], registry=self.registry
+		)
+		for queue in get_queues():
+			length.labels(queue.name.rsplit(":", 1)[-1]).set(queue.count)
+
+		in_flight = Gauge(
+			"press_agent_job_in_flight",
+			"Agent Jobs enqueued but not yet sent to the agent",
+			registry=self.registry,
+		)
+		in_flight.set(frappe.cache.zcard(frappe.cache.make_key(AGENT_JOB_IN_FLIGHT_KEY)))
+
+	def get_agent_job_durations(self):
+		average = Gauge(
+			"press_agent_job_duration_seconds_avg",
+			"Average duration of recent successful Agent Jobs",
+			["job_type"],
+			registry=self.registry,
+		)
+		maximum = Gauge(
+			"press_agent_job_duration_seconds_max",
+			"Longest duration of recent successful Agent Jobs",
+			["job_type"],
+			registry=self.registry,
+		)
+		job = frappe.qb.DocType("Agent Job")
+		rows = (
+			frappe.qb.from_(job)
+			.select(
+				job.job_type,
+				Avg(TimeToSec(job.duration)).as_("average"),
+				Max(TimeToSec(job.duration)).as_("maximum"),
+			)
+			.where(job.creation >= add_to_date(None, seconds=-DURATION_WINDOW))
+			.where(job.status == "Success")
+			.groupby(job.job_type)
+			.run(as_dict=True)
+		)
+		for row in rows:
+			average.labels(row.job_type).set(row.average or 0)
+			maximum.labels(row.job_type).set(row.maximum or 0)
+
 	def metrics(self):
 		suspended_builds = Gauge(
 			"press_builds_suspended", "Are docker builds suspended", registry=self.registry
@@ -68,6 +130,9 @@ class MetricsRenderer:
 			"press_agent_job_total", "Agent Job", filters={"status": ("!=", "Success")}
 		)
 
+		self.get_queue_lengths()
+		self.get_agent_job_durations()
+
 		return generate_latest(self.registry).decode("utf-8")
 
 	def can_render(self):
@@ -77,5 +142,55 @@ class MetricsRenderer:
 	def render(self):
 		response = Response()
 		response.mimetype = "text"
-		response.data = self.metrics()
+		response.data = get_metrics()
 		return response
+
+
+def get_refresh_interval() -> int:
+	return cint(frappe.conf.get("press_metrics_refresh_interval")) or METRICS_REFRESH_INTERVAL
+
+
+def acquire_refresh_lock(interval: int) -> bool:
+	"""Let one caller refresh the snapshot per `interval`. The lock is never released, only expires"""
+	return bool(frappe.cache.set(frappe.cache.make_key(METRICS_REFRESH_LOCK_KEY), 1, nx=True, ex=interval))
+
+
+def refresh_snapshot() -> dict:
+	snapshot = {"metrics": MetricsRenderer("metrics").metrics(), "refreshed_at": time.time()}
+	frappe.cache.set_value(
+		METRICS_SNAPSHOT_KEY,
+		snapshot,
+		expires_in_sec=get_refresh_interval() * METRICS_SNAPSHOT_EXPIRY_INTERVALS,
+	)
+	return snapshot
+
+
+def get_metrics() -> str:
+	"""Serve the last snapshot and refresh it in the background once it's older than the refresh interval
+
+	Scrapes don't touch the database. Only a missing snapshot is built inline, and
+	only by the scrape that gets the refresh lock; the others serve no metrics
+	until it's ready.
+	"""
+	interval = get_refresh_interval()
+	snapshot = frappe.cache.get_value(METRICS_SNAPSHOT_KEY)
+	if snapshot is None:
+		if not acquire_refresh_lock(interval):
+			return ""
+		snapshot = refresh_snapshot()
+	elif time.time() - snapshot["refreshed_at"] > interval and acquire_refresh_lock(interval):
+		frappe.enqueue(
+			"press.metrics.refresh_snapshot",
+			queue="short",
+			job_id="press_metrics_refresh_snapshot",
+			deduplicate=True,
+		)
+
+	registry = CollectorRegistry()
+	age = Gauge(
+		"press_metrics_snapshot_age_seconds",
+		"Seconds since these metrics were computed",
+		registry=registry,
+	)
+	age.set(time.time() - snapshot["refreshed_at"])
+	return snapshot["metrics"] + generate_latest(registry).decode("utf-8")
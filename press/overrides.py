@@ -11,7 +11,7 @@ from frappe.handler import is_whitelisted
 from frappe.utils import cint
 
 from press.runner import constants
-from press.utils import _get_current_team, _system_user
+from press.utils import _get_current_team, _system_user, clear_user_team_context
 
 
 @frappe.whitelist(allow_guest=True)
@@ -155,6 +155,11 @@ class CustomUser(User):
 		User = frappe.qb.DocType("User")
 		return query.where(User.name.isin(allowed_users))
 
+	def on_update(self):
+		super().on_update()
+		# Roles are part of the cached team context
+		clear_user_team_context(self.name)
+
 	def after_rename(self, old_name, new_name, merge=False):
 		"""
 		Changes:
@@ -2,8 +2,13 @@
 
 from __future__ import annotations
 
+import hashlib
+import heapq
 import json
+from array import array
+from bisect import bisect_left
 from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
 
 import frappe
 from frappe.utils import rounded
@@ -16,6 +21,9 @@ from press.press.doctype.subscription.subscription import (
 	sites_with_free_hosting,
 )
 
+if TYPE_CHECKING:
+	from collections.abc import Iterable, Iterator
+
 
 class Audit:
 	"""
@@ -259,45 +267,97 @@ class BackupRecordCheck(Audit):
 			self.log(log, "Success")
 
 
+class HashedKeySet:
+	"""
+	Compact set of keys, stored as a sorted array of 64 bit hashes.
+
+	Takes 8 bytes per key. Two keys can share a hash, but with tens of millions
+	of keys the chance of a false positive is below one in a million per lookup.
+	"""
+
+	run_length = 1_000_000  # no. of hashes sorted in memory at a time
+
+	def __init__(self, keys: Iterable[str]):
+		runs, run = [], []
+		for key in keys:
+			run.append(self.hash(key))
+			if len(run) >= self.run_length:
+				runs.append(array("Q", sorted(run)))
+				run = []
+		runs.append(array("Q", sorted(run)))
+		self.hashes = array("Q", heapq.merge(*runs))
+
+	@staticmethod
+	def hash(key: str) -> int:
+		return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+	def __contains__(self, key: str) -> bool:
+		digest = self.hash(key)
+		index = bisect_left(self.hashes, digest)
+		return index < len(self.hashes) and self.hashes[index] == digest
+
+	def __len__(self) -> int:
+		return len(self.hashes)
+
+
 class OffsiteBackupCheck(Audit):
 	"""Check if files for offsite backup exists on the offsite backup provider."""
 
 	audit_type = "Offsite Backup Check"
 	list_key = "Offsite Backup Remote Files unavailable in remote"
+	page_length = 5000
 
-	def _get_all_files_in_s3(self) -> list[str]:
-		all_files = []
+	def _get_all_files_in_s3(self) -> Iterator[str]:
 		settings = frappe.get_single("Press Settings")
 		s3 = settings.boto3_offsite_backup_session.resource("s3")
+		# Listing is paginated, keys are never held in memory all at once
 		for s3_object in s3.Bucket(settings.aws_s3_bucket).objects.all():
-			all_files.append(s3_object.key)
-		return all_files
+			yield s3_object.key
+
+	def _get_offsite_remote_files(self) -> Iterator[frappe._dict]:
+		"""Remote Files referenced by available offsite backups, one page of backups at a time."""
+		after = ""
+		while True:
+			backups = frappe.db.sql(
+				"""
+				SELECT
+					name, site, remote_database_file, remote_private_file, remote_public_file
+				FROM
+					`tabSite Backup`
+				WHERE
+					status = "Success" and
+					files_availability = "Available" and
+					offsite = True and
+					name > %s
+				ORDER BY name
+				LIMIT %s
+				""",
+				(after, self.page_length),
+				as_dict=True,
+			)
+			if not backups:
+				return
+			after = backups[-1].name
+
+			sites = {}
+			for backup in backups:
+				for field in ("remote_database_file", "remote_private_file", "remote_public_file"):
+					if backup[field]:
+						sites[backup[field]] = backup.site
+
+			for remote_file in frappe.get_all(
+				"Remote File", {"name": ("in", list(sites))}, ["name", "file_path"]
+			):
+				remote_file.site = sites[remote_file.name]
+				yield remote_file
 
 	def __init__(self):
 		log = {self.list_key: []}
-		status = "Success"
-		all_files = self._get_all_files_in_s3()
-		offsite_remote_files = frappe.db.sql(
-			"""
-			SELECT
-				remote_file.name, remote_file.file_path, site_backup.site
-			FROM
-				`tabRemote File` remote_file
-			JOIN
-				`tabSite Backup` site_backup
-			ON
-				site_backup.site = remote_file.site
-			WHERE
-				site_backup.status = "Success" and
-				site_backup.files_availability = "Available" and
-				site_backup.offsite = True
-			""",
-			as_dict=True,
-		)
-		for remote_file in offsite_remote_files:
-			if remote_file["file_path"] not in all_files:
-				status = "Failure"
+		all_files = HashedKeySet(self._get_all_files_in_s3())
+		for remote_file in self._get_offsite_remote_files():
+			if not remote_file.file_path or remote_file.file_path not in all_files:
 				log[self.list_key].append(remote_file)
+		status = "Failure" if log[self.list_key] else "Success"
 		self.log(log, status)
 
 
@@ -2,13 +2,14 @@
 # For license information, please see license.txt
 from __future__ import annotations
 
+import hmac
 import json
 import os
 import random
+import time
 import traceback
 
 import frappe
-from frappe.core.utils import find
 from frappe.model.document import Document
 from frappe.monitor import add_data_to_monitor
 from frappe.utils import (
@@ -19,8 +20,15 @@ from frappe.utils import (
 	get_datetime,
 	now_datetime,
 )
-
-from press.agent import Agent, AgentCallbackException, AgentRequestSkippedException
+from frappe.utils.password import get_decrypted_password
+
+from press.agent import (
+	Agent,
+	AgentCallbackException,
+	AgentRequestSkippedException,
+	agent_circuit_breaker,
+	agent_sessions,
+)
 from press.api.client import is_owned_by_team
 from press.press.doctype.agent_job_type.agent_job_type import (
 	get_retryable_job_types_and_max_retry_count,
@@ -31,9 +39,14 @@ from press.press.doctype.site_migration.site_migration import (
 	job_matches_site_migration,
 	process_site_migration_job_update,
 )
-from press.utils import has_role, log_error, timer
+from press.utils import bulk_set_values, has_role, log_error, timer
 
 AGENT_LOG_KEY = "agent-jobs"
+AGENT_JOB_PUSH_KEY = "agent_job_push_last_seen"
+AGENT_JOB_RECONCILE_KEY = "agent_job_reconciled_at"
+AGENT_SERVER_TYPES = ("Server", "Database Server", "Proxy Server")
+AGENT_JOB_IN_FLIGHT_KEY = "agent_job_in_flight"
+AGENT_JOB_IN_FLIGHT_TTL = 60 * 60  # jobs not picked up from the queue within this are assumed lost
 
 
 class AgentJob(Document):
@@ -145,16 +158,10 @@ class AgentJob(Document):
 		# self.enqueue_http_request()
 
 	def enqueue_http_request(self):
-		frappe.enqueue_doc(
-			self.doctype,
-			self.name,
-			"create_http_request",
-			timeout=600,
-			queue="short",
-			enqueue_after_commit=True,
-		)
+		enqueue_http_requests([self.name])
 
 	def create_http_request(self):
+		unmark_jobs_in_flight([self.name])
 		try:
 			agent = Agent(self.server, server_type=self.server_type)
 			if agent.should_skip_requests():
@@ -448,17 +455,37 @@ def poll_random_jobs(agent, pending_ids):
 
 @timer
 def handle_polled_jobs(polled_jobs, pending_jobs):
+	"""Reconcile a batch of polled jobs against their pending rows
+
+	Jobs whose status hasn't changed only need their steps updated, these are
+	written together in a single transaction. Jobs whose status changed (or
+	that stream output to their callbacks) are processed one at a time, so a
+	failing callback only rolls back its own job.
+	"""
+	pending_jobs_by_id = {job.job_id: job for job in pending_jobs}
+	polled_jobs = [job for job in polled_jobs if job and job["id"] in pending_jobs_by_id]
+	if not polled_jobs:
+		return
+
+	steps_by_job = get_active_steps([pending_jobs_by_id[job["id"]].name for job in polled_jobs])
+
+	unchanged_jobs = []
 	for polled_job in polled_jobs:
-		if not polled_job:
-			continue
-		handle_polled_job(pending_jobs, polled_job)
+		job = pending_jobs_by_id[polled_job["id"]]
+		steps = steps_by_job.get(job.name, [])
+		if job.status != polled_job["status"] or job.job_type in get_streaming_job_types():
+			handle_polled_job(job, polled_job, steps)
+		else:
+			unchanged_jobs.append((job, polled_job, steps))
+
+	handle_unchanged_polled_jobs(unchanged_jobs)
 
 
 def add_timer_data_to_monitor(server):
 	if not hasattr(frappe.local, "timers"):
 		frappe.local.timers = {}
 
-	add_data_to_monitor(server=server, timing=frappe.local.timers)
+	add_data_to_monitor(server=server, timing=frappe.local.timers, agent_sessions=agent_sessions.get_stats())
 
 
 def poll_pending_jobs_server(server):
@@ -471,7 +498,7 @@ def poll_pending_jobs_server(server):
 
 	pending_jobs = frappe.get_all(
 		"Agent Job",
-		fields=["name", "job_id", "status", "callback_failure_count"],
+		fields=["name", "job_id", "job_type", "status", "callback_failure_count"],
 		filters={
 			"status": ("in", ["Pending", "Running"]),
 			"job_id": ("!=", 0),
@@ -500,9 +527,16 @@ def poll_pending_jobs_server(server):
 	add_timer_data_to_monitor(server.server)
 
 
-def handle_polled_job(pending_jobs, polled_job):
-	job = find(pending_jobs, lambda x: x.job_id == polled_job["id"])
+def handle_polled_job(job, polled_job, steps):
 	try:
+		# Pushes and polls can bring the same update at once, the row lock lets
+		# only the first one apply it
+		status = frappe.db.get_value("Agent Job", job.name, "status", for_update=True)
+		if status not in ("Pending", "Running"):
+			frappe.db.rollback()
+			return
+		job.status = status
+
 		# Update Job Status
 		# If it is worthy of an update
 		if job.status != polled_job["status"]:
@@ -510,8 +544,8 @@ def handle_polled_job(pending_jobs, polled_job):
 			update_job(job.name, polled_job)
 
 		# Update Steps' Status
-		update_steps(job.name, polled_job)
-		populate_output_cache(polled_job, job)
+		update_steps(job.name, polled_job, steps)
+		populate_output_cache(polled_job, steps)
 
 		# Some callbacks rely on step statuses, e.g. archive_site
 		# so update step status before callbacks are processed
@@ -544,17 +578,54 @@ def handle_polled_job(pending_jobs, polled_job):
 		frappe.db.rollback()
 
 
-def populate_output_cache(polled_job, job):
-	if not cint(frappe.get_cached_value("Press Settings", None, "realtime_job_updates")):
+def handle_unchanged_polled_jobs(jobs):
+	"""Update steps of jobs whose status hasn't changed, callbacks aren't needed for these"""
+	step_updates = {}
+	for _, polled_job, steps in jobs:
+		step_updates.update(get_step_updates(polled_job, steps))
+
+	try:
+		bulk_set_values("Agent Job Step", step_updates)
+		for _, polled_job, steps in jobs:
+			populate_output_cache(polled_job, steps)
+		frappe.db.commit()
+	except Exception:
+		log_error("Agent Job Poll Exception", polled=[polled_job for _, polled_job, _ in jobs])
+		frappe.db.rollback()
 		return
-	steps = frappe.get_all(
+
+	realtime_job_updates = cint(frappe.get_cached_value("Press Settings", None, "realtime_job_updates"))
+	updated_jobs = {step.agent_job for _, _, steps in jobs for step in steps if step.name in step_updates}
+	for job, _, steps in jobs:
+		has_running_steps = any(step.status == "Running" for step in steps)
+		if job.name in updated_jobs or (realtime_job_updates and has_running_steps):
+			publish_update(job.name)
+
+
+def get_streaming_job_types() -> tuple[str]:
+	"""Return job types whose callbacks consume output of running jobs"""
+	return ("Run Remote Builder",)
+
+
+def get_active_steps(job_names: list[str]) -> dict[str, list]:
+	steps_by_job = {}
+	for step in frappe.get_all(
 		"Agent Job Step",
-		filters={"agent_job": job.name, "status": "Running"},
-		fields=["name", "step_name"],
-	)
+		fields=["name", "status", "step_name", "agent_job"],
+		filters={"agent_job": ("in", job_names), "status": ("in", ["Pending", "Running"])},
+		order_by="creation",
+	):
+		steps_by_job.setdefault(step.agent_job, []).append(step)
+	return steps_by_job
+
+
+def populate_output_cache(polled_job, steps):
+	if not cint(frappe.get_cached_value("Press Settings", None, "realtime_job_updates")):
+		return
+	polled_steps = {step["name"]: step for step in reversed(polled_job["steps"])}
 	for step in steps:
-		polled_step = find(polled_job["steps"], lambda x: x["name"] == step.step_name)
-		if polled_step:
+		polled_step = polled_steps.get(step.step_name)
+		if polled_step and polled_step["status"] == "Running":
 			lines = []
 			for command in polled_step.get("commands", []):
 				output = command.get("output", "").strip()
@@ -580,16 +651,42 @@ def filter_active_servers(servers):
 
 
 def filter_request_failures(servers):
-	request_failures = set(frappe.get_all("Agent Request Failure", pluck="server"))
-
+	# Servers with a half open circuit are polled, the poll acts as their probe
 	alive_servers = []
 	for server in servers:
-		if server.server not in request_failures:
+		if agent_circuit_breaker.get_state(server.server) != "Open":
 			alive_servers.append(server)
 
 	return alive_servers
 
 
+def filter_push_servers(servers):
+	"""Poll servers that push job updates only once per reconciliation interval
+
+	A server is considered push capable as long as it has pushed updates within the
+	last interval. If it stops pushing, it falls back to being polled every tick.
+	"""
+	interval = cint(
+		frappe.db.get_single_value("Press Settings", "agent_job_reconciliation_interval", cache=True)
+	)
+	if not interval:
+		return servers
+
+	now = time.time()
+	last_pushed = frappe.cache.hgetall(AGENT_JOB_PUSH_KEY)
+	last_reconciled = frappe.cache.hgetall(AGENT_JOB_RECONCILE_KEY)
+
+	servers_to_poll = []
+	for server in servers:
+		if now - last_pushed.get(server.server, 0) > interval:
+			servers_to_poll.append(server)
+		elif now - last_reconciled.get(server.server, 0) > interval:
+			frappe.cache.hset(AGENT_JOB_RECONCILE_KEY, server.server, now)
+			servers_to_poll.append(server)
+
+	return servers_to_poll
+
+
 def poll_pending_jobs():
 	filters = {"status": ("in", ["Pending", "Running", "Undelivered"])}
 	if random.random() > 0.1:
@@ -608,8 +705,9 @@ def poll_pending_jobs():
 
 	active_servers = filter_active_servers(servers)
 	alive_servers = filter_request_failures(active_servers)
+	servers_to_poll = filter_push_servers(alive_servers)
 
-	for server in alive_servers:
+	for server in servers_to_poll:
 		frappe.enqueue(
 			"press.press.doctype.agent_job.agent_job.poll_pending_jobs_server",
 			queue="short",
@@ -619,6 +717,45 @@ def poll_pending_jobs():
 		)
 
 
+@frappe.whitelist(allow_guest=True)
+def push_job_updates(server, server_type="Server", jobs=None):
+	"""Apply job and step updates pushed by an agent
+
+	`jobs` is a list of job payloads in the same shape as returned by the
+	agent's `jobs/<ids>` endpoint. The agent authenticates with its own
+	`agent_password` as a bearer token.
+	"""
+	if server_type not in AGENT_SERVER_TYPES:
+		frappe.throw("Not permitted", frappe.AuthenticationError)
+
+	password = get_decrypted_password(server_type, server, "agent_password", raise_exception=False)
+	authorization = frappe.get_request_header("Authorization") or ""
+	if not password or not hmac.compare_digest(authorization.encode(), f"bearer {password}".encode()):
+		frappe.throw("Not permitted", frappe.AuthenticationError)
+
+	jobs = [job for job in frappe.parse_json(jobs or []) if job and job.get("id")]
+	frappe.cache.hset(AGENT_JOB_PUSH_KEY, server, time.time())
+	if not jobs:
+		return
+
+	user = str(frappe.session.user)
+	try:
+		frappe.set_user("Administrator")
+		pending_jobs = frappe.get_all(
+			"Agent Job",
+			fields=["name", "job_id", "job_type", "status", "callback_failure_count"],
+			filters={
+				"status": ("in", ["Pending", "Running"]),
+				"job_id": ("in", [job["id"] for job in jobs]),
+				"server": server,
+				"server_type": server_type,
+			},
+		)
+		handle_polled_jobs(jobs, pending_jobs)
+	finally:
+		frappe.set_user(user)
+
+
 def fail_old_jobs():
 	def update_status(jobs: list[str], status: str):
 		for job in jobs:
@@ -718,30 +855,30 @@ def update_job(job_name, job):
 	)
 
 
-def update_steps(job_name, job):
-	step_names = [polled_step["name"] for polled_step in job["steps"]]
-	steps = frappe.db.get_all(
-		"Agent Job Step",
-		fields=["name", "status", "step_name"],
-		filters={
-			"agent_job": job_name,
-			"status": ("in", ["Pending", "Running"]),
-			"step_name": ("in", step_names),
-		},
-	)
-	for polled_step in job["steps"]:
-		step = find(steps, lambda x: x.step_name == polled_step["name"])
-		if not step:
-			continue
-
-		if step.status == polled_step["status"]:
-			continue
+def update_steps(job_name, job, steps=None):
+	if steps is None:
+		steps = get_active_steps([job_name]).get(job_name, [])
 
+	if step_updates := get_step_updates(job, steps):
 		lock_doc_updated_by_job(job_name)
-		update_step(step.name, polled_step)
+		bulk_set_values("Agent Job Step", step_updates)
+
+
+def get_step_updates(job, steps) -> dict[str, dict]:
+	steps_by_name = {}
+	for step in steps:
+		steps_by_name.setdefault(step.step_name, step)
+
+	step_updates = {}
+	for polled_step in job["steps"]:
+		step = steps_by_name.get(polled_step["name"])
+		if not step or step.status == polled_step["status"]:
+			continue
+		step_updates[step.name] = get_step_values(polled_step)
+	return step_updates
 
 
-def update_step(step_name, step):
+def get_step_values(step) -> dict:
 	step_data = json.dumps(step["data"], indent=4, sort_keys=True)
 
 	output = None
@@ -750,19 +887,15 @@ def update_step(step_name, step):
 		traceback = to_str(step["data"].get("traceback", ""))
 		output = to_str(step["data"].get("output", ""))
 
-	frappe.db.set_value(
-		"Agent Job Step",
-		step_name,
-		{
-			"start": step["start"],
-			"end": step["end"],
-			"duration": step["duration"],
-			"status": step["status"],
-			"data": step_data,
-			"output": output,
-			"traceback": traceback,
-		},
-	)
+	return {
+		"start": step["start"],
+		"end": step["end"],
+		"duration": step["duration"],
+		"status": step["status"],
+		"data": step_data,
+		"output": output,
+		"traceback": traceback,
+	}
 
 
 def skip_pending_steps(job_name):
@@ -799,32 +932,89 @@ def retry_undelivered_jobs(server):
 		if delivered_jobs:
 			update_job_ids_for_delivered_jobs(delivered_jobs)
 
-		undelivered_jobs = list(set(server_jobs[server]) - set(delivered_jobs))
+		delivered_job_names = {job["agent_job_id"] for job in delivered_jobs}
+		undelivered_jobs = list(set(server_jobs[server]) - delivered_job_names)
+		if undelivered_jobs:
+			retry_jobs(undelivered_jobs, max_retry_per_job_type, nowtime)
+
 
-		for job in undelivered_jobs:
-			job_doc = frappe.get_doc("Agent Job", job)
-			max_retry_count = max_retry_per_job_type[job_doc.job_type] or 0
+def retry_jobs(jobs: list[str], max_retry_per_job_type: dict, nowtime):
+	"""Re-enqueue undelivered `jobs` that are due, skipping the ones still in the queue"""
+	in_flight_jobs = get_jobs_in_flight(jobs)
+	jobs_to_retry = []
+	for job in frappe.get_all(
+		"Agent Job",
+		{"name": ("in", jobs)},
+		["name", "job_type", "next_retry_at", "retry_count"],
+	):
+		if job.name in in_flight_jobs:
+			# Retrying a job that is still waiting in the queue would deliver it twice
+			continue
 
-			if not job_doc.next_retry_at and job_doc.name not in queued_jobs():
-				job_doc.set_status_and_next_retry_at()
-				continue
+		if not job.next_retry_at:
+			frappe.get_doc("Agent Job", job.name).set_status_and_next_retry_at()
+			continue
 
-			if get_datetime(job_doc.next_retry_at) > nowtime:
-				continue
+		if get_datetime(job.next_retry_at) > nowtime:
+			continue
 
-			if job_doc.retry_count <= max_retry_count:
-				retry = job_doc.retry_count + 1
-				frappe.db.set_value("Agent Job", job, "retry_count", retry, update_modified=False)
-				job_doc.retry_in_place()
-			else:
-				update_job_and_step_status(job, "Delivery Failure")
-				process_job_updates(job)
+		max_retry_count = max_retry_per_job_type[job.job_type] or 0
+		if job.retry_count <= max_retry_count:
+			jobs_to_retry.append(job.name)
+		else:
+			update_job_and_step_status(job.name, "Delivery Failure")
+			process_job_updates(job.name)
+
+	if jobs_to_retry:
+		agent_job = frappe.qb.DocType("Agent Job")
+		frappe.qb.update(agent_job).set(agent_job.retry_count, agent_job.retry_count + 1).where(
+			agent_job.name.isin(jobs_to_retry)
+		).run()
+		enqueue_http_requests(jobs_to_retry)
+		frappe.db.commit()
+
+
+def enqueue_http_requests(jobs: list[str]):
+	"""Enqueue delivery of `jobs` to their agents once the transaction commits"""
+	# Marked before the enqueue callbacks run, so a job can't be picked up before it's marked
+	frappe.db.after_commit.add(lambda: mark_jobs_in_flight(jobs))
+	for job in jobs:
+		frappe.enqueue_doc(
+			"Agent Job",
+			job,
+			"create_http_request",
+			timeout=600,
+			queue="short",
+			enqueue_after_commit=True,
+		)
 
 
-def queued_jobs():
-	from frappe.utils.background_jobs import get_jobs
+def mark_jobs_in_flight(jobs: list[str]):
+	"""Record `jobs` as waiting in the queue for delivery
 
-	return get_jobs(site=frappe.local.site, queue="default", key="name")[frappe.local.site]
+	In flight jobs are kept in a sorted set scored by the time they were enqueued, so
+	entries of jobs that were lost from the queue expire on their own.
+	"""
+	key = frappe.cache.make_key(AGENT_JOB_IN_FLIGHT_KEY)
+	pipeline = frappe.cache.pipeline()
+	pipeline.zadd(key, {job: time.time() for job in jobs})
+	pipeline.expire(key, AGENT_JOB_IN_FLIGHT_TTL)
+	pipeline.execute()
+
+
+def unmark_jobs_in_flight(jobs: list[str]):
+	frappe.cache.pipeline().zrem(frappe.cache.make_key(AGENT_JOB_IN_FLIGHT_KEY), *jobs).execute()
+
+
+def get_jobs_in_flight(jobs: list[str]) -> set[str]:
+	"""Return the subset of `jobs` still waiting in the queue, in one round trip"""
+	key = frappe.cache.make_key(AGENT_JOB_IN_FLIGHT_KEY)
+	pipeline = frappe.cache.pipeline()
+	pipeline.zremrangebyscore(key, "-inf", time.time() - AGENT_JOB_IN_FLIGHT_TTL)
+	for job in jobs:
+		pipeline.zscore(key, job)
+	_, *scores = pipeline.execute()
+	return {job for job, score in zip(jobs, scores) if score is not None}
 
 
 def is_auto_retry_disabled(server):
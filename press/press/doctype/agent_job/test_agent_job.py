@@ -274,3 +274,131 @@ class TestAgentJob(unittest.TestCase):
 		self.assertEqual(in_execution_job.name, job.name)
 
 		frappe.db.set_single_value("Press Settings", "disable_agent_job_deduplication", True)
+
+	def test_pushed_job_updates_are_applied(self):
+		from .agent_job import push_job_updates
+
+		site = create_test_site()
+		job = frappe.get_last_doc("Agent Job", {"job_type": "New Site", "site": site.name})
+		job.db_set({"job_id": 4242, "status": "Pending"})
+		password = frappe.get_doc("Server", job.server).get_password("agent_password")
+
+		polled_job = {
+			"id": 4242,
+			"status": "Running",
+			"start": "2023-08-20 18:24:28.009786",
+			"end": None,
+			"duration": None,
+			"data": {},
+			"steps": [],
+		}
+		with patch(
+			"press.press.doctype.agent_job.agent_job.frappe.get_request_header",
+			return_value="bearer wrong-password",
+		):
+			self.assertRaises(frappe.AuthenticationError, push_job_updates, job.server, jobs=[polled_job])
+		self.assertEqual(frappe.db.get_value("Agent Job", job.name, "status"), "Pending")
+
+		with patch(
+			"press.press.doctype.agent_job.agent_job.frappe.get_request_header",
+			return_value=f"bearer {password}",
+		):
+			self.assertRaises(
+				frappe.AuthenticationError,
+				push_job_updates,
+				job.server,
+				server_type="Site",
+				jobs=[polled_job],
+			)
+
+		with patch(
+			"press.press.doctype.agent_job.agent_job.frappe.get_request_header",
+			return_value=f"bearer {password}",
+		), patch("press.press.doctype.agent_job.agent_job.process_job_updates"), patch(
+			"press.press.doctype.agent_job.agent_job.frappe.db.commit", new=Mock()
+		):
+			push_job_updates(job.server, jobs=json.dumps([polled_job]))
+		self.assertEqual(frappe.db.get_value("Agent Job", job.name, "status"), "Running")
+
+	def test_polled_job_finished_by_another_update_is_not_processed_again(self):
+		from .agent_job import handle_polled_job
+
+		site = create_test_site()
+		job = frappe.get_last_doc("Agent Job", {"job_type": "New Site", "site": site.name})
+		job.db_set({"job_id": 4444, "status": "Running"})
+		pending_job = frappe._dict(name=job.name, job_id=4444, status="Running", callback_failure_count=0)
+		# A concurrent push finished the job after this poll read it as Running
+		job.db_set("status", "Success")
+
+		polled_job = {"id": 4444, "status": "Success", "data": {}, "steps": []}
+		with patch(
+			"press.press.doctype.agent_job.agent_job.process_job_updates"
+		) as process_job_updates, patch(
+			"press.press.doctype.agent_job.agent_job.frappe.db.commit", new=Mock()
+		), patch("press.press.doctype.agent_job.agent_job.frappe.db.rollback", new=Mock()):
+			handle_polled_job(pending_job, polled_job, [])
+		process_job_updates.assert_not_called()
+
+	def test_unchanged_polled_job_updates_steps_without_callbacks(self):
+		from .agent_job import handle_polled_jobs
+
+		site = create_test_site()
+		job = frappe.get_last_doc("Agent Job", {"job_type": "New Site", "site": site.name})
+		job.db_set({"job_id": 4343, "status": "Running"})
+		step = frappe.get_all("Agent Job Step", {"agent_job": job.name}, ["name", "step_name"], limit=1)[0]
+
+		polled_job = {
+			"id": 4343,
+			"status": "Running",
+			"steps": [
+				{
+					"name": step.step_name,
+					"status": "Running",
+					"start": "2023-08-20 18:24:28.024885",
+					"end": None,
+					"duration": None,
+					"data": {},
+				}
+			],
+		}
+		pending_jobs = frappe.get_all(
+			"Agent Job",
+			{"name": job.name},
+			["name", "job_id", "job_type", "status", "callback_failure_count"],
+		)
+		with patch(
+			"press.press.doctype.agent_job.agent_job.process_job_updates"
+		) as process_job_updates, patch(
+			"press.press.doctype.agent_job.agent_job.frappe.db.commit", new=Mock()
+		):
+			handle_polled_jobs([polled_job], pending_jobs)
+
+		process_job_updates.assert_not_called()
+		self.assertEqual(frappe.db.get_value("Agent Job Step", step.name, "status"), "Running")
+
+	def test_retry_skips_jobs_still_in_queue(self):
+		from .agent_job import mark_jobs_in_flight, retry_jobs, unmark_jobs_in_flight
+
+		past = frappe.utils.add_to_date(frappe.utils.now_datetime(), minutes=-5)
+		jobs = []
+		for _ in range(2):
+			site = create_test_site()
+			job = frappe.get_last_doc("Agent Job", {"job_type": "New Site", "site": site.name})
+			job.db_set({"status": "Undelivered", "retry_count": 1, "next_retry_at": past})
+			jobs.append(job.name)
+		queued_job, due_job = jobs
+
+		mark_jobs_in_flight([queued_job])
+		try:
+			with patch(
+				"press.press.doctype.agent_job.agent_job.enqueue_http_requests"
+			) as enqueue_http_requests, patch(
+				"press.press.doctype.agent_job.agent_job.frappe.db.commit", new=Mock()
+			):
+				retry_jobs(jobs, {"New Site": 3}, frappe.utils.now_datetime())
+		finally:
+			unmark_jobs_in_flight(jobs)
+
+		enqueue_http_requests.assert_called_once_with([due_job])
+		self.assertEqual(frappe.db.get_value("Agent Job", queued_job, "retry_count"), 1)
+		self.assertEqual(frappe.db.get_value("Agent Job", due_job, "retry_count"), 2)
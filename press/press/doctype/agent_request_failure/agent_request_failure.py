@@ -1,11 +1,13 @@
 # Copyright (c) 2024, Frappe and contributors
 # For license information, please see license.txt
 
+from __future__ import annotations
+
 import frappe
 import requests
 from frappe.model.document import Document
 
-from press.agent import Agent
+from press.agent import Agent, agent_circuit_breaker
 from press.utils import log_error
 
 
@@ -20,18 +22,23 @@ class AgentRequestFailure(Document):
 
 		error: DF.Code
 		failure_count: DF.Int
+		last_failure_at: DF.Datetime | None
 		server: DF.DynamicLink
 		server_type: DF.Link
 		traceback: DF.Code
 	# end: auto-generated types
 
-	pass
-
 	def before_insert(self):
 		# TODO: Remove once tests pass
 		if frappe.flags.in_test:
 			print(frappe.get_traceback(with_context=True))
 
+	def on_update(self):
+		agent_circuit_breaker.invalidate()
+
+	def on_trash(self):
+		agent_circuit_breaker.invalidate()
+
 
 def is_server_archived(failure):
 	# Server was archived more than an hour ago
@@ -79,3 +86,5 @@ def remove_old_failures():
 					"failure_count",
 					failure.failure_count + delta,
 				)
+
+	agent_circuit_breaker.invalidate()
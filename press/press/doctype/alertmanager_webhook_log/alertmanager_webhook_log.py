@@ -52,6 +52,9 @@ class AlertmanagerWebhookLog(Document):
 	if TYPE_CHECKING:
 		from frappe.types import DF
 
+		from press.press.doctype.alertmanager_webhook_log_instance.alertmanager_webhook_log_instance import (
+			AlertmanagerWebhookLogInstance,
+		)
 		from press.press.doctype.alertmanager_webhook_log_reaction_job.alertmanager_webhook_log_reaction_job import (
 			AlertmanagerWebhookLogReactionJob,
 		)
@@ -62,6 +65,8 @@ class AlertmanagerWebhookLog(Document):
 		external_url: DF.Data
 		group_key: DF.Code
 		group_labels: DF.Code
+		incident_scope: DF.Data | None
+		instances: DF.Table[AlertmanagerWebhookLogInstance]
 		payload: DF.Code
 		reaction_jobs: DF.Table[AlertmanagerWebhookLogReactionJob]
 		severity: DF.Literal["Critical", "Warning", "Information"]
@@ -75,7 +80,12 @@ class AlertmanagerWebhookLog(Document):
 		from frappe.query_builder.functions import Now
 
 		table = frappe.qb.DocType("Alertmanager Webhook Log")
-		frappe.db.delete(table, filters=(table.modified < (Now() - Interval(days=days))))
+		instance = frappe.qb.DocType("Alertmanager Webhook Log Instance")
+		old_logs = table.modified < (Now() - Interval(days=days))
+		frappe.db.delete(
+			instance, filters=instance.parent.isin(frappe.qb.from_(table).select(table.name).where(old_logs))
+		)
+		frappe.db.delete(table, filters=old_logs)
 
 	def validate(self):
 		self.parsed = json.loads(self.payload)
@@ -94,10 +104,10 @@ class AlertmanagerWebhookLog(Document):
 		self.common_labels = json.dumps(self.parsed["commonLabels"], indent=2, sort_keys=True)
 
 		self.payload = json.dumps(self.parsed, indent=2, sort_keys=True)
-
-	@property
-	def incident_scope(self):
-		return self.parsed_group_labels.get(INCIDENT_SCOPE)
+		self.incident_scope = self.parsed["groupLabels"].get(INCIDENT_SCOPE)
+		if self.is_new():
+			instances = sorted(self.get_instances_from_alerts_payload(self.payload))
+			self.set("instances", [{"instance": instance} for instance in instances])
 
 	def after_insert(self):
 		if self.alert == INCIDENT_ALERT:
@@ -157,27 +167,22 @@ class AlertmanagerWebhookLog(Document):
 		return {}
 
 	def get_past_alert_instances(self):
-		past_alerts = frappe.get_all(
-			self.doctype,
-			fields=["payload"],
-			filters={
-				"alert": self.alert,
-				"severity": self.severity,
-				"status": self.status,
-				"group_key": ("like", f"%{self.incident_scope}%"),
-				"modified": [
-					">",
-					add_to_date(frappe.utils.now(), hours=-self.get_repeat_interval()),
-				],
-			},
-			group_by="group_key",
-			ignore_ifnull=True,
-		)  # get site down alerts grouped by benches
-
-		instances = []
-		for alert in past_alerts:
-			instances.extend(self.get_instances_from_alerts_payload(alert["payload"]))
-		return set(instances)
+		log = frappe.qb.DocType(self.doctype)
+		instance = frappe.qb.DocType("Alertmanager Webhook Log Instance")
+		past_instances = (
+			frappe.qb.from_(log)
+			.join(instance)
+			.on((instance.parent == log.name) & (instance.parenttype == self.doctype))
+			.select(instance.instance)
+			.distinct()
+			.where(log.incident_scope == self.incident_scope)
+			.where(log.modified > add_to_date(frappe.utils.now(), hours=-self.get_repeat_interval()))
+			.where(log.alert == self.alert)
+			.where(log.severity == self.severity)
+			.where(log.status == self.status)
+			.run(pluck=True)
+		)  # instances reported down within the scope, across all groups
+		return set(past_instances)
 
 	def total_instances(self) -> int:
 		return frappe.db.count(
@@ -286,3 +291,7 @@ class AlertmanagerWebhookLog(Document):
 			incident.save()
 		except Exception:
 			log_error("Incident creation failed")
+
+
+def on_doctype_update():
+	frappe.db.add_index("Alertmanager Webhook Log", ["incident_scope", "modified"])
@@ -0,0 +1,38 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# For license information, please see license.txt
+import json
+
+import frappe
+from frappe.utils import add_to_date, now_datetime
+
+from press.press.doctype.incident.incident import INCIDENT_SCOPE
+
+
+def execute():
+	frappe.reload_doctype("Alertmanager Webhook Log")
+	# Incident detection only looks a few hours back, older logs are cleared out eventually
+	logs = frappe.get_all(
+		"Alertmanager Webhook Log",
+		filters={"modified": (">", add_to_date(now_datetime(), days=-1))},
+		fields=["name", "group_labels", "payload"],
+	)
+	for log in logs:
+		frappe.db.set_value(
+			"Alertmanager Webhook Log",
+			log.name,
+			"incident_scope",
+			json.loads(log.group_labels).get(INCIDENT_SCOPE),
+			update_modified=False,
+		)
+		instances = sorted({alert["labels"]["instance"] for alert in json.loads(log.payload)["alerts"]})
+		for idx, instance in enumerate(instances, 1):
+			frappe.get_doc(
+				{
+					"doctype": "Alertmanager Webhook Log Instance",
+					"parent": log.name,
+					"parenttype": "Alertmanager Webhook Log",
+					"parentfield": "instances",
+					"idx": idx,
+					"instance": instance,
+				}
+			).db_insert()
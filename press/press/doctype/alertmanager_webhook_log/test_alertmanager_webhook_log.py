@@ -3,11 +3,15 @@
 
 import json
 import typing
-import unittest
 from datetime import datetime
+from unittest.mock import Mock, patch
 
 import frappe
+from frappe.tests.utils import FrappeTestCase
 
+from press.press.doctype.alertmanager_webhook_log.alertmanager_webhook_log import (
+	AlertmanagerWebhookLog,
+)
 from press.press.doctype.prometheus_alert_rule.test_prometheus_alert_rule import (
 	create_test_prometheus_alert_rule,
 )
@@ -86,5 +90,23 @@ def create_test_alertmanager_webhook_log(
 	).insert()
 
 
-class TestAlertmanagerWebhookLog(unittest.TestCase):
-	pass
+@patch.object(AlertmanagerWebhookLog, "after_insert", new=Mock())
+class TestAlertmanagerWebhookLog(FrappeTestCase):
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_clear_old_logs_removes_instances(self):
+		log = create_test_alertmanager_webhook_log()
+		self.assertTrue(frappe.db.exists("Alertmanager Webhook Log Instance", {"parent": log.name}))
+		frappe.db.set_value(
+			"Alertmanager Webhook Log",
+			log.name,
+			"modified",
+			frappe.utils.add_days(None, -11),
+			update_modified=False,
+		)
+
+		AlertmanagerWebhookLog.clear_old_logs(days=10)
+
+		self.assertFalse(frappe.db.exists("Alertmanager Webhook Log", log.name))
+		self.assertFalse(frappe.db.exists("Alertmanager Webhook Log Instance", {"parent": log.name}))
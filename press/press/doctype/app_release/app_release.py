@@ -10,14 +10,18 @@ from typing import Optional, TypedDict
 
 import frappe
 from frappe.model.document import Document
+from frappe.utils.synchronization import filelock
 
 from press.api.github import get_access_token
 from press.press.doctype.app_source.app_source import AppSource
 from press.utils import log_error
 
+MIRROR_LOCK_TIMEOUT = 15 * 60
+
 
 class AppReleaseDict(TypedDict):
 	name: str
+	app: str
 	source: str
 	hash: str
 	cloned: int
@@ -175,22 +179,14 @@ class AppRelease(Document):
 
 	def _clone_repo(self):
 		source: "AppSource" = frappe.get_doc("App Source", self.source)
-		url = source.get_repo_url()
 
 		self.output = ""
-		self.output += self.run("git init")
-		self.output += self.run(f"git checkout -B {source.branch}")
-		origin_exists = self.run("git remote").strip() == "origin"
-		if origin_exists:
-			self.output += self.run(f"git remote set-url origin {url}")
-		else:
-			self.output += self.run(f"git remote add origin {url}")
-		self.output += self.run("git config credential.helper ''")
-
 		try:
-			self.output += self.run(f"git fetch --depth 1 origin {self.hash}")
+			self.output += self._fetch_into_mirror(source)
 		except subprocess.CalledProcessError as e:
+			self.cleanup()
 			stdout = e.stdout.decode("utf-8")
+			log_error("App Release Command Exception", output=stdout, doc=self)
 
 			if not (
 				"fatal: could not read Username for 'https://github.com'" in stdout
@@ -211,9 +207,56 @@ class AppRelease(Document):
 			"""
 			raise Exception("Repository could not be fetched", self.app)  # noqa
 
+		"""
+		The checkout is a shallow clone of the local mirror instead of a
+		worktree or alternates clone, because the build copies it into the
+		Docker context and runs git in it, so it has to be self-contained.
+		"""
+		url = "file://" + get_mirror_directory(self.app, self.source)
+		self.output += self.run("git init")
+		self.output += self.run(f"git checkout -B {source.branch}")
+		origin_exists = self.run("git remote").strip() == "origin"
+		if origin_exists:
+			self.output += self.run(f"git remote set-url origin {url}")
+		else:
+			self.output += self.run(f"git remote add origin {url}")
+
+		self.output += self.run(f"git fetch --depth 1 origin {get_mirror_ref(self.hash)}")
 		self.output += self.run(f"git checkout {self.hash}")
 		self.output += self.run(f"git reset --hard {self.hash}")
 
+	def _fetch_into_mirror(self, source: "AppSource | None" = None) -> str:
+		"""
+		Fetch this release's commit into the App Source mirror, a bare repo
+		shared by all releases of the source. Only objects that the mirror
+		does not have yet are downloaded.
+		"""
+		with filelock(f"app_source_mirror_{self.source}", timeout=MIRROR_LOCK_TIMEOUT):
+			mirror_directory = get_prepared_mirror_directory(self.app, self.source)
+			if mirror_has_commit(mirror_directory, self.hash):
+				return ""
+
+			source = source or self.get_source()
+			ref = get_mirror_ref(self.hash)
+			return run(
+				f"git fetch --depth 1 {source.get_repo_url()} +{self.hash}:{ref}",
+				mirror_directory,
+			)
+
+	def _remove_from_mirror(self):
+		mirror_directory = get_mirror_directory(self.app, self.source)
+		if not os.path.isdir(mirror_directory):
+			return
+
+		if frappe.db.exists(
+			"App Release",
+			{"name": ("!=", self.name), "source": self.source, "hash": self.hash, "cloned": True},
+		):
+			return
+
+		with filelock(f"app_source_mirror_{self.source}", timeout=MIRROR_LOCK_TIMEOUT):
+			run(f"git update-ref -d {get_mirror_ref(self.hash)}", mirror_directory)
+
 	def _get_repo_url(self, source: "AppSource") -> str:
 		if not source.github_installation_id:
 			return source.repository_url
@@ -228,6 +271,7 @@ class AppRelease(Document):
 	def on_trash(self):
 		if self.clone_directory and os.path.exists(self.clone_directory):
 			shutil.rmtree(self.clone_directory)
+		self._remove_from_mirror()
 
 	@frappe.whitelist()
 	def cleanup(self):
@@ -399,13 +443,45 @@ def get_prepared_clone_directory(
 	return hash_directory
 
 
+def get_mirror_directory(app: str, source: str) -> str:
+	clone_directory: str = frappe.db.get_single_value("Press Settings", "clone_directory")
+	return os.path.join(clone_directory, app, source, ".mirror")
+
+
+def get_prepared_mirror_directory(app: str, source: str) -> str:
+	mirror_directory = get_mirror_directory(app, source)
+	if not os.path.exists(os.path.join(mirror_directory, "HEAD")):
+		os.makedirs(mirror_directory, exist_ok=True)
+		run("git init --bare", mirror_directory)
+		run("git config credential.helper ''", mirror_directory)
+
+	return mirror_directory
+
+
+def get_mirror_ref(hash: str) -> str:
+	# Keeps fetched commits reachable so that gc does not prune them
+	return f"refs/releases/{hash}"
+
+
+def mirror_has_commit(mirror_directory: str, hash: str) -> bool:
+	if not os.path.isdir(mirror_directory):
+		return False
+
+	try:
+		run(f"git rev-parse --verify --quiet {get_mirror_ref(hash)}", mirror_directory)
+	except subprocess.CalledProcessError:
+		return False
+	return True
+
+
 def get_changed_files_between_hashes(
 	source: str, deployed_hash: str, update_hash: str
 ) -> Optional[tuple[list[str], AppReleasePair]]:  # noqa
 	"""
 	Checks diff between two App Releases, if they have not been cloned
 	the App Releases are cloned this is because the commit needs to be
-	fetched to diff since it happens locally.
+	fetched to diff since it happens locally. The diff is run against the
+	App Source mirror which holds the commits of all cloned releases.
 
 	Note: order of passed hashes do not matter.
 	"""
@@ -415,33 +491,19 @@ def get_changed_files_between_hashes(
 	if not is_valid:
 		return None
 
+	mirror_directory = get_mirror_directory(deployed_release["app"], source)
 	for release in [deployed_release, update_release]:
-		if release["cloned"]:
+		if release["cloned"] and mirror_has_commit(mirror_directory, release["hash"]):
 			continue
 
 		release_doc: AppRelease = frappe.get_doc("App Release", release["name"])
-		release_doc._clone()
-
-	cwd = deployed_release["clone_directory"]
-
-	"""
-	Setting remote and fetching alters .git contents, hence it has to be
-	restored to before the commands had been run. Without this layer will
-	be rebuilt.
-	"""
-
-	# Save repo state
-	run("cp -r .git .git.bak", cwd)
-
-	# Calculate diff against local remote
-	run(f"git remote add -f diff_temp {update_release['clone_directory']}", cwd)
-	run(f"git fetch --depth 1 diff_temp {update_hash}", cwd)
-	diff = run(f"git diff --name-only {deployed_hash} {update_hash}", cwd)
-
-	# Restore repo state
-	run("rm -rf .git", cwd)
-	run("mv .git.bak .git", cwd)
+		if release["cloned"]:
+			# Cloned before the mirror was set up
+			release_doc._fetch_into_mirror()
+		else:
+			release_doc._clone()
 
+	diff = run(f"git diff --name-only {deployed_hash} {update_hash}", mirror_directory)
 	return diff.splitlines(), dict(old=deployed_release, new=update_release)
 
 
@@ -451,6 +513,7 @@ def get_release_by_source_and_hash(source: str, hash: str) -> AppReleaseDict:
 		filters={"hash": hash, "source": source},
 		fields=[
 			"name",
+			"app",
 			"source",
 			"hash",
 			"cloned",
@@ -2,12 +2,24 @@
 # Copyright (c) 2020, Frappe and Contributors
 # See license.txt
 
+import os
+import shutil
+import tempfile
 import typing
 import unittest
 
 import frappe
 
+from press.press.doctype.app.test_app import create_test_app
+from press.press.doctype.app_release.app_release import (
+	get_changed_files_between_hashes,
+	get_mirror_directory,
+	mirror_has_commit,
+	run,
+)
 from press.press.doctype.app_source.app_source import AppSource
+from press.press.doctype.app_source.test_app_source import create_test_app_source
+from press.press.doctype.press_settings.test_press_settings import create_test_press_settings
 
 if typing.TYPE_CHECKING:
 	from press.press.doctype.app_release.app_release import AppRelease
@@ -33,4 +45,46 @@ def create_test_app_release(app_source: AppSource, hash: str = None) -> "AppRele
 
 
 class TestAppRelease(unittest.TestCase):
-	pass
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		create_test_press_settings().db_set("clone_directory", os.path.join(self.directory, "clones"))
+
+	def tearDown(self):
+		frappe.db.rollback()
+		shutil.rmtree(self.directory)
+
+	def commit(self, repository: str, files: dict) -> str:
+		for name, content in files.items():
+			with open(os.path.join(repository, name), "w") as f:
+				f.write(content)
+		run("git add .", repository)
+		run("git -c user.name=Test -c user.email=test@example.com commit -m Test", repository)
+		return run("git rev-parse HEAD", repository).strip()
+
+	def test_releases_are_fetched_into_source_mirror(self):
+		repository = os.path.join(self.directory, "frappe", "test_app")
+		os.makedirs(repository)
+		run("git init", repository)
+		deployed_hash = self.commit(repository, {"a.py": "a = 1", "b.py": "b = 1"})
+		update_hash = self.commit(repository, {"b.py": "b = 2", "c.py": "c = 1"})
+
+		app = create_test_app("test_app", "Test App")
+		source = create_test_app_source("Nightly", app, repository_url=repository)
+		deployed_release = create_test_app_release(source, deployed_hash)
+		update_release = create_test_app_release(source, update_hash)
+
+		file_diff, pair = get_changed_files_between_hashes(source.name, deployed_hash, update_hash)
+		self.assertEqual(sorted(file_diff), ["b.py", "c.py"])
+		self.assertEqual(pair["new"]["name"], update_release.name)
+
+		mirror_directory = get_mirror_directory(app.name, source.name)
+		self.assertTrue(mirror_has_commit(mirror_directory, deployed_hash))
+		self.assertTrue(mirror_has_commit(mirror_directory, update_hash))
+
+		deployed_release.reload()
+		self.assertTrue(deployed_release.cloned)
+		self.assertFalse(os.path.exists(os.path.join(deployed_release.clone_directory, "c.py")))
+		self.assertEqual(
+			run("git rev-parse HEAD", deployed_release.clone_directory).strip(),
+			deployed_hash,
+		)
@@ -24,6 +24,7 @@ from press.press.doctype.bench_shell_log.bench_shell_log import (
 	create_bench_shell_log,
 )
 from press.press.doctype.site.site import Site
+from press.press.doctype.site.sync import sync_sites_analytics, sync_sites_info
 from press.utils import SupervisorProcess, flatten, log_error, parse_supervisor_status
 
 TRANSITORY_STATES = ["Pending", "Installing"]
@@ -403,24 +404,7 @@ class Bench(Document):
 			return
 		data = agent.get_sites_info(self, since=last_synced_time)
 		if data:
-			for site, info in data.items():
-				if not frappe.db.exists("Site", site):
-					continue
-				try:
-					frappe.get_doc("Site", site, for_update=True).sync_info(info)
-					frappe.db.commit()
-				except frappe.DoesNotExistError:
-					# Ignore: Site got renamed or deleted
-					pass
-				except Exception:
-					log_error(
-						"Site Sync Error",
-						site=site,
-						info=info,
-						reference_doctype="Bench",
-						reference_name=self.name,
-					)
-					frappe.db.rollback()
+			sync_sites_info(self.name, data)
 
 	@frappe.whitelist()
 	def sync_analytics(self):
@@ -428,23 +412,8 @@ class Bench(Document):
 		if agent.should_skip_requests():
 			return
 		data = agent.get_sites_analytics(self)
-		if not data:
-			return
-		for site, analytics in data.items():
-			if not frappe.db.exists("Site", site):
-				return
-			try:
-				frappe.get_doc("Site", site).sync_analytics(analytics)
-				frappe.db.commit()
-			except Exception:
-				log_error(
-					"Site Analytics Sync Error",
-					site=site,
-					analytics=analytics,
-					reference_doctype="Bench",
-					reference_name=self.name,
-				)
-				frappe.db.rollback()
+		if data:
+			sync_sites_analytics(self.name, data)
 
 	@dashboard_whitelist()
 	def update_all_sites(self):
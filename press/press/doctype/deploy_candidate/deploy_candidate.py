@@ -11,9 +11,9 @@ import re
 import shlex
 import shutil
 import subprocess
-import tarfile
 import tempfile
 import typing
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from subprocess import Popen
 from typing import Any, Literal
@@ -42,10 +42,15 @@ from press.press.doctype.deploy_candidate.docker_output_parsers import (
 )
 from press.press.doctype.deploy_candidate.utils import (
 	PackageManagerFiles,
+	copy_tree,
+	create_build_context_tarball,
+	get_app_blob_digest,
 	get_build_server,
+	get_chunk_checksums,
 	get_package_manager_files,
 	is_suspended,
 	load_pyproject,
+	site_context,
 )
 from press.press.doctype.deploy_candidate.validations import PreBuildValidations
 from press.utils import get_current_team, log_error, reconnect_on_failure
@@ -56,8 +61,11 @@ from press.utils.jobs import get_background_jobs, stop_background_job
 MAX_DURATION = timedelta(hours=23, minutes=59, seconds=59)
 TRANSITORY_STATES = ["Scheduled", "Pending", "Preparing", "Running"]
 RESTING_STATES = ["Draft", "Success", "Failure"]
+MAX_CLONE_WORKERS = 8
 
 if typing.TYPE_CHECKING:
+	from collections.abc import Iterable
+
 	from rq.job import Job
 
 	from press.press.doctype.agent_job.agent_job import AgentJob
@@ -498,12 +506,14 @@ class DeployCandidate(Document):
 		deploy_after_build: bool,
 		no_push: bool,
 	) -> None:
-		context_filename = self._package_and_upload_context()
+		context_filename, app_blobs = self._package_and_upload_context()
 		settings = self._fetch_registry_settings()
 
 		Agent(self.build_server).run_build(
 			{
 				"filename": context_filename,
+				# Context paths to be filled from the build server's blob store
+				"app_blobs": app_blobs,
 				"image_repository": self.docker_image_repository,
 				"image_tag": self.docker_image_tag,
 				"registry": {
@@ -522,38 +532,95 @@ class DeployCandidate(Document):
 		self.last_updated = now()
 		self._set_status_running()
 
-	def _package_and_upload_context(self) -> str:
-		context_filepath = self._package_build_context()
+	def _package_and_upload_context(self) -> tuple[str, dict[str, str]]:
+		app_blobs = {}
+		if frappe.db.get_single_value("Press Settings", "use_incremental_build_context"):
+			app_blobs = self._upload_app_blobs(self.build_server)
+
+		context_filepath = self._package_build_context(exclude=app_blobs)
 		context_filename = self._upload_build_context(
 			context_filepath,
 			self.build_server,
 		)
 		os.remove(context_filepath)
-		return context_filename
+		return context_filename, app_blobs
 
-	def _package_build_context(self) -> str:
-		"""Creates a tarball of the build context and returns the path to it."""
+	def _package_build_context(self, exclude: Iterable[str] = ()) -> str:
+		"""
+		Creates a tarball of the build context and returns the path to it.
+		Paths in `exclude` are relative to the build directory.
+		"""
 		step = self.get_step("package", "context") or frappe._dict()
 		step.status = "Running"
 		start_time = now()
 
-		# make sure to set ownership of build_directory and its contents to 1000:1000
-		def fix_content_permission(tarinfo):
-			tarinfo.uid = 1000
-			tarinfo.gid = 1000
-			return tarinfo
-
-		tmp_file_path = tempfile.mkstemp(suffix=".tar.gz")[1]
-		with tarfile.open(tmp_file_path, "w:gz", compresslevel=5) as tar:
-			if frappe.conf.developer_mode:
-				tar.add(self.build_directory, arcname=".", filter=fix_content_permission)
-			else:
-				tar.add(self.build_directory, arcname=".")
+		tmp_file_path = create_build_context_tarball(
+			self.build_directory,
+			self._get_build_context_compression(),
+			exclude,
+		)
 
 		step.status = "Success"
 		step.duration = get_duration(start_time)
 		return tmp_file_path
 
+	def _get_build_context_compression(self) -> str:
+		compression = frappe.db.get_single_value("Press Settings", "build_context_compression") or "Gzip"
+		# Workers without zstd would fail every build while packaging the context
+		if compression == "Zstandard" and not shutil.which("zstd"):
+			return "Gzip"
+		return compression
+
+	def _upload_app_blobs(self, build_server: str) -> dict[str, str]:
+		"""
+		App trees are uploaded as blobs keyed by digest. The build server
+		keeps them and assembles the context from its store, so only trees
+		that no earlier build has uploaded are packaged and sent.
+
+		Returns digests keyed by path relative to the build directory.
+		"""
+		app_blobs = self._get_app_blob_digests()
+		agent = Agent(build_server)
+		missing = agent.get_missing_build_context_blobs(sorted(set(app_blobs.values())))
+		if missing is None:
+			raise Exception("Failed to fetch missing build context blobs from remote docker builder")
+
+		missing = set(missing)
+
+		compression = self._get_build_context_compression()
+		for path, digest in app_blobs.items():
+			if digest not in missing:
+				continue
+
+			blob_filepath = create_build_context_tarball(
+				os.path.join(self.build_directory, path),
+				compression,
+			)
+			try:
+				with open(blob_filepath, "rb") as file:
+					if not agent.upload_build_context_blob(digest, file):
+						raise Exception(f"Failed to upload build context blob for {path}")
+			finally:
+				os.remove(blob_filepath)
+
+			missing.discard(digest)
+
+		return app_blobs
+
+	def _get_app_blob_digests(self) -> dict[str, str]:
+		"""
+		App trees are checkouts of an App Release, so their digest is
+		derived from the release hash and whatever changes the tree when
+		it is packaged instead of hashing file contents.
+		"""
+		app_blobs = {}
+		for app in self.apps:
+			app_blobs[f"apps/{app.app}"] = get_app_blob_digest(app.app, app.hash)
+			if app.pullable_release:
+				app_blobs[f"app_updates/{app.app}"] = get_app_blob_digest(app.app, app.pullable_hash)
+
+		return app_blobs
+
 	def _upload_build_context(self, context_filepath: str, build_server: str):
 		step = self.get_step("upload", "context") or frappe._dict()
 		step.status = "Running"
@@ -583,9 +650,17 @@ class DeployCandidate(Document):
 		build_server: str,
 	):
 		agent = Agent(build_server)
-		with open(context_filepath, "rb") as file:
-			if upload_filename := agent.upload_build_context_for_docker_build(file, self.name):
+		if chunk_size := frappe.db.get_single_value("Press Settings", "build_context_upload_chunk_size"):
+			if upload_filename := self.upload_build_context_in_chunks(
+				agent,
+				context_filepath,
+				chunk_size * 1024 * 1024,
+			):
 				return upload_filename
+		else:
+			with open(context_filepath, "rb") as file:
+				if upload_filename := agent.upload_build_context_for_docker_build(file, self.name):
+					return upload_filename
 
 		message = "Failed to upload build context to remote docker builder"
 		if agent.response:
@@ -593,6 +668,47 @@ class DeployCandidate(Document):
 
 		raise Exception(message)
 
+	def upload_build_context_in_chunks(
+		self,
+		agent: Agent,
+		context_filepath: str,
+		chunk_size: int,
+	) -> str | None:
+		"""
+		Uploads the build context in chunks of `chunk_size` bytes. Chunks
+		that the build server already has with a matching checksum are
+		skipped, so a retried upload only resends the missing ones.
+		"""
+		filename = os.path.basename(context_filepath)
+		checksums = get_chunk_checksums(context_filepath, chunk_size)
+		upload = agent.start_build_context_upload(
+			self.name,
+			{
+				"filename": filename,
+				"size": os.path.getsize(context_filepath),
+				"chunk_size": chunk_size,
+				"chunks": len(checksums),
+			},
+		)
+		if upload is None:
+			return None
+
+		received: dict[str, str] = upload.get("received") or {}
+		with open(context_filepath, "rb") as file:
+			for index, checksum in enumerate(checksums):
+				if received.get(str(index)) == checksum:
+					continue
+
+				file.seek(index * chunk_size)
+				chunk = file.read(chunk_size)
+				if not agent.upload_build_context_chunk(self.name, index, chunk, checksum):
+					return None
+
+		return agent.complete_build_context_upload(
+			self.name,
+			{"filename": filename, "checksums": checksums},
+		)
+
 	@staticmethod
 	def process_run_build(job: "AgentJob", response_data: "dict | None"):
 		request_data = json.loads(job.request_data)
@@ -917,19 +1033,64 @@ class DeployCandidate(Document):
 		self.generate_ssh_keys()
 
 	def _clone_repos(self):
+		"""
+		Apps are cloned and copied into the build context concurrently,
+		clone steps are saved before and after instead of per app.
+		"""
 		apps_directory = os.path.join(self.build_directory, "apps")
 		os.makedirs(apps_directory, exist_ok=True)
 
-		repo_path_map: dict[str, str] = {}
-
+		clone_directories = self._get_clone_directories()
 		for app in self.apps:
-			repo_path_map[app.app] = self._clone_app_repo(app)
+			self._set_clone_step(app, clone_directories)
+		self.save(ignore_permissions=True, ignore_version=True)
+		frappe.db.commit()
+
+		site, sites_path = frappe.local.site, frappe.local.sites_path
+		with ThreadPoolExecutor(max_workers=MAX_CLONE_WORKERS) as executor:
+			futures = [
+				executor.submit(self._clone_app_repo, app, clone_directories, site, sites_path)
+				for app in self.apps
+			]
+
+		repo_path_map: dict[str, str] = {}
+		for app, future in zip(self.apps, futures):
+			repo_path_map[app.app] = future.result()
 			app.app_name = self._get_app_name(app.app)
-			self.save(ignore_permissions=True, ignore_version=True)
-			frappe.db.commit()
 
+		self.save(ignore_permissions=True, ignore_version=True)
+		frappe.db.commit()
 		return repo_path_map
 
+	def _get_clone_directories(self) -> dict[str, str | None]:
+		"""
+		Returns clone directories of releases that are cloned and present
+		on disk, `None` for releases that need to be cloned.
+		"""
+		releases = [app.release for app in self.apps]
+		releases += [app.pullable_release for app in self.apps if app.pullable_release]
+		clone_directories = {}
+		for release in frappe.get_all(
+			"App Release",
+			{"name": ("in", releases)},
+			["name", "clone_directory", "cloned"],
+		):
+			cloned = release.cloned and os.path.exists(release.clone_directory)
+			clone_directories[release.name] = release.clone_directory if cloned else None
+
+		return clone_directories
+
+	def _set_clone_step(self, app: "DeployCandidateApp", clone_directories: dict[str, str | None]):
+		if not (step := self.get_step("clone", app.app)):
+			raise frappe.ValidationError(f"App {app.app} clone step not found")
+
+		step.command = f"git clone {app.app}"
+		if clone_directories.get(app.release):
+			step.cached = True
+			step.status = "Success"
+		else:
+			step.status = "Running"
+
 	def _run_prebuild_validations_and_update_step(self, pmf: PackageManagerFiles):
 		"""
 		Errors thrown here will be caught by a function up the
@@ -955,35 +1116,33 @@ class DeployCandidate(Document):
 		step.output = "Pre-build validations passed"
 		step.status = "Success"
 
-	def _clone_app_repo(self, app: "DeployCandidateApp") -> str:
+	def _clone_app_repo(
+		self,
+		app: "DeployCandidateApp",
+		clone_directories: dict[str, str | None],
+		site: str,
+		sites_path: str,
+	) -> str:
 		"""
 		Clones the app repository if it has not been cloned and
 		copies it into the build context directory.
 
+		Runs in a worker thread, so the step is only updated in memory
+		and the release is cloned using its own site connection.
+
 		Returned path points to the repository that needs to be
 		validated.
 		"""
-		if not (step := self.get_step("clone", app.app)):
-			raise frappe.ValidationError(f"App {app.app} clone step not found")
-
 		if not self.build_directory:
 			raise frappe.ValidationError("Build Directory not set")
 
-		step.command = f"git clone {app.app}"
-		source, cloned = frappe.db.get_value(
-			"App Release",
-			app.release,
-			["clone_directory", "cloned"],
-		)
-
-		if cloned and os.path.exists(source):
-			step.cached = True
-			step.status = "Success"
-		else:
-			source = self._clone_release_and_update_step(app.release, step)
+		step = self.get_step("clone", app.app)
+		if not (source := clone_directories.get(app.release)):
+			with site_context(site, sites_path):
+				source = self._clone_release_and_update_step(app.release, step)
 
 		target = os.path.join(self.build_directory, "apps", app.app)
-		shutil.copytree(source, target, symlinks=True)
+		copy_tree(source, target)
 
 		"""
 		Pullable updates don't need cloning as they get cloned when
@@ -993,18 +1152,14 @@ class DeployCandidate(Document):
 			└─ app_release.get_changed_files_between_hashes
 		"""
 		if app.pullable_release:
-			source = frappe.get_value("App Release", app.pullable_release, "clone_directory")
+			source = clone_directories[app.pullable_release]
 			target = os.path.join(self.build_directory, "app_updates", app.app)
-			shutil.copytree(source, target, symlinks=True)
+			copy_tree(source, target)
 
-		return target
+		return os.path.join(self.build_directory, "apps", app.app)
 
 	def _clone_release_and_update_step(self, release: str, step: "DeployCandidateBuildStep"):
-		# Start step
-		step.status = "Running"
 		start_time = now()
-		self.save(ignore_version=True)
-		frappe.db.commit()
 
 		# Clone Release
 		release: AppRelease = frappe.get_doc(
@@ -1608,12 +1763,13 @@ def cleanup_build_directories():
 			log_error(title="Deploy Candidate Build Cleanup Error", exception=e, doc=doc)
 
 	# Delete all temporary files created by the build process
-	glob_path = os.path.join(tempfile.gettempdir(), f"{tempfile.gettempprefix()}*.tar.gz")
 	six_hours_ago = frappe.utils.add_to_date(None, hours=-6)
-	for file in glob.glob(glob_path):
-		# Use local time to compare timestamps
-		if os.stat(file).st_ctime < six_hours_ago.timestamp():
-			os.remove(file)
+	for suffix in (".tar.gz", ".tar.zst"):
+		glob_path = os.path.join(tempfile.gettempdir(), f"{tempfile.gettempprefix()}*{suffix}")
+		for file in glob.glob(glob_path):
+			# Use local time to compare timestamps
+			if os.stat(file).st_ctime < six_hours_ago.timestamp():
+				os.remove(file)
 
 
 def ansi_escape(text):
@@ -2,7 +2,10 @@
 # Copyright (c) 2020, Frappe and Contributors
 # See license.txt
 
+import os
 import random
+import tarfile
+import tempfile
 import typing
 import unittest
 from unittest import skip
@@ -16,6 +19,11 @@ from press.press.doctype.app_release.test_app_release import create_test_app_rel
 from press.press.doctype.app_source.test_app_source import create_test_app_source
 from press.press.doctype.bench.test_bench import create_test_bench
 from press.press.doctype.deploy_candidate.deploy_candidate import DeployCandidate
+from press.press.doctype.deploy_candidate.utils import (
+	copy_tree,
+	create_build_context_tarball,
+	get_chunk_checksums,
+)
 from press.press.doctype.release_group.release_group import ReleaseGroup
 from press.press.doctype.release_group.test_release_group import (
 	create_test_release_group,
@@ -217,6 +225,72 @@ class TestDeployCandidate(unittest.TestCase):
 		self.assertEqual(second_candidate.apps[0].release, first_candidate.apps[0].release)
 		self.assertNotEqual(second_candidate.apps[1].release, first_candidate.apps[1].release)
 
+	def test_copy_tree_hardlinks_files(self, mock_commit):
+		with tempfile.TemporaryDirectory() as directory:
+			source = os.path.join(directory, "source")
+			os.makedirs(os.path.join(source, "app"))
+			with open(os.path.join(source, "app", "hooks.py"), "w") as f:
+				f.write("app_name = 'app'")
+			os.symlink("hooks.py", os.path.join(source, "app", "link.py"))
+
+			target = os.path.join(directory, "target")
+			copy_tree(source, target)
+
+			self.assertTrue(
+				os.path.samefile(
+					os.path.join(source, "app", "hooks.py"),
+					os.path.join(target, "app", "hooks.py"),
+				)
+			)
+			self.assertEqual(os.readlink(os.path.join(target, "app", "link.py")), "hooks.py")
+
+	def test_build_context_tarball_excludes_app_blobs(self, mock_commit):
+		with tempfile.TemporaryDirectory() as directory:
+			for path in ["apps/frappe/hooks.py", "apps/erpnext/hooks.py", "Dockerfile"]:
+				os.makedirs(os.path.dirname(os.path.join(directory, path)), exist_ok=True)
+				open(os.path.join(directory, path), "w").close()
+
+			tarball = create_build_context_tarball(directory, "Gzip", exclude=["apps/erpnext"])
+			with tarfile.open(tarball) as tar:
+				names = tar.getnames()
+			os.remove(tarball)
+
+		self.assertIn("./apps/frappe/hooks.py", names)
+		self.assertIn("./Dockerfile", names)
+		self.assertFalse([name for name in names if name.startswith("./apps/erpnext")])
+
+	def test_build_context_falls_back_to_gzip_without_zstd(self, mock_commit):
+		frappe.db.set_single_value("Press Settings", "build_context_compression", "Zstandard")
+		candidate = frappe.new_doc("Deploy Candidate")
+		with patch("press.press.doctype.deploy_candidate.deploy_candidate.shutil.which", return_value=None):
+			self.assertEqual(candidate._get_build_context_compression(), "Gzip")
+		with patch(
+			"press.press.doctype.deploy_candidate.deploy_candidate.shutil.which", return_value="/usr/bin/zstd"
+		):
+			self.assertEqual(candidate._get_build_context_compression(), "Zstandard")
+
+	def test_chunked_upload_resends_only_missing_chunks(self, mock_commit):
+		candidate = frappe.new_doc("Deploy Candidate")
+		candidate.name = "test-candidate"
+		agent = Mock()
+		agent.upload_build_context_chunk.return_value = {"checksum": "ok"}
+		agent.complete_build_context_upload.return_value = "context.tar.zst"
+
+		with tempfile.NamedTemporaryFile() as file:
+			file.write(b"0123456789")
+			file.flush()
+			checksums = get_chunk_checksums(file.name, 4)
+			agent.start_build_context_upload.return_value = {"received": {"0": checksums[0]}}
+
+			filename = candidate.upload_build_context_in_chunks(agent, file.name, 4)
+
+		self.assertEqual(filename, "context.tar.zst")
+		self.assertEqual(len(checksums), 3)
+		self.assertEqual(
+			[call.args[1:3] for call in agent.upload_build_context_chunk.call_args_list],
+			[(1, b"4567"), (2, b"89")],
+		)
+
 	@skip("Docker Build broken with `duplicate cache exports [gha]`")
 	@patch(
 		"press.press.doctype.deploy_candidate.deploy_candidate.frappe.enqueue_doc",
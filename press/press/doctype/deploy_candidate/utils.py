@@ -1,12 +1,22 @@
+import hashlib
 import json
+import os
 import re
+import shutil
+import subprocess
+import tarfile
+import tempfile
 from collections import Counter
+from contextlib import contextmanager
 from datetime import timedelta
 from pathlib import Path
-from typing import Any, Optional, TypedDict
+from typing import TYPE_CHECKING, Any, Optional, TypedDict
 
 import frappe
 
+if TYPE_CHECKING:
+	from collections.abc import Iterable
+
 PackageManagers = TypedDict(
 	"PackageManagers",
 	{
@@ -77,6 +87,101 @@ def _get_package_manager_files_from_repo(
 	return pyproject_toml, package_jsons
 
 
+def copy_tree(source: str, target: str):
+	"""
+	Copies source into target hardlinking files where the filesystem
+	allows it. Files in the build context are never written to, so they
+	can share inodes with the App Release clone.
+	"""
+	shutil.copytree(source, target, symlinks=True, copy_function=link_or_copy)
+
+
+def link_or_copy(source: str, target: str):
+	try:
+		os.link(source, target)
+	except OSError:
+		# Eg: clone and build directories are on different devices
+		shutil.copy2(source, target)
+
+
+# Bump when the way app trees are packaged changes
+APP_BLOB_VERSION = 1
+
+
+def get_app_blob_digest(app: str, hash: str) -> str:
+	key = f"{APP_BLOB_VERSION}:{app}:{hash}:{int(bool(frappe.conf.developer_mode))}"
+	return hashlib.sha256(key.encode()).hexdigest()
+
+
+def create_build_context_tarball(directory: str, compression: str, exclude: "Iterable[str]" = ()) -> str:
+	"""
+	Creates a tarball of directory and returns the path to it. Paths in
+	`exclude` are relative to directory.
+	"""
+	excluded = {os.path.join(".", path) for path in exclude}
+
+	def tar_filter(tarinfo: tarfile.TarInfo):
+		if tarinfo.name in excluded:
+			return None
+
+		# make sure to set ownership of build_directory and its contents to 1000:1000
+		if frappe.conf.developer_mode:
+			tarinfo.uid = 1000
+			tarinfo.gid = 1000
+		return tarinfo
+
+	if compression == "Zstandard":
+		tmp_file_path = tempfile.mkstemp(suffix=".tar.zst")[1]
+		create_zstd_tarball(directory, tmp_file_path, tar_filter)
+	else:
+		tmp_file_path = tempfile.mkstemp(suffix=".tar.gz")[1]
+		with tarfile.open(tmp_file_path, "w:gz", compresslevel=5) as tar:
+			tar.add(directory, arcname=".", filter=tar_filter)
+
+	return tmp_file_path
+
+
+def create_zstd_tarball(directory: str, path: str, tar_filter=None):
+	"""
+	Streams a tarball of directory through `zstd` which compresses it
+	using one thread per core.
+	"""
+	with open(path, "wb") as file:
+		process = subprocess.Popen(["zstd", "-T0", "-3", "-q", "-c"], stdin=subprocess.PIPE, stdout=file)
+		try:
+			with tarfile.open(fileobj=process.stdin, mode="w|") as tar:
+				tar.add(directory, arcname=".", filter=tar_filter)
+		finally:
+			process.stdin.close()
+			returncode = process.wait()
+
+	if returncode:
+		raise subprocess.CalledProcessError(returncode, process.args)
+
+
+def get_chunk_checksums(path: str, chunk_size: int) -> list[str]:
+	checksums = []
+	with open(path, "rb") as file:
+		while chunk := file.read(chunk_size):
+			checksums.append(hashlib.sha256(chunk).hexdigest())
+	return checksums
+
+
+@contextmanager
+def site_context(site: str, sites_path: str):
+	"""
+	Initializes frappe and connects to the site's database in the
+	current thread. Used to run build steps from worker threads.
+	"""
+	frappe.init(site=site, sites_path=sites_path)
+	frappe.connect()
+	try:
+		yield
+	finally:
+		frappe.db.commit()
+		frappe.destroy()
+
+
 def load_pyproject(app: str, pyproject_path: str):
 	try:
 		from tomli import TOMLDecodeError, load
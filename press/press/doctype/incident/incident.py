@@ -324,7 +324,7 @@ Incident URL: {incident_link}"""
 
 	def get_last_alert_status_for_each_group(self):
 		return frappe.db.sql_list(
-			f"""
+			"""
 select
 	last_alert_per_group.status
 from
@@ -343,12 +343,16 @@ from
 		from
 			`tabAlertmanager Webhook Log`
 		where
-			modified >= "{self.creation - timedelta(minutes=PAST_ALERT_COVER_MINUTES)}"
-			and group_key like "%%{self.incident_scope}%%"
+			incident_scope = %(incident_scope)s
+			and modified >= %(since)s
 	) last_alert_per_group
 where
 	last_alert_per_group.rank = 1
-			"""
+			""",
+			{
+				"incident_scope": self.incident_scope,
+				"since": self.creation - timedelta(minutes=PAST_ALERT_COVER_MINUTES),
+			},
 		)  # status of the sites down in each bench
 
 	def check_resolved(self):
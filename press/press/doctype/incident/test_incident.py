@@ -209,6 +209,17 @@ class TestIncident(FrappeTestCase):
 		create_test_alertmanager_webhook_log(site=site3)
 		self.assertEqual(frappe.db.count("Incident") - incident_count_before, 1)
 
+	def test_past_alert_instances_are_limited_to_incident_scope(self):
+		alert = create_test_prometheus_alert_rule()
+		site = create_test_site()
+		create_test_site(server=site.server)
+		other_site = create_test_site()  # new server
+		log = create_test_alertmanager_webhook_log(site=site, alert=alert)
+		self.assertEqual(log.incident_scope, site.server)
+		self.assertEqual([row.instance for row in log.instances], [site.name])
+		create_test_alertmanager_webhook_log(site=other_site, alert=alert)
+		self.assertEqual(log.get_past_alert_instances(), {site.name})
+
 	@patch("tenacity.nap.time", new=Mock())  # no sleep
 	def test_call_event_creates_acknowledgement_update(self):
 		with patch.object(MockTwilioCallList, "create", new=MockTwilioCallList("completed").create):
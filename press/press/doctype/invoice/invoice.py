@@ -535,41 +535,64 @@ class Invoice(Document):
 					item.description = "Prepaid Credits"
 
 	def add_usage_record(self, usage_record):
+		self.add_usage_records([usage_record])
+
+	def add_usage_records(self, usage_records):
+		"""Add quantities for a batch of usage records and save the invoice once"""
 		if self.type != "Subscription":
 			return
-		# return if this usage_record is already accounted for in an invoice
-		if usage_record.invoice:
-			return
 
-		# return if this usage_record does not fall inside period of invoice
-		usage_record_date = getdate(usage_record.date)
 		start = getdate(self.period_start)
 		end = getdate(self.period_end)
-		if not (start <= usage_record_date <= end):
+		invoice_items = {get_usage_key(row, row.rate): row for row in self.items}
+
+		# skip usage_records already accounted for in an invoice
+		# or that do not fall inside period of invoice
+		added = [d for d in usage_records if not d.invoice and start <= getdate(d.date) <= end]
+		if not added:
 			return
 
-		invoice_item = self.get_invoice_item_for_usage_record(usage_record)
-		# if not found, create a new invoice item
-		if not invoice_item:
-			invoice_item = self.append(
-				"items",
-				{
-					"document_type": usage_record.document_type,
-					"document_name": usage_record.document_name,
-					"plan": usage_record.plan,
-					"quantity": 0,
-					"rate": usage_record.amount,
-					"site": usage_record.site,
-				},
+		# Another run may have linked some of these since they were read,
+		# check again while holding a lock on the records
+		unlinked = set(
+			frappe.get_all(
+				"Usage Record",
+				filters={"name": ("in", [d.name for d in added]), "invoice": ("is", "not set")},
+				pluck="name",
+				for_update=True,
 			)
+		)
+		added = [d for d in added if d.name in unlinked]
+		if not added:
+			return
+
+		for usage_record in added:
+			key = get_usage_key(usage_record, usage_record.amount)
+			invoice_item = invoice_items.get(key)
+			# if not found, create a new invoice item
+			if not invoice_item:
+				invoice_item = self.append(
+					"items",
+					{
+						"document_type": usage_record.document_type,
+						"document_name": usage_record.document_name,
+						"plan": usage_record.plan,
+						"quantity": 0,
+						"rate": usage_record.amount,
+						"site": usage_record.site,
+					},
+				)
+				invoice_items[key] = invoice_item
 
-		invoice_item.quantity = (invoice_item.quantity or 0) + 1
+			invoice_item.quantity = (invoice_item.quantity or 0) + 1
 
-		if usage_record.payout:
-			self.payout += usage_record.payout
+			if usage_record.payout:
+				self.payout += usage_record.payout
 
 		self.save()
-		usage_record.db_set("invoice", self.name)
+		frappe.db.set_value("Usage Record", {"name": ("in", [d.name for d in added])}, "invoice", self.name)
+		for usage_record in added:
+			usage_record.invoice = self.name
 
 	def remove_usage_record(self, usage_record):
 		if self.type != "Subscription":
@@ -594,17 +617,10 @@ class Invoice(Document):
 		usage_record.db_set("invoice", None)
 
 	def get_invoice_item_for_usage_record(self, usage_record):
+		key = get_usage_key(usage_record, usage_record.amount)
 		invoice_item = None
 		for row in self.items:
-			conditions = (
-				row.document_type == usage_record.document_type
-				and row.document_name == usage_record.document_name
-				and row.plan == usage_record.plan
-				and row.rate == usage_record.amount
-			)
-			if row.document_type == "Marketplace App":
-				conditions = conditions and row.site == usage_record.site
-			if conditions:
+			if get_usage_key(row, row.rate) == key:
 				invoice_item = row
 		return invoice_item
 
@@ -1029,6 +1045,12 @@ def finalize_draft_invoice(invoice):
 		log_error("Invoice creation for next month failed", invoice=invoice.name)
 
 
+def get_usage_key(row, rate):
+	"""Key that identifies the invoice item a usage record is billed under"""
+	site = row.site if row.document_type == "Marketplace App" else None
+	return (row.document_type, row.document_name, row.plan, rate, site)
+
+
 def calculate_gst(amount):
 	return amount * 0.18
 
@@ -44,6 +44,57 @@ class TestInvoice(unittest.TestCase):
 
 		self.assertEqual(invoice.amount_due, 60)
 
+	def test_invoice_add_usage_records_in_one_save(self):
+		from press.press.doctype.usage_record.usage_record import update_usage_in_invoices
+
+		invoice = frappe.get_doc(
+			doctype="Invoice",
+			team=self.team.name,
+			period_start=today(),
+			period_end=add_days(today(), 10),
+		).insert()
+
+		usage_records = []
+		for amount in [10, 10, 20]:
+			usage_record = frappe.get_doc(doctype="Usage Record", team=self.team.name, amount=amount)
+			usage_record.flags.defer_invoice_update = True
+			usage_record.insert()
+			usage_record.submit()
+			usage_records.append(usage_record.name)
+
+		with patch.object(Invoice, "save", autospec=True, side_effect=Invoice.save) as save:
+			update_usage_in_invoices(usage_records)
+
+		invoice.reload()
+		self.assertEqual(save.call_count, 1)
+		self.assertEqual(len(invoice.items), 2)
+		self.assertEqual(invoice.total, 40)
+		self.assertEqual(
+			frappe.get_all("Usage Record", {"name": ("in", usage_records)}, pluck="invoice", distinct=True),
+			[invoice.name],
+		)
+
+	def test_usage_records_linked_since_read_are_not_added_again(self):
+		invoice = frappe.get_doc(
+			doctype="Invoice",
+			team=self.team.name,
+			period_start=today(),
+			period_end=add_days(today(), 10),
+		).insert()
+
+		usage_record = frappe.get_doc(doctype="Usage Record", team=self.team.name, amount=10)
+		usage_record.insert()
+		usage_record.submit()
+
+		# Read before it got linked, e.g. by another shard or link_unlinked_usage_records
+		stale_record = frappe._dict(usage_record.as_dict(), invoice=None)
+		invoice.reload()
+		invoice.add_usage_records([stale_record])
+
+		invoice.reload()
+		self.assertEqual(len(invoice.items), 1)
+		self.assertEqual(invoice.items[0].quantity, 1)
+
 	def test_invoice_cancel_usage_record(self):
 		invoice = frappe.get_doc(
 			doctype="Invoice",
@@ -2,6 +2,8 @@
 # For license information, please see license.txt
 from __future__ import annotations
 
+import shutil
+
 import boto3
 import frappe
 from boto3.session import Session
@@ -26,6 +28,7 @@ class PressSettings(Document):
 		from press.press.doctype.erpnext_app.erpnext_app import ERPNextApp
 
 		agent_github_access_token: DF.Data | None
+		agent_job_reconciliation_interval: DF.Int
 		agent_repository_owner: DF.Data | None
 		agent_sentry_dsn: DF.Data | None
 		app_include_script: DF.Data | None
@@ -40,6 +43,8 @@ class PressSettings(Document):
 		backup_rotation_scheme: DF.Literal["FIFO", "Grandfather-father-son"]
 		bench_configuration: DF.Code
 		branch: DF.Data | None
+		build_context_compression: DF.Literal["Gzip", "Zstandard"]
+		build_context_upload_chunk_size: DF.Int
 		build_directory: DF.Data | None
 		build_server: DF.Link | None
 		central_migration_server: DF.Link | None
@@ -154,9 +159,11 @@ class PressSettings(Document):
 		twilio_api_key_sid: DF.Data | None
 		twilio_phone_number: DF.Phone | None
 		usage_record_creation_batch_size: DF.Int
+		usage_record_creation_shards: DF.Int
 		usd_rate: DF.Float
 		use_app_cache: DF.Check
 		use_delta_builds: DF.Check
+		use_incremental_build_context: DF.Check
 		use_staging_ca: DF.Check
 		verify_cards_with_micro_charge: DF.Literal["No", "Only INR", "Only USD", "Both INR and USD"]
 		webroot_directory: DF.Data | None
@@ -167,6 +174,10 @@ class PressSettings(Document):
 		"partnership_fee_usd",
 	)
 
+	def validate(self):
+		if self.build_context_compression == "Zstandard" and not shutil.which("zstd"):
+			frappe.throw("Zstandard compression needs the <b>zstd</b> binary installed on this server")
+
 	@frappe.whitelist()
 	def create_stripe_webhook(self):
 		stripe = get_stripe()
@@ -3,12 +3,14 @@
 # For license information, please see license.txt
 
 
+from __future__ import annotations
+
 import json
 import pprint
 
 import frappe
 import requests
-from boto3 import client, resource
+from boto3 import client
 from frappe.model.document import Document
 from frappe.utils.password import get_decrypted_password
 
@@ -76,52 +78,186 @@ def poll_file_statuses():
 
 
 def poll_file_statuses_from_bucket(bucket):
-	from press.utils import chunk
-
-	s3 = resource(
+	s3 = client(
 		"s3",
 		aws_access_key_id=bucket["access_key_id"],
 		aws_secret_access_key=bucket["secret_access_key"],
 		region_name=bucket["region"],
 	)
+	BucketReconciler(s3, bucket["name"]).run()
+
+
+class BucketReconciler:
+	"""
+	Reconciles Remote Files with the objects in an S3 bucket.
+
+	The bucket is walked one top level prefix (first path segment) at a time,
+	in the order S3 lists keys. For every prefix, S3 keys are merge-joined
+	with the Remote Files of that prefix sorted by file_path, so memory is
+	bounded by the largest prefix instead of the whole bucket.
+
+	Prefixes are used instead of ranges of file_path because MariaDB orders
+	file_path by its collation while S3 orders keys by their UTF-8 bytes.
+
+	Status changes and orphan deletions are flushed in batches. The last
+	flushed prefix is saved as a continuation token, and an interrupted run
+	resumes after it.
+	"""
+
+	batch_size = 1000
+	checkpoint_expiry = 2 * 24 * 60 * 60
+
+	def __init__(self, s3, bucket: str):
+		self.s3 = s3
+		self.bucket = bucket
+		self.checkpoint_key = f"poll_file_statuses:{bucket}"
+		self.root_keys = set()
+		self._reset()
+
+	def _reset(self):
+		self.set_to_available = []
+		self.set_to_unavailable = []
+		self.files_only_on_s3 = []
+
+	def run(self):
+		from press.utils.jobs import has_job_timeout_exceeded
+
+		after = frappe.cache.get_value(self.checkpoint_key) or ""
+		for prefix in self.get_prefixes(after):
+			self.reconcile(prefix)
+			if has_job_timeout_exceeded():
+				self.flush(checkpoint=prefix)
+				return
+			if self.pending >= self.batch_size:
+				self.flush(checkpoint=prefix)
+		self.flush(checkpoint=None)
 
-	available_files = set()
-	for s3_object in s3.Bucket(bucket["name"]).objects.all():
-		available_files.add(s3_object.key)
-
-	doctype = "Remote File"
-	remote_files = frappe.get_all(
-		doctype,
-		fields=["name", "file_path", "status"],
-		filters={"bucket": bucket["name"]},
-	)
+	@property
+	def pending(self) -> int:
+		return len(self.set_to_available) + len(self.set_to_unavailable) + len(self.files_only_on_s3)
+
+	def get_prefixes(self, after: str) -> list[str]:
+		"""Sorted union of top level prefixes on S3 and in Remote Files"""
+		prefixes = self.get_s3_prefixes(after) | self.get_remote_file_prefixes()
+		return sorted(prefix for prefix in prefixes if prefix and prefix > after)
+
+	def get_s3_prefixes(self, after: str) -> set[str]:
+		prefixes = set()
+		paginator = self.s3.get_paginator("list_objects_v2")
+		for page in paginator.paginate(Bucket=self.bucket, Delimiter="/", StartAfter=after):
+			for common_prefix in page.get("CommonPrefixes", []):
+				prefixes.add(common_prefix["Prefix"].rstrip("/"))
+			for s3_object in page.get("Contents", []):
+				# Keys without a "/" are their own prefix
+				self.root_keys.add(s3_object["Key"])
+				prefixes.add(s3_object["Key"])
+		return prefixes
+
+	def get_remote_file_prefixes(self) -> set[str]:
+		return set(
+			frappe.db.sql(
+				"""
+				SELECT DISTINCT SUBSTRING_INDEX(file_path, '/', 1)
+				FROM `tabRemote File`
+				WHERE bucket = %s
+				""",
+				(self.bucket,),
+				pluck=True,
+			)
+		)
 
-	set_to_available = []
-	set_to_unavailable = []
-	for remote_file in remote_files:
-		name, file_path, status = (
-			remote_file["name"],
-			remote_file["file_path"],
-			remote_file["status"],
+	def get_s3_keys(self, prefix: str):
+		"""S3 keys under `prefix` in listing order"""
+		if prefix in self.root_keys:
+			yield prefix
+		paginator = self.s3.get_paginator("list_objects_v2")
+		for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{prefix}/"):
+			for s3_object in page.get("Contents", []):
+				yield s3_object["Key"]
+
+	def get_remote_files(self, prefix: str) -> list[dict]:
+		"""Remote Files under `prefix` sorted the way S3 lists keys"""
+		like = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+		remote_files = frappe.db.sql(
+			"""
+			SELECT name, file_path, status
+			FROM `tabRemote File`
+			WHERE bucket = %s AND (file_path = %s OR file_path LIKE %s)
+			""",
+			(self.bucket, prefix, f"{like}/%"),
+			as_dict=True,
 		)
-		if file_path not in available_files:
-			if status == "Available":
-				set_to_unavailable.append(name)
+		# LIKE matches case insensitively, python compares code points like S3
+		return sorted(
+			(
+				remote_file
+				for remote_file in remote_files
+				if remote_file.file_path == prefix or remote_file.file_path.startswith(f"{prefix}/")
+			),
+			key=lambda remote_file: remote_file.file_path,
+		)
+
+	def reconcile(self, prefix: str):
+		# List S3 before reading Remote Files, objects are uploaded before
+		# their Remote File is created and must not be mistaken for orphans
+		s3_keys = list(self.get_s3_keys(prefix))
+		remote_files = self.get_remote_files(prefix)
+		for key, remote_file in merge_join(s3_keys, remote_files):
+			if not remote_file:
+				self.files_only_on_s3.append(key)
+			elif not key:
+				if remote_file.status == "Available":
+					self.set_to_unavailable.append(remote_file.name)
+			elif remote_file.status == "Unavailable":
+				self.set_to_available.append(remote_file.name)
+
+	def flush(self, checkpoint: str | None):
+		from press.utils import chunk
+
+		doctype = "Remote File"
+		for files in chunk(self.set_to_unavailable, self.batch_size):
+			frappe.db.set_value(doctype, {"name": ("in", files)}, "status", "Unavailable")
+
+		for files in chunk(self.set_to_available, self.batch_size):
+			frappe.db.set_value(doctype, {"name": ("in", files)}, "status", "Available")
+
+		# Delete s3 files that are not tracked with Remote Files
+		if self.files_only_on_s3:
+			delete_s3_files({self.bucket: self.files_only_on_s3})
+		frappe.db.commit()
+
+		if checkpoint:
+			frappe.cache.set_value(self.checkpoint_key, checkpoint, expires_in_sec=self.checkpoint_expiry)
 		else:
-			if status == "Unavailable":
-				set_to_available.append(name)
+			frappe.cache.delete_value(self.checkpoint_key)
+		self._reset()
+
 
-	for files in chunk(set_to_unavailable, 1000):
-		frappe.db.set_value(doctype, {"name": ("in", files)}, "status", "Unavailable")
+def merge_join(keys, remote_files):
+	"""
+	Pair sorted S3 keys with Remote Files sorted by file_path
 
-	for files in chunk(set_to_available, 1000):
-		frappe.db.set_value(doctype, {"name": ("in", files)}, "status", "Available")
+	Yields (key, remote_file) tuples, with None for the side that is missing.
+	"""
+	remote_files = iter(remote_files)
+	remote_file = next(remote_files, None)
+	for key in keys:
+		while remote_file and remote_file.file_path < key:
+			yield None, remote_file
+			remote_file = next(remote_files, None)
 
-	# Delete s3 files that are not tracked with Remote Files
-	remote_file_paths = set(file["file_path"] for file in remote_files)
-	file_only_on_s3 = available_files - remote_file_paths
-	delete_s3_files({bucket["name"]: list(file_only_on_s3)})
-	frappe.db.commit()
+		if not (remote_file and remote_file.file_path == key):
+			yield key, None
+			continue
+
+		# Several Remote Files can point to the same key
+		while remote_file and remote_file.file_path == key:
+			yield key, remote_file
+			remote_file = next(remote_files, None)
+
+	while remote_file:
+		yield None, remote_file
+		remote_file = next(remote_files, None)
 
 
 def delete_remote_backup_objects(remote_files):
@@ -288,3 +424,7 @@ def delete_s3_files(buckets):
 			frappe.get_doc(
 				doctype="Remote Operation Log", operation_type="Delete Files", response=response
 			).insert()
+
+
+def on_doctype_update():
+	frappe.db.add_index("Remote File", ["bucket", "file_path(255)"])
@@ -6,8 +6,16 @@
 import unittest
 from datetime import datetime
 from typing import Optional
+from unittest.mock import MagicMock, patch
 
+import boto3
 import frappe
+from moto import mock_aws
+
+from press.press.doctype.remote_file.remote_file import (
+	merge_join,
+	poll_file_statuses_from_bucket,
+)
 
 
 def create_test_remote_file(
@@ -15,16 +23,19 @@ def create_test_remote_file(
 	creation: datetime = None,
 	file_path: str = None,
 	file_size: int = 1024,
+	bucket: Optional[str] = None,
+	status: str = "Available",
 ):
 	"""Create test remote file doc for required timestamp."""
 	creation = creation or frappe.utils.now_datetime()
 	remote_file = frappe.get_doc(
 		{
 			"doctype": "Remote File",
-			"status": "Available",
+			"status": status,
 			"site": site,
 			"file_path": file_path,
 			"file_size": file_size,
+			"bucket": bucket,
 		}
 	).insert(ignore_if_duplicate=True)
 	remote_file.db_set("creation", creation)
@@ -33,4 +44,61 @@ def create_test_remote_file(
 
 
 class TestRemoteFile(unittest.TestCase):
-	pass
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_merge_join_pairs_keys_with_remote_files(self):
+		remote_files = [
+			frappe._dict(name="RF-1", file_path="a/1"),
+			frappe._dict(name="RF-2", file_path="a/2"),
+			frappe._dict(name="RF-3", file_path="a/2"),
+			frappe._dict(name="RF-4", file_path="a/4"),
+		]
+		pairs = [
+			(key, remote_file and remote_file.name)
+			for key, remote_file in merge_join(["a/0", "a/2", "a/3"], remote_files)
+		]
+		self.assertEqual(
+			pairs,
+			[
+				("a/0", None),
+				(None, "RF-1"),
+				("a/2", "RF-2"),
+				("a/2", "RF-3"),
+				("a/3", None),
+				(None, "RF-4"),
+			],
+		)
+
+	@mock_aws
+	@patch("press.press.doctype.remote_file.remote_file.frappe.db.commit", new=MagicMock)
+	@patch("press.press.doctype.remote_file.remote_file.delete_s3_files")
+	def test_poll_file_statuses_from_bucket(self, mock_delete_s3_files):
+		bucket = "test-backups"
+		s3 = boto3.client("s3", region_name="us-east-1")
+		s3.create_bucket(Bucket=bucket)
+		for key in ("site1/backup.sql.gz", "site1/files.tar", "site3/orphan.tar", "config.json"):
+			s3.put_object(Bucket=bucket, Key=key, Body=b"")
+
+		available = create_test_remote_file(file_path="site1/backup.sql.gz", bucket=bucket)
+		restored = create_test_remote_file(file_path="site1/files.tar", bucket=bucket, status="Unavailable")
+		missing = create_test_remote_file(file_path="site2/backup.sql.gz", bucket=bucket)
+		config = create_test_remote_file(file_path="config.json", bucket=bucket)
+
+		poll_file_statuses_from_bucket(
+			{
+				"name": bucket,
+				"region": "us-east-1",
+				"access_key_id": "test",
+				"secret_access_key": "test",
+			}
+		)
+
+		for remote_file in (available, restored, missing, config):
+			remote_file.reload()
+		self.assertEqual(available.status, "Available")
+		self.assertEqual(restored.status, "Available")
+		self.assertEqual(missing.status, "Unavailable")
+		self.assertEqual(config.status, "Available")
+		mock_delete_s3_files.assert_called_once_with({bucket: ["site3/orphan.tar"]})
+		self.assertIsNone(frappe.cache.get_value(f"poll_file_statuses:{bucket}"))
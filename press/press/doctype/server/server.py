@@ -1165,50 +1165,44 @@ class BaseServer(Document, TagHelpers):
 			log_error("Cloud Init Wait Exception", server=self.as_dict())
 
 	def free_space(self, mountpoint: str) -> int:
-		from press.api.server import prometheus_query
-
-		response = prometheus_query(
-			f"""node_filesystem_avail_bytes{{instance="{self.name}", job="node", mountpoint="{mountpoint}"}}""",
-			lambda x: x["mountpoint"],
-			"Asia/Kolkata",
-			60,
-			60,
-		)["datasets"]
-		if response:
-			return response[0]["values"][-1]
+		from press.utils.prometheus import get_values_by_instance
+
+		free_space = (
+			get_values_by_instance('node_filesystem_avail_bytes{job="node"}', "mountpoint")
+			.get(self.name, {})
+			.get(mountpoint)
+		)
+		if free_space is not None:
+			return free_space
 		return 50 * 1024 * 1024 * 1024  # Assume 50GB free space
 
 	def is_disk_full(self, mountpoint: str) -> bool:
 		return self.free_space(mountpoint) == 0
 
 	def space_available_in_6_hours(self, mountpoint: str) -> int:
-		from press.api.server import prometheus_query
-
-		response = prometheus_query(
-			f"""predict_linear(
-node_filesystem_avail_bytes{{instance="{self.name}", mountpoint="{mountpoint}"}}[3h], 6*3600
-			)""",
-			lambda x: x["mountpoint"],
-			"Asia/Kolkata",
-			120,
-			120,
-		)["datasets"]
-		if not response:
+		from press.utils.prometheus import get_values_by_instance
+
+		space_available = (
+			get_values_by_instance(
+				'predict_linear(node_filesystem_avail_bytes{job="node"}[3h], 6*3600)', "mountpoint"
+			)
+			.get(self.name, {})
+			.get(mountpoint)
+		)
+		if space_available is None:
 			return -20 * 1024 * 1024 * 1024
-		return response[0]["values"][-1]
+		return space_available
 
 	def disk_capacity(self, mountpoint: str) -> int:
-		from press.api.server import prometheus_query
-
-		response = prometheus_query(
-			f"""node_filesystem_size_bytes{{instance="{self.name}", job="node", mountpoint="{mountpoint}"}}""",
-			lambda x: x["mountpoint"],
-			"Asia/Kolkata",
-			120,
-			120,
-		)["datasets"]
-		if response:
-			return response[0]["values"][-1]
+		from press.utils.prometheus import get_values_by_instance
+
+		capacity = (
+			get_values_by_instance('node_filesystem_size_bytes{job="node"}', "mountpoint")
+			.get(self.name, {})
+			.get(mountpoint)
+		)
+		if capacity is not None:
+			return capacity
 		return frappe.db.get_value("Virtual Machine", self.virtual_machine, "disk_size") * 1024 * 1024 * 1024
 
 	def size_to_increase_by_for_20_percent_available(self, mountpoint: str):  # min 50 GB, max 250 GB
@@ -140,5 +140,26 @@ class TestServer(unittest.TestCase):
 		self.assertEqual(server.team, subscription.team)
 		self.assertEqual(server.plan, subscription.plan)
 
+	def test_disk_stats_of_all_servers_come_from_one_query(self):
+		from press.utils.prometheus import PrometheusClient
+
+		server1 = create_test_server()
+		server2 = create_test_server()
+		result = [
+			{"metric": {"instance": server1.name, "mountpoint": "/"}, "value": [0, "1024"]},
+			{"metric": {"instance": server2.name, "mountpoint": "/"}, "value": [0, "2048"]},
+			{
+				"metric": {"instance": server2.name, "mountpoint": "/opt/volumes/mariadb"},
+				"value": [0, "4096"],
+			},
+		]
+		frappe.cache.delete_keys("prometheus_instant:")
+		with patch.object(PrometheusClient, "query", return_value=result) as query:
+			self.assertEqual(server1.free_space("/"), 1024)
+			self.assertEqual(server2.free_space("/"), 2048)
+			self.assertEqual(server2.free_space("/opt/volumes/mariadb"), 4096)
+			self.assertEqual(server1.free_space("/opt/volumes/mariadb"), 50 * 1024 * 1024 * 1024)
+		query.assert_called_once()
+
 	def tearDown(self):
 		frappe.db.rollback()
@@ -20,6 +20,7 @@ from press.press.doctype.site.site import Site
 from press.press.doctype.site_backup.site_backup import SiteBackup
 from press.press.doctype.subscription.subscription import Subscription
 from press.utils import log_error
+from press.utils.jobs import has_job_timeout_exceeded
 
 
 def timing(f):
@@ -41,20 +42,22 @@ class BackupRotationScheme:
 	Rotation is maintained by controlled deletion of daily backups.
 	"""
 
+	chunk_size = 500  # no. of backups expired per transaction
+
 	def _expire_and_get_remote_files(
 		self, offsite_backups: List[Dict[str, str]]
 	) -> List[str]:
-		"""Mark backup as unavailable and return remote files to delete."""
-		remote_files_to_delete = []
-		for backup in offsite_backups:
-			remote_files = frappe.db.get_value(
-				"Site Backup",
-				backup,
-				["remote_database_file", "remote_private_file", "remote_public_file"],
-			)
-			remote_files_to_delete.extend(remote_files)
-			frappe.db.set_value("Site Backup", backup, "files_availability", "Unavailable")
-		return remote_files_to_delete
+		"""Mark backups as unavailable and return remote files to delete."""
+		if not offsite_backups:
+			return []
+		filters = {"name": ("in", [backup["name"] for backup in offsite_backups])}
+		remote_files = frappe.db.get_values(
+			"Site Backup",
+			filters,
+			["remote_database_file", "remote_private_file", "remote_public_file"],
+		)
+		frappe.db.set_value("Site Backup", filters, "files_availability", "Unavailable")
+		return [file for files in remote_files for file in files]
 
 	def expire_local_backups(self):
 		"""Mark local backups deleted by FF as unavailable."""
@@ -96,14 +99,24 @@ class BackupRotationScheme:
 				"Unavailable",
 			)
 
+	def get_expired_offsite_backups(self) -> List[Dict[str, str]]:
+		"""Return offsite backups that have expired under the rotation scheme."""
+		raise NotImplementedError
+
 	def expire_offsite_backups(self) -> List[str]:
 		"""Expire and return list of offsite backups to delete."""
-		raise NotImplementedError
+		return self._expire_and_get_remote_files(self.get_expired_offsite_backups())
 
 	def cleanup_offsite(self):
 		"""Expire backups according to the rotation scheme."""
-		expired_remote_files = self.expire_offsite_backups()
-		delete_remote_backup_objects(expired_remote_files)
+		expired_backups = self.get_expired_offsite_backups()
+		for i in range(0, len(expired_backups), self.chunk_size):
+			if has_job_timeout_exceeded():
+				# Expired backups are still Available, next run resumes from here
+				return
+			chunk = expired_backups[i : i + self.chunk_size]
+			delete_remote_backup_objects(self._expire_and_get_remote_files(chunk))
+			frappe.db.commit()
 
 
 class FIFO(BackupRotationScheme):
@@ -114,22 +127,28 @@ class FIFO(BackupRotationScheme):
 			frappe.db.get_single_value("Press Settings", "offsite_backups_count") or 30
 		)
 
-	def expire_offsite_backups(self) -> List[str]:
-		offsite_expiry = self.offsite_backups_count
-		to_be_expired_backups = []
-		sites = frappe.get_all("Site", {"status": ("!=", "Archived")}, pluck="name")
-		for site in sites:
-			to_be_expired_backups += frappe.get_all(
-				"Site Backup",
-				filters={
-					"site": site,
-					"status": "Success",
-					"files_availability": "Available",
-					"offsite": True,
-				},
-				order_by="creation desc",
-			)[offsite_expiry:]
-		return self._expire_and_get_remote_files(to_be_expired_backups)
+	def get_expired_offsite_backups(self) -> List[Dict[str, str]]:
+		return frappe.db.sql(
+			"""
+			SELECT name FROM (
+				SELECT
+					backup.name,
+					ROW_NUMBER() OVER (
+						PARTITION BY backup.site ORDER BY backup.creation DESC
+					) AS backup_rank
+				FROM `tabSite Backup` backup
+				JOIN tabSite site ON site.name = backup.site
+				WHERE
+					site.status != "Archived" and
+					backup.status = "Success" and
+					backup.files_availability = "Available" and
+					backup.offsite = True
+			) backups
+			WHERE backup_rank > %s
+			""",
+			(self.offsite_backups_count,),
+			as_dict=True,
+		)
 
 
 class GFS(BackupRotationScheme):
@@ -147,13 +166,16 @@ class GFS(BackupRotationScheme):
 	monthly_backup_day = 1  # days of the month (1-31)
 	yearly_backup_day = 1  # days of the year (1-366)
 
-	def expire_offsite_backups(self) -> List[str]:
+	def get_expired_offsite_backups(self) -> List[Dict[str, str]]:
 		today = frappe.utils.getdate()
 		oldest_daily = today - timedelta(days=self.daily)
 		oldest_weekly = today - timedelta(weeks=4)
 		oldest_monthly = today - timedelta(days=366)
 		oldest_yearly = today - timedelta(days=3653)
-		to_be_expired_backups = frappe.db.sql(
+		# XXX: DAYOFWEEK in sql gives 1-7 for SUN-SAT in sql
+		# datetime.weekday() in python gives 0-6 for MON-SUN
+		# datetime.isoweekday() in python gives 1-7 for MON-SUN
+		return frappe.db.sql(
 			f"""
 			SELECT name from `tabSite Backup`
 			WHERE
@@ -168,11 +190,6 @@ class GFS(BackupRotationScheme):
 			""",
 			as_dict=True,
 		)
-		# XXX: DAYOFWEEK in sql gives 1-7 for SUN-SAT in sql
-		# datetime.weekday() in python gives 0-6 for MON-SUN
-		# datetime.isoweekday() in python gives 1-7 for MON-SUN
-
-		return self._expire_and_get_remote_files(to_be_expired_backups)
 
 
 class ScheduledBackupJob:
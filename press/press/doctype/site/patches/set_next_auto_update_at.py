@@ -0,0 +1,28 @@
+# Copyright (c) 2026, Frappe Technologies Pvt. Ltd. and Contributors
+# For license information, please see license.txt
+import frappe
+from frappe.utils import now_datetime
+
+from press.press.doctype.site_update.scheduled_auto_updates import (
+	SCHEDULE_FIELDS,
+	get_next_auto_update_at,
+)
+
+
+def execute():
+	frappe.reload_doctype("Site")
+	sites = frappe.get_all(
+		"Site",
+		filters={"status": ("!=", "Archived"), "skip_auto_updates": False},
+		fields=["name", *SCHEDULE_FIELDS],
+	)
+	# Slots that already passed today are not run right after the deploy
+	now = now_datetime()
+	for site in sites:
+		frappe.db.set_value(
+			"Site",
+			site.name,
+			"next_auto_update_at",
+			get_next_auto_update_at(site, now),
+			update_modified=False,
+		)
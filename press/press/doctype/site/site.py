@@ -11,11 +11,9 @@ from contextlib import suppress
 from functools import cached_property, wraps
 from typing import Any
 
-import dateutil.parser
 import frappe
 import frappe.data
 import frappe.utils
-import pytz
 import requests
 from frappe import _
 from frappe.core.utils import find
@@ -33,10 +31,6 @@ from frappe.utils import (
 	now_datetime,
 	sbool,
 	time_diff_in_hours,
-	get_weekday,
-	date_diff,
-	get_date_str,
-	time_diff_in_seconds
 )
 from frappe.model.rename_doc import get_link_fields
 from frappe.model.docstatus import DocStatus
@@ -54,13 +48,6 @@ from press.marketplace.doctype.marketplace_app_plan.marketplace_app_plan import
 )
 from press.utils.webhook import create_webhook_event
 
-try:
-	from frappe.utils import convert_utc_to_user_timezone
-except ImportError:
-	from frappe.utils import (
-		convert_utc_to_system_timezone as convert_utc_to_user_timezone,
-	)
-
 from typing import TYPE_CHECKING
 
 from frappe.utils.password import get_decrypted_password
@@ -77,12 +64,18 @@ from press.press.doctype.marketplace_app.marketplace_app import (
 from press.press.doctype.resource_tag.tag_helpers import TagHelpers
 from press.press.doctype.server.server import is_dedicated_server
 from press.press.doctype.site_activity.site_activity import log_site_activity
+from press.press.doctype.site.sync import (
+	get_new_site_usages,
+	get_synced_config,
+	get_synced_timezone,
+)
 from press.press.doctype.site_analytics.site_analytics import create_site_analytics
 from press.press.doctype.site_plan.site_plan import UNLIMITED_PLANS, get_plan_config
 from press.press.report.mariadb_slow_queries.mariadb_slow_queries import (
 	get_doctype_name,
 )
 from press.utils import (
+	bulk_insert_docs,
 	convert,
 	fmt_timedelta,
 	get_client_blacklisted_keys,
@@ -157,6 +150,7 @@ class Site(Document, TagHelpers):
 		hybrid_saas_pool: DF.Link | None
 		is_erpnext_setup: DF.Check
 		is_standby: DF.Check
+		next_auto_update_at: DF.Datetime | None
 		notify_email: DF.Data | None
 		only_update_at_specified_time: DF.Check
 		plan: DF.Link | None
@@ -345,6 +339,7 @@ class Site(Document, TagHelpers):
 		self.validate_host_name()
 		self.validate_site_config()
 		self.validate_auto_update_fields()
+		self.set_next_auto_update_at()
 		self.validate_site_plan()
 
 	def before_insert(self):
@@ -443,6 +438,22 @@ class Site(Document, TagHelpers):
 		if not (1 <= self.update_on_day_of_month <= 31):
 			frappe.throw("Day of the month must be between 1 and 31 (included)!")
 
+	def set_next_auto_update_at(self):
+		from press.press.doctype.site_update.scheduled_auto_updates import (
+			SCHEDULE_FIELDS,
+			get_next_auto_update_at,
+		)
+
+		fields = ("skip_auto_updates", *SCHEDULE_FIELDS)
+		if not self.is_new() and not any(self.has_value_changed(field) for field in fields):
+			return
+
+		# Start from now, so that a slot that passed earlier today doesn't update
+		# a site as soon as it's created, unskipped or rescheduled
+		self.next_auto_update_at = (
+			None if self.skip_auto_updates else get_next_auto_update_at(self, now_datetime())
+		)
+
 	def validate_site_plan(self):
 		if hasattr(self, "subscription_plan") and self.subscription_plan:
 			"""
@@ -1516,19 +1527,16 @@ class Site(Document, TagHelpers):
 			"creation": last_usage.creation,
 		}
 
-	def _sync_config_info(self, fetched_config: dict) -> bool:
+	def _sync_config_info(self, fetched_config: dict, blacklisted_keys: set | None = None) -> bool:
 		"""Update site doc config with the fetched_config values.
 
 		:fetched_config: Generally data passed is the config part of the agent info response
 		:returns: True if value has changed
 		"""
-		config = {
-			key: fetched_config[key] for key in fetched_config if key not in get_client_blacklisted_keys()
-		}
-		new_config = {**json.loads(self.config or "{}"), **config}
-		current_config = json.dumps(new_config, indent=4)
-
-		if self.config != current_config:
+		if blacklisted_keys is None:
+			blacklisted_keys = set(get_client_blacklisted_keys())
+		new_config = get_synced_config(self.config, fetched_config, blacklisted_keys)
+		if new_config is not None:
 			self._update_configuration(new_config, save=False)
 			return True
 		return False
@@ -1538,50 +1546,7 @@ class Site(Document, TagHelpers):
 
 		:fetched_usage: Requires backups, database, public, private keys with Numeric values
 		"""
-
-		if isinstance(fetched_usage, list):
-			for usage in fetched_usage:
-				self._insert_site_usage(usage)
-		else:
-			self._insert_site_usage(fetched_usage)
-
-	def _insert_site_usage(self, usage: dict):
-		current_usages = self.get_disk_usages()
-		site_usage_data = {
-			"site": self.name,
-			"backups": usage["backups"],
-			"database": usage["database"],
-			"database_free": usage.get("database_free", 0),
-			"database_free_tables": json.dumps(usage.get("database_free_tables", []), indent=1),
-			"public": usage["public"],
-			"private": usage["private"],
-		}
-
-		same_as_last_usage = (
-			current_usages["backups"] == site_usage_data["backups"]
-			and current_usages["database"] == site_usage_data["database"]
-			and current_usages["public"] == site_usage_data["public"]
-			and current_usages["private"] == site_usage_data["private"]
-			and current_usages["database_free"] == site_usage_data["private"]
-		)
-
-		if same_as_last_usage:
-			return
-
-		equivalent_site_time = None
-		if usage.get("timestamp"):
-			equivalent_site_time = convert_utc_to_user_timezone(
-				dateutil.parser.parse(usage["timestamp"])
-			).replace(tzinfo=None)
-			if frappe.db.exists("Site Usage", {"site": self.name, "creation": equivalent_site_time}):
-				return
-			if current_usages["creation"] and equivalent_site_time < current_usages["creation"]:
-				return
-
-		site_usage = frappe.get_doc({"doctype": "Site Usage", **site_usage_data}).insert()
-
-		if equivalent_site_time:
-			site_usage.db_set("creation", equivalent_site_time)
+		bulk_insert_docs(get_new_site_usages(self.name, fetched_usage, self.get_disk_usages()))
 
 	def _sync_timezone_info(self, timezone: str) -> bool:
 		"""Update site doc timezone with the passed value of timezone.
@@ -1589,14 +1554,7 @@ class Site(Document, TagHelpers):
 		:timezone: Timezone passed in part of the agent info response
 		:returns: True if value has changed
 		"""
-		# Validate timezone string
-		# Empty string is fine, since we default to IST
-		if timezone:
-			try:
-				pytz.timezone(timezone)
-			except pytz.exceptions.UnknownTimeZoneError:
-				return False
-
+		timezone = get_synced_timezone(self.timezone, timezone)
 		if self.timezone != timezone:
 			self.timezone = timezone
 			return True
@@ -4013,59 +3971,40 @@ def raise_link_exists_exception(doc, reference_doctype, reference_docname, row="
 	)
 
 
+# Seconds after the scheduled time within which auto_update_all_sites runs an update
+AUTO_UPDATE_WINDOW = 300
+
+
 def auto_update_all_sites():
-	sites = frappe.get_all(
-		"Site",
-		filters={
+	from press.press.doctype.site_update.scheduled_auto_updates import get_sites_due_for_auto_update
+
+	sites = get_sites_due_for_auto_update(
+		{
 			"status": "Active",
 			"domain": "prod",
 			"skip_auto_updates": 0,
 		},
-		pluck="name",
+		frequencies=("Daily", "Weekly", "Every 2 Weeks"),
+		window=AUTO_UPDATE_WINDOW,
 	)
 
 	for site in sites:
 		try:
-			check_auto_update_schedule(site)
+			check_auto_update_schedule(site.name)
 		except Exception as e:
 			log_error(
 				title="Auto Update Check Error",
-				site=site
+				site=site.name
 			)
 
 
 def check_auto_update_schedule(site_name):
-	"""Check if auto update is scheduled and run if required"""
+	"""Run auto update for a site that is due"""
 
 	site = frappe.get_doc("Site", site_name)
 
 	if site.domain != "prod" or site.skip_auto_updates:
 		return
 
-	frequency = site.update_trigger_frequency
-	day_to_update = site.update_on_weekday
-	time_to_update = site.update_trigger_time
-	start_date = site.update_start_date
-
-	cur_datetime = now_datetime()
-	cur_time = cur_datetime.strftime("%H:%M:%S.%f")
-	cur_day_of_week = get_weekday(cur_datetime)
-	day_diff = date_diff(get_date_str(cur_datetime), start_date)
-	time_diff = time_diff_in_seconds(cur_time, str(time_to_update))
-
-	update = False
-
-	if time_diff >= 0 and time_diff <= 300:
-		if (
-			frequency == "Every 2 Weeks"
-			and cur_day_of_week == day_to_update
-			and day_diff % 14 == 0
-		):
-			update = True
-		if frequency == "Weekly" and cur_day_of_week == day_to_update:
-			update = True
-		elif frequency == "Daily":
-			update = True
-
-	if update:
-		site.update_site()
+	# next_auto_update_at is moved ahead when update_site sets auto_update_last_triggered_on
+	site.update_site()
@@ -5,7 +5,9 @@ import frappe
 
 from press.api.analytics import get_current_cpu_usage_for_sites_on_server
 from press.press.doctype.site_plan.site_plan import get_plan_config
-from press.utils import log_error
+from press.utils import bulk_set_values, chunk, log_error
+
+USAGE_UPDATE_BATCH_SIZE = 500
 
 
 @functools.lru_cache(maxsize=128)
@@ -53,6 +55,7 @@ def update_cpu_usage_server(server):
 		fields=["name", "plan", "current_cpu_usage"],
 	)
 
+	updates = {}
 	for site in sites:
 		if site.name not in usage:
 			continue
@@ -62,18 +65,13 @@ def update_cpu_usage_server(server):
 			latest_cpu_usage = int((cpu_usage / cpu_limit) * 100)
 
 			if site.current_cpu_usage != latest_cpu_usage:
-				site_doc = frappe.get_doc("Site", site.name)
-				site_doc.current_cpu_usage = latest_cpu_usage
-				site_doc.save()
-				frappe.db.commit()
-		except rq.timeouts.JobTimeoutException:
-			frappe.db.rollback()
-			return
+				updates[site.name] = {"current_cpu_usage": latest_cpu_usage}
 		except Exception:
 			log_error(
 				"Site CPU Usage Update Error", site=site, cpu_usage=cpu_usage, cpu_limit=cpu_limit
 			)
-			frappe.db.rollback()
+
+	bulk_update_site_usages(updates)
 
 
 def update_disk_usages():
@@ -132,15 +130,30 @@ def update_disk_usages():
 		as_dict=True,
 	)
 
-	for usage in latest_disk_usages:
+	bulk_update_site_usages(
+		{
+			usage.site: {
+				"current_database_usage": usage.latest_database_usage,
+				"current_disk_usage": usage.latest_disk_usage,
+			}
+			for usage in latest_disk_usages
+		}
+	)
+
+
+def bulk_update_site_usages(updates):
+	"""Set usage fields of many sites, committing once per batch
+
+	Usage fields aren't read by any Site hook, so this skips document
+	validation and doesn't touch `modified`.
+	"""
+	for batch in chunk(list(updates.items()), USAGE_UPDATE_BATCH_SIZE):
 		try:
-			site = frappe.get_doc("Site", usage.site, for_update=True)
-			site.current_database_usage = usage.latest_database_usage
-			site.current_disk_usage = usage.latest_disk_usage
-			site.save()
+			bulk_set_values("Site", dict(batch), update_modified=False, chunk_size=USAGE_UPDATE_BATCH_SIZE)
 			frappe.db.commit()
-		except frappe.DoesNotExistError:
+		except rq.timeouts.JobTimeoutException:
 			frappe.db.rollback()
+			return
 		except Exception:
-			log_error("Site Disk Usage Update Error", usage=usage)
+			log_error("Site Usage Update Error", updates=dict(batch))
 			frappe.db.rollback()
@@ -1,7 +1,24 @@
 # Copyright (c) 2024, Frappe and contributors
 # For license information, please see license.txt
 
+from __future__ import annotations
+
+import json
+
+import dateutil.parser
 import frappe
+import pytz
+from frappe.utils import get_datetime
+
+from press.press.doctype.site_analytics.site_analytics import get_site_analytics_doc
+from press.utils import bulk_insert_docs, bulk_set_values, get_client_blacklisted_keys, log_error
+
+try:
+	from frappe.utils import convert_utc_to_user_timezone
+except ImportError:
+	from frappe.utils import (
+		convert_utc_to_system_timezone as convert_utc_to_user_timezone,
+	)
 
 
 def sync_setup_wizard_status():
@@ -25,3 +42,193 @@ def sync_setup_wizard_status():
 			frappe.db.commit()
 		except Exception:
 			frappe.db.rollback()
+
+
+def get_synced_config(current_config: str | None, fetched_config: dict, blacklisted_keys: set) -> dict | None:
+	"""Return `current_config` merged with the fetched keys visible to users, None if that changes nothing"""
+	config = json.loads(current_config or "{}")
+	new_config = {
+		**config,
+		**{key: value for key, value in fetched_config.items() if key not in blacklisted_keys},
+	}
+	return new_config if new_config != config else None
+
+
+def get_synced_timezone(current_timezone: str | None, timezone: str | None) -> str | None:
+	"""Return `timezone` unless it's unknown. Empty is fine, since we default to IST"""
+	if timezone:
+		try:
+			pytz.timezone(timezone)
+		except pytz.exceptions.UnknownTimeZoneError:
+			return current_timezone
+	return timezone
+
+
+def get_last_site_usages(sites: list[str]) -> dict[str, dict]:
+	if not sites:
+		return {}
+	usages = frappe.db.sql(
+		"""
+		SELECT
+			su.site, su.backups, su.`database`, su.database_free,
+			su.public, su.private, su.creation
+		FROM `tabSite Usage` su
+		JOIN (
+			SELECT site, MAX(creation) AS creation
+			FROM `tabSite Usage`
+			WHERE site IN %(sites)s
+			GROUP BY site
+		) latest ON su.site = latest.site AND su.creation = latest.creation
+		""",
+		{"sites": sites},
+		as_dict=True,
+	)
+	return {usage.site: usage for usage in usages}
+
+
+def get_new_site_usages(site: str, fetched_usage: dict | list[dict], last_usage: dict | None) -> list:
+	"""Build unsaved Site Usage docs for the usages that differ from and are newer than the last one
+
+	:fetched_usage: Requires backups, database, public, private keys with Numeric values
+	"""
+	last_usage = last_usage or {}
+	usages = []
+	for usage in fetched_usage if isinstance(fetched_usage, list) else [fetched_usage]:
+		site_usage = frappe.get_doc(
+			{
+				"doctype": "Site Usage",
+				"site": site,
+				"backups": usage["backups"],
+				"database": usage["database"],
+				"database_free": usage.get("database_free", 0),
+				"database_free_tables": json.dumps(usage.get("database_free_tables", []), indent=1),
+				"public": usage["public"],
+				"private": usage["private"],
+			}
+		)
+		fields = ("backups", "database", "database_free", "public", "private")
+		if all(last_usage.get(field) == site_usage.get(field) for field in fields):
+			continue
+
+		if usage.get("timestamp"):
+			site_usage.creation = convert_utc_to_user_timezone(
+				dateutil.parser.parse(usage["timestamp"])
+			).replace(tzinfo=None)
+			# The last usage is the newest one, so anything not after it is already recorded
+			if last_usage.get("creation") and site_usage.creation <= last_usage["creation"]:
+				continue
+
+		usages.append(site_usage)
+		last_usage = {field: site_usage.get(field) for field in fields}
+		last_usage["creation"] = site_usage.creation
+	return usages
+
+
+def sync_sites_info(bench: str, data: dict):
+	"""Sync usage, config, timezone and database name of sites on `bench` from the agent's sites info
+
+	Current values of all sites are read upfront. Sites whose config changed are
+	saved one at a time, since that rebuilds their configuration table. Timezone
+	and database name changes are written with batched UPDATEs and new Site Usage
+	rows are inserted together.
+	"""
+	sites = frappe.get_all(
+		"Site",
+		filters={"name": ("in", list(data))},
+		fields=["name", "config", "timezone", "database_name"],
+	)
+	last_usages = get_last_site_usages([site.name for site in sites])
+	blacklisted_keys = set(get_client_blacklisted_keys())
+
+	usages, updates, config_changed = [], {}, []
+	for site in sites:
+		info = data[site.name]
+		try:
+			usages.extend(get_new_site_usages(site.name, info["usage"], last_usages.get(site.name)))
+			if get_synced_config(site.config, info["config"], blacklisted_keys) is not None:
+				config_changed.append(site.name)
+				continue
+			timezone = get_synced_timezone(site.timezone, info["timezone"])
+			database_name = info["config"].get("db_name")
+			if (timezone, database_name) != (site.timezone, site.database_name):
+				updates[site.name] = {"timezone": timezone, "database_name": database_name}
+		except Exception:
+			log_error(
+				"Site Sync Error", site=site.name, info=info, reference_doctype="Bench", reference_name=bench
+			)
+
+	try:
+		bulk_set_values("Site", updates)
+		bulk_insert_docs(usages)
+		frappe.db.commit()
+	except Exception:
+		log_error("Site Sync Error", sites=list(updates), reference_doctype="Bench", reference_name=bench)
+		frappe.db.rollback()
+
+	for site in config_changed:
+		sync_site_config(bench, site, data[site], blacklisted_keys)
+
+
+def sync_site_config(bench: str, site: str, info: dict, blacklisted_keys: set):
+	try:
+		doc = frappe.get_doc("Site", site, for_update=True)
+		doc._sync_config_info(info["config"], blacklisted_keys)
+		doc._sync_timezone_info(info["timezone"])
+		doc._sync_database_name(info["config"])
+		doc.save()
+		frappe.db.commit()
+	except frappe.DoesNotExistError:
+		# Ignore: Site got renamed or deleted
+		pass
+	except Exception:
+		log_error("Site Sync Error", site=site, info=info, reference_doctype="Bench", reference_name=bench)
+		frappe.db.rollback()
+
+
+def sync_sites_analytics(bench: str, data: dict):
+	"""Insert Site Analytics of sites on `bench` from the agent, skipping the ones already recorded"""
+	analytics = {
+		site: data[site]
+		for site in frappe.get_all("Site", filters={"name": ("in", list(data))}, pluck="name")
+		if data[site]
+	}
+	if not analytics:
+		return
+
+	existing = {
+		(row.site, get_datetime(row.timestamp))
+		for row in frappe.get_all(
+			"Site Analytics",
+			filters={
+				"site": ("in", list(analytics)),
+				"timestamp": ("in", [site_analytics["timestamp"] for site_analytics in analytics.values()]),
+			},
+			fields=["site", "timestamp"],
+		)
+	}
+
+	docs = []
+	for site, site_analytics in analytics.items():
+		try:
+			if (site, get_datetime(site_analytics["timestamp"])) not in existing:
+				docs.append(get_site_analytics_doc(site, site_analytics))
+		except Exception:
+			log_error(
+				"Site Analytics Sync Error",
+				site=site,
+				analytics=site_analytics,
+				reference_doctype="Bench",
+				reference_name=bench,
+			)
+
+	try:
+		bulk_insert_docs(docs)
+		frappe.db.commit()
+	except Exception:
+		log_error(
+			"Site Analytics Sync Error",
+			sites=list(analytics),
+			reference_doctype="Bench",
+			reference_name=bench,
+		)
+		frappe.db.rollback()
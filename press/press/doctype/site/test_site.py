@@ -521,3 +521,60 @@ class TestSite(unittest.TestCase):
 		self.assertEqual(site.apps[0].app, "frappe")
 		self.assertEqual(site.apps[1].app, "erpnext")
 		self.assertEqual(site.apps[2].app, "crm")
+
+	@patch("press.press.doctype.site.site_usages.frappe.db.commit", new=Mock())
+	def test_bulk_update_site_usages_sets_only_usage_fields(self):
+		from press.press.doctype.site.site_usages import bulk_update_site_usages
+
+		site1 = create_test_site()
+		site2 = create_test_site()
+		site2.db_set("current_database_usage", 40)
+		modified = frappe.db.get_value("Site", site1.name, "modified")
+
+		bulk_update_site_usages(
+			{
+				site1.name: {"current_cpu_usage": 30, "current_disk_usage": 10},
+				site2.name: {"current_cpu_usage": 60, "current_disk_usage": 20},
+			}
+		)
+
+		site1.reload()
+		site2.reload()
+		self.assertEqual((site1.current_cpu_usage, site1.current_disk_usage), (30, 10))
+		self.assertEqual((site2.current_cpu_usage, site2.current_disk_usage), (60, 20))
+		self.assertEqual(site2.current_database_usage, 40)
+		self.assertEqual(site1.modified, modified)
+
+	@patch("press.press.doctype.site.sync.frappe.db.commit", new=Mock())
+	def test_sync_sites_info_writes_only_changes(self):
+		from press.press.doctype.site.sync import sync_sites_info
+
+		site1 = create_test_site()
+		site2 = create_test_site(bench=site1.bench)
+		usage = {"backups": 1, "database": 2, "database_free": 0, "public": 3, "private": 4}
+		data = {
+			site1.name: {
+				"usage": [
+					{**usage, "timestamp": "2026-10-18T10:00:00+00:00"},
+					{**usage, "timestamp": "2026-10-18T11:00:00+00:00"},
+					{**usage, "database": 5, "timestamp": "2026-10-18T12:00:00+00:00"},
+				],
+				"config": {**json.loads(site1.config or "{}"), "db_name": site1.database_name},
+				"timezone": "Asia/Kolkata",
+			},
+			site2.name: {
+				"usage": usage,
+				"config": {"db_name": site2.database_name, "test_sync_key": "value"},
+				"timezone": site2.timezone,
+			},
+		}
+
+		sync_sites_info(site1.bench, data)
+		sync_sites_info(site1.bench, data)
+
+		site1.reload()
+		site2.reload()
+		self.assertEqual(frappe.db.count("Site Usage", {"site": site1.name}), 2)
+		self.assertEqual(frappe.db.count("Site Usage", {"site": site2.name}), 1)
+		self.assertEqual(site1.timezone, "Asia/Kolkata")
+		self.assertEqual(json.loads(site2.config)["test_sync_key"], "value")
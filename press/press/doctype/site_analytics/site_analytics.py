@@ -68,7 +68,16 @@ class SiteAnalytics(Document):
 			frappe.db.commit()
 
 
+def on_doctype_update():
+	frappe.db.add_index("Site Analytics", ["site", "timestamp"])
+
+
 def create_site_analytics(site, data):
+	if not frappe.db.exists("Site Analytics", {"site": site, "timestamp": data["timestamp"]}):
+		get_site_analytics_doc(site, data).insert()
+
+
+def get_site_analytics_doc(site, data):
 	def get_last_logins(analytics):
 		last_logins = []
 		for login in analytics.get("last_logins", []):
@@ -104,30 +113,28 @@ def create_site_analytics(site, data):
 
 	timestamp = data["timestamp"]
 	analytics = data["analytics"]
-	if not frappe.db.exists("Site Analytics", {"site": site, "timestamp": timestamp}):
-		doc = frappe.get_doc(
-			{
-				"doctype": "Site Analytics",
-				"site": site,
-				"timestamp": timestamp,
-				"country": analytics.get("country"),
-				"time_zone": analytics.get("time_zone"),
-				"language": analytics.get("language"),
-				"scheduler_enabled": analytics.get("scheduler_enabled"),
-				"setup_complete": analytics.get("setup_complete"),
-				"space_used": analytics.get("space_used"),
-				"backup_size": analytics.get("backup_size"),
-				"database_size": analytics.get("database_size"),
-				"files_size": analytics.get("files_size"),
-				"emails_sent": analytics.get("emails_sent"),
-				"installed_apps": analytics.get("installed_apps", []),
-				"users": analytics.get("users", []),
-				"last_logins": get_last_logins(analytics),
-				"last_active": get_last_active(analytics),
-				"company": analytics.get("company"),
-				"domain": analytics.get("domain"),
-				"activation_level": analytics.get("activation", {}).get("activation_level"),
-				"sales_data": get_sales_data(analytics),
-			}
-		)
-		doc.insert()
+	return frappe.get_doc(
+		{
+			"doctype": "Site Analytics",
+			"site": site,
+			"timestamp": timestamp,
+			"country": analytics.get("country"),
+			"time_zone": analytics.get("time_zone"),
+			"language": analytics.get("language"),
+			"scheduler_enabled": analytics.get("scheduler_enabled"),
+			"setup_complete": analytics.get("setup_complete"),
+			"space_used": analytics.get("space_used"),
+			"backup_size": analytics.get("backup_size"),
+			"database_size": analytics.get("database_size"),
+			"files_size": analytics.get("files_size"),
+			"emails_sent": analytics.get("emails_sent"),
+			"installed_apps": analytics.get("installed_apps", []),
+			"users": analytics.get("users", []),
+			"last_logins": get_last_logins(analytics),
+			"last_active": get_last_active(analytics),
+			"company": analytics.get("company"),
+			"domain": analytics.get("domain"),
+			"activation_level": analytics.get("activation", {}).get("activation_level"),
+			"sales_data": get_sales_data(analytics),
+		}
+	)
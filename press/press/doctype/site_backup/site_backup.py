@@ -360,6 +360,7 @@ def get_backup_bucket(cluster, region=False):
 
 def on_doctype_update():
 	frappe.db.add_index("Site Backup", ["files_availability", "job"])
+	frappe.db.add_index("Site Backup", ["site", "creation"])
 
 
 def get_ssh_key():
@@ -3,9 +3,10 @@
 # For license information, please see license.txt
 
 from calendar import monthrange
+from datetime import datetime, timedelta
 
 import frappe
-from frappe.utils import get_datetime, get_time, now_datetime
+from frappe.utils import date_diff, get_datetime, get_time, now_datetime
 
 from press.press.doctype.site.site import Site
 from press.press.doctype.site_update.site_update import benches_with_available_update
@@ -15,10 +16,9 @@ from press.utils import log_error
 def trigger():
 	"""Will be triggered every 30 minutes"""
 	# Get all ["Active", "Inactive"] sites
-	# with auto updates scheduled
-	sites_with_scheduled_updates = frappe.get_all(
-		"Site",
-		filters={
+	# with auto updates due
+	trigger_for_sites = get_sites_due_for_auto_update(
+		{
 			"status": ("in", ("Active", "Inactive")),
 			"only_update_at_specified_time": True,
 			"skip_auto_updates": False,
@@ -27,19 +27,9 @@ def trigger():
 				benches_with_available_update(),  # An update should be available for this site
 			),
 		},
-		fields=[
-			"name",
-			"auto_update_last_triggered_on",
-			"update_trigger_time",
-			"update_trigger_frequency",
-			"update_on_weekday",
-			"update_end_of_month",
-			"update_on_day_of_month",
-		],
+		frequencies=("Daily", "Weekly", "Monthly"),
 	)
 
-	trigger_for_sites = list(filter(should_update_trigger, sites_with_scheduled_updates))
-
 	for site in trigger_for_sites:
 		auto_update_log = frappe.get_doc(
 			{
@@ -70,6 +60,106 @@ def trigger():
 			auto_update_log.insert(ignore_permissions=True)
 
 
+SCHEDULE_FIELDS = (
+	"auto_update_last_triggered_on",
+	"update_trigger_time",
+	"update_trigger_frequency",
+	"update_start_date",
+	"update_on_weekday",
+	"update_end_of_month",
+	"update_on_day_of_month",
+)
+
+
+def get_sites_due_for_auto_update(filters: dict, frequencies=None, window=None) -> list:
+	"""
+	Returns sites matching `filters` with a scheduled update time that has
+	passed today and hasn't been triggered yet.
+
+	With `window`, only slots that passed in the last `window` seconds are due.
+
+	`next_auto_update_at` only narrows down the candidates. It can be stale for
+	sites `filters` excluded on earlier runs, e.g. when no update was available,
+	so the slot is worked out again from the schedule. Slots missed on earlier
+	days are not run late, those sites are moved to their next scheduled time.
+	"""
+	now = now_datetime()
+	filters = {**filters, "next_auto_update_at": ("<=", now)}
+	if frequencies:
+		filters["update_trigger_frequency"] = ("in", frequencies)
+	sites = frappe.get_all("Site", filters=filters, fields=["name", "next_auto_update_at", *SCHEDULE_FIELDS])
+
+	due = []
+	for site in sites:
+		next_auto_update_at = get_next_auto_update_at(site)
+		if next_auto_update_at and next_auto_update_at <= now:
+			# Today's slot, possibly outside `window`. It's left as is since
+			# other runs without a window may still pick it up today
+			if window is None or (now - next_auto_update_at).total_seconds() <= window:
+				due.append(site)
+		else:
+			frappe.db.set_value(
+				"Site",
+				site.name,
+				"next_auto_update_at",
+				next_auto_update_at,
+				update_modified=False,
+			)
+	return due
+
+
+def get_next_auto_update_at(doc, after=None):
+	"""
+	Returns the first scheduled update time of `doc` later than `after`.
+
+	`after` defaults to the last trigger, or the start of today if that is
+	earlier, so that a schedule whose time has already passed today is due.
+	Pass the current time to seed a new or changed schedule, otherwise a slot
+	that passed earlier today is due right away.
+	"""
+	if after is None:
+		after = datetime.combine(now_datetime().date(), datetime.min.time()) - timedelta(microseconds=1)
+		if doc.auto_update_last_triggered_on:
+			after = max(after, get_datetime(doc.auto_update_last_triggered_on))
+
+	after = get_datetime(after)
+	trigger_time = get_time(doc.update_trigger_time or "00:00:00")
+	day = after.date()
+	if datetime.combine(day, trigger_time) <= after:
+		day += timedelta(days=1)
+
+	# Every schedule repeats within a year, monthly schedules on the 31st
+	# skip shorter months
+	for _ in range(366 + 31):
+		if is_auto_update_day(doc, day):
+			return datetime.combine(day, trigger_time)
+		day += timedelta(days=1)
+
+	return None
+
+
+def is_auto_update_day(doc, day) -> bool:
+	frequency = doc.update_trigger_frequency
+	if frequency == "Daily":
+		return True
+
+	if frequency in ("Weekly", "Every 2 Weeks") and doc.update_on_weekday != day.strftime("%A"):
+		return False
+
+	if frequency == "Weekly":
+		return True
+
+	if frequency == "Every 2 Weeks":
+		return not doc.update_start_date or date_diff(day, doc.update_start_date) % 14 == 0
+
+	if frequency == "Monthly":
+		if doc.update_end_of_month:
+			return day.day == get_last_day_of_month(day.year, day.month)
+		return day.day == doc.update_on_day_of_month
+
+	return False
+
+
 def should_update_trigger(doc):
 	"""
 	Returns `True` if the doc update should be triggered.
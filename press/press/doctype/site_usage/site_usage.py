@@ -31,3 +31,7 @@ class SiteUsage(Document):
 	def clear_old_logs(days=60):
 		table = frappe.qb.DocType("Site Usage")
 		frappe.db.delete(table, filters=(table.creation < (Now() - Interval(days=days))))
+
+
+def on_doctype_update():
+	frappe.db.add_index("Site Usage", ["site", "creation"])
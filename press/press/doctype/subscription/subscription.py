@@ -6,14 +6,20 @@ from __future__ import annotations
 import frappe
 import rq
 from frappe.model.document import Document
+from frappe.model.naming import make_autoname
 from frappe.query_builder.functions import Coalesce, Count
 from frappe.utils import cint, flt
+from pypika.terms import CustomFunction
 
 from press.overrides import get_permission_query_conditions_for_doctype
 from press.press.doctype.site_plan.site_plan import SitePlan
+from press.press.doctype.usage_record.usage_record import update_usage_in_invoices
 from press.utils import log_error
 from press.utils.jobs import has_job_timeout_exceeded
 
+Crc32 = CustomFunction("CRC32", ["value"])
+Mod = CustomFunction("MOD", ["dividend", "divisor"])
+
 
 class Subscription(Document):
 	# begin: auto-generated types
@@ -128,7 +134,7 @@ class Subscription(Document):
 			frappe.log_error(title="Disable Subscription Error")
 
 	@frappe.whitelist()
-	def create_usage_record(self, date: DF.Date | None = None):
+	def create_usage_record(self, date: DF.Date | None = None, defer_invoice_update: bool = False):
 		cannot_charge = not self.can_charge_for_subscription()
 		if cannot_charge:
 			return None
@@ -136,44 +142,13 @@ class Subscription(Document):
 		if self.is_usage_record_created(date):
 			return None
 
-		team = frappe.get_cached_doc("Team", self.team)
-
-		if team.parent_team:
-			team = frappe.get_cached_doc("Team", team.parent_team)
-
-		if team.billing_team and team.payment_mode == "Paid By Partner":
-			team = frappe.get_cached_doc("Team", team.billing_team)
-
+		values = get_usage_record_values(self, date)
+		team = frappe.get_cached_doc("Team", values["team"])
 		if not team.get_upcoming_invoice():
 			team.create_upcoming_invoice()
 
-		plan = frappe.get_cached_doc(self.plan_type, self.plan)
-
-		if self.additional_storage:
-			price = plan.price_inr if team.currency == "INR" else plan.price_usd
-			price_per_day = price / plan.period  # no rounding off to avoid discrepancies
-			amount = flt((price_per_day * cint(self.additional_storage)), 2)
-		else:
-			amount = plan.get_price_for_interval(self.interval, team.currency)
-
-		usage_record = frappe.get_doc(
-			doctype="Usage Record",
-			team=team.name,
-			document_type=self.document_type,
-			document_name=self.document_name,
-			plan_type=self.plan_type,
-			plan=plan.name,
-			amount=amount,
-			date=date,
-			subscription=self.name,
-			interval=self.interval,
-			site=(
-				self.site
-				or frappe.get_value("Marketplace App Subscription", self.marketplace_app_subscription, "site")
-			)
-			if self.document_type == "Marketplace App"
-			else None,
-		)
+		usage_record = frappe.get_doc(doctype="Usage Record", **values)
+		usage_record.flags.defer_invoice_update = defer_invoice_update
 		usage_record.insert()
 		usage_record.submit()
 		return usage_record
@@ -253,28 +228,44 @@ def create_usage_records():
 	"""
 	Creates daily usage records for paid Subscriptions
 	"""
-	free_sites = sites_with_free_hosting()
-	settings = frappe.get_single("Press Settings")
-	subscriptions = frappe.db.get_all(
-		"Subscription",
-		filters={
-			"enabled": True,
-			"plan": ("in", paid_plans()),
-			"name": ("not in", created_usage_records(free_sites)),
-			"document_name": ("not in", free_sites),
-		},
-		pluck="name",
-		order_by=None,
-		limit=settings.usage_record_creation_batch_size or 500,
-		ignore_ifnull=True,
-		debug=True,
-	)
-	for name in subscriptions:
-		if has_job_timeout_exceeded():
-			return
-		subscription = frappe.get_cached_doc("Subscription", name)
+	shards = cint(frappe.db.get_single_value("Press Settings", "usage_record_creation_shards")) or 1
+	if shards == 1:
+		create_usage_records_for_shard(0, 1)
+		return
+
+	for shard in range(shards):
+		frappe.enqueue(
+			"press.press.doctype.subscription.subscription.create_usage_records_for_shard",
+			queue="long",
+			shard=shard,
+			shards=shards,
+			job_id=f"create_usage_records:{shard}:{shards}",
+			deduplicate=True,
+		)
+
+
+def create_usage_records_for_shard(shard: int, shards: int):
+	"""
+	Creates today's usage records for paid Subscriptions of teams in this shard
+
+	Subscriptions are walked in name order so that ones we can't charge for
+	are not picked up again in the same run. Shards are keyed on the
+	subscription's own team, so shards never create records for the same
+	subscription. Child and partner-billed teams can land in a different shard
+	than their billing team, so several shards may update the same invoice;
+	update_usage_in_invoices locks the invoice for that.
+	"""
+	date = frappe.utils.today()
+	batch_size = cint(frappe.db.get_single_value("Press Settings", "usage_record_creation_batch_size")) or 500
+	plans = paid_plans()
+	after = ""
+	while not has_job_timeout_exceeded():
+		subscriptions = get_subscriptions_without_usage_record(date, plans, shard, shards, after, batch_size)
+		if not subscriptions:
+			break
+
 		try:
-			subscription.create_usage_record()
+			usage_records = insert_usage_records(subscriptions, date)
 			frappe.db.commit()
 		except rq.timeouts.JobTimeoutException:
 			# This job took too long to execute
@@ -284,7 +275,180 @@ def create_usage_records():
 			return
 		except Exception:
 			frappe.db.rollback()
-			log_error(title="Create Usage Record Error", name=name)
+			# Don't let one bad subscription cost the rest of the batch their record
+			usage_records = insert_usage_records_one_by_one(subscriptions, date)
+			if usage_records is None:
+				return
+
+		update_usage_in_invoices(usage_records)
+		after = subscriptions[-1].name
+
+
+def insert_usage_records_one_by_one(subscriptions, date: str) -> list[str] | None:
+	"""Insert usage records committing after each subscription. None if the job timed out"""
+	usage_records = []
+	for subscription in subscriptions:
+		try:
+			usage_records.extend(insert_usage_records([subscription], date))
+			frappe.db.commit()
+		except rq.timeouts.JobTimeoutException:
+			frappe.db.rollback()
+			update_usage_in_invoices(usage_records)
+			return None
+		except Exception:
+			frappe.db.rollback()
+			log_error(title="Create Usage Record Error", subscription=subscription.name)
+	return usage_records
+
+
+def get_subscriptions_without_usage_record(
+	date: str, plans: list[str], shard: int, shards: int, after: str, limit: int
+):
+	"""Paid subscriptions of this shard that don't have a usage record for `date`"""
+	Subscription = frappe.qb.DocType("Subscription")
+	UsageRecord = frappe.qb.DocType("Usage Record")
+	Site = frappe.qb.DocType("Site")
+	SiteTeam = frappe.qb.DocType("Team")
+
+	if not plans:
+		return []
+
+	site_is_chargeable = (
+		Site.status.notin(("Archived", "Suspended"))
+		& (Site.team != "Administrator")
+		& (Site.free == 0)
+		& ((SiteTeam.free_account == 0) | (SiteTeam.enabled == 0))
+		& (Site.trial_end_date.isnull() | (Site.trial_end_date < date))
+	)
+
+	return (
+		frappe.qb.from_(Subscription)
+		.left_join(UsageRecord)
+		.on((UsageRecord.subscription == Subscription.name) & (UsageRecord.date == date))
+		.left_join(Site)
+		.on((Subscription.document_type == "Site") & (Site.name == Subscription.document_name))
+		.left_join(SiteTeam)
+		.on(SiteTeam.name == Site.team)
+		.select(
+			Subscription.name,
+			Subscription.team,
+			Subscription.document_type,
+			Subscription.document_name,
+			Subscription.plan_type,
+			Subscription.plan,
+			Subscription.interval,
+			Subscription.additional_storage,
+			Subscription.site,
+			Subscription.marketplace_app_subscription,
+		)
+		.where(
+			(Subscription.enabled == 1)
+			& Subscription.plan.isin(plans)
+			& UsageRecord.name.isnull()
+			& ((Subscription.document_type != "Site") | site_is_chargeable)
+			& (Mod(Crc32(Subscription.team), shards) == shard)
+			& (Subscription.name > after)
+		)
+		.orderby(Subscription.name)
+		.limit(limit)
+		.run(as_dict=True)
+	)
+
+
+def insert_usage_records(subscriptions, date: str) -> list[str]:
+	"""
+	Bulk insert submitted usage records for daily site subscriptions
+
+	Sites were already checked for chargeability in SQL. Other subscriptions
+	go through Subscription.create_usage_record for their own checks.
+	"""
+	fields = [
+		"name",
+		"owner",
+		"creation",
+		"modified",
+		"modified_by",
+		"docstatus",
+		"team",
+		"currency",
+		"document_type",
+		"document_name",
+		"plan_type",
+		"plan",
+		"amount",
+		"date",
+		"time",
+		"subscription",
+		"interval",
+		"site",
+	]
+	now, time, user = frappe.utils.now(), frappe.utils.nowtime(), frappe.session.user
+	autoname = frappe.get_meta("Usage Record").autoname
+
+	names, values = [], []
+	for subscription in subscriptions:
+		if subscription.document_type != "Site" or subscription.interval != "Daily":
+			doc = frappe.get_cached_doc("Subscription", subscription.name)
+			if usage_record := doc.create_usage_record(date, defer_invoice_update=True):
+				names.append(usage_record.name)
+			continue
+
+		record = get_usage_record_values(subscription, date)
+		record.update(
+			name=make_autoname(autoname, "Usage Record"),
+			owner=user,
+			creation=now,
+			modified=now,
+			modified_by=user,
+			docstatus=1,
+			time=time,
+		)
+		names.append(record["name"])
+		values.append([record[field] for field in fields])
+
+	if values:
+		frappe.db.bulk_insert("Usage Record", fields, values)
+	return names
+
+
+def get_usage_record_values(subscription, date=None) -> dict:
+	team = frappe.get_cached_doc("Team", subscription.team)
+
+	if team.parent_team:
+		team = frappe.get_cached_doc("Team", team.parent_team)
+
+	if team.billing_team and team.payment_mode == "Paid By Partner":
+		team = frappe.get_cached_doc("Team", team.billing_team)
+
+	plan = frappe.get_cached_doc(subscription.plan_type, subscription.plan)
+
+	if subscription.additional_storage:
+		price = plan.price_inr if team.currency == "INR" else plan.price_usd
+		price_per_day = price / plan.period  # no rounding off to avoid discrepancies
+		amount = flt((price_per_day * cint(subscription.additional_storage)), 2)
+	else:
+		amount = plan.get_price_for_interval(subscription.interval, team.currency)
+
+	return {
+		"team": team.name,
+		"currency": team.currency,
+		"document_type": subscription.document_type,
+		"document_name": subscription.document_name,
+		"plan_type": subscription.plan_type,
+		"plan": plan.name,
+		"amount": amount,
+		"date": date,
+		"subscription": subscription.name,
+		"interval": subscription.interval,
+		"site": (
+			subscription.site
+			or frappe.get_value(
+				"Marketplace App Subscription", subscription.marketplace_app_subscription, "site"
+			)
+		)
+		if subscription.document_type == "Marketplace App"
+		else None,
+	}
 
 
 def paid_plans():
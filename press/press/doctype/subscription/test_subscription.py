@@ -9,7 +9,10 @@ from unittest.mock import patch
 import frappe
 
 from press.press.doctype.site.test_site import create_test_site
-from press.press.doctype.subscription.subscription import sites_with_free_hosting
+from press.press.doctype.subscription.subscription import (
+	create_usage_records_for_shard,
+	sites_with_free_hosting,
+)
 from press.press.doctype.team.test_team import create_test_team
 
 
@@ -184,3 +187,76 @@ class TestSubscription(unittest.TestCase):
 		# test: site owned by free account
 		free_sites = sites_with_free_hosting()
 		self.assertEqual(len(free_sites), 2)
+
+	def test_create_usage_records_for_shard(self):
+		plan = frappe.get_doc(
+			doctype="Site Plan",
+			name="Plan-10",
+			document_type="Site",
+			interval="Daily",
+			price_usd=30,
+			price_inr=30,
+			period=30,
+		).insert()
+
+		paid_site = create_test_site(team=self.team.name)
+		free_site = create_test_site(team=self.team.name)
+		free_site.free = 1
+		free_site.save()
+		for site in (paid_site, free_site):
+			frappe.db.delete("Subscription", {"document_type": "Site", "document_name": site.name})
+			create_test_subscription(site.name, plan.name, self.team.name)
+
+		frappe.set_user("Administrator")
+		create_usage_records_for_shard(0, 1)
+		# this should not create duplicate records
+		create_usage_records_for_shard(0, 1)
+
+		usage_records = frappe.get_all(
+			"Usage Record",
+			{"document_name": ("in", (paid_site.name, free_site.name))},
+			["document_name", "invoice", "docstatus", "currency"],
+		)
+		self.assertEqual(len(usage_records), 1)
+		self.assertEqual(usage_records[0].document_name, paid_site.name)
+		self.assertEqual(usage_records[0].docstatus, 1)
+		self.assertEqual(usage_records[0].currency, self.team.currency)
+		self.assertTrue(usage_records[0].invoice)
+
+	def test_failing_subscription_does_not_skip_rest_of_batch(self):
+		from press.press.doctype.subscription import subscription
+
+		plan = frappe.get_doc(
+			doctype="Site Plan",
+			name="Plan-10",
+			document_type="Site",
+			interval="Daily",
+			price_usd=30,
+			price_inr=30,
+			period=30,
+		).insert(ignore_if_duplicate=True)
+
+		sites = [create_test_site(team=self.team.name) for _ in range(3)]
+		for site in sites:
+			frappe.db.delete("Subscription", {"document_type": "Site", "document_name": site.name})
+			create_test_subscription(site.name, plan.name, self.team.name)
+
+		get_usage_record_values = subscription.get_usage_record_values
+
+		def fail_for_first_site(sub, date=None):
+			if sub.document_name == sites[0].name:
+				raise Exception("Bad subscription")
+			return get_usage_record_values(sub, date)
+
+		frappe.set_user("Administrator")
+		with patch.object(
+			subscription, "get_usage_record_values", side_effect=fail_for_first_site
+		), patch.object(subscription.frappe.db, "commit"), patch.object(subscription.frappe.db, "rollback"):
+			create_usage_records_for_shard(0, 1)
+
+		charged = frappe.get_all(
+			"Usage Record",
+			{"document_name": ("in", [site.name for site in sites])},
+			pluck="document_name",
+		)
+		self.assertEqual(sorted(charged), sorted(site.name for site in sites[1:]))
@@ -15,7 +15,7 @@ from frappe.utils import get_fullname, get_url_to_form, random_string
 from press.api.client import dashboard_whitelist
 from press.exceptions import FrappeioServerNotSet
 from press.press.doctype.telegram_message.telegram_message import TelegramMessage
-from press.utils import get_valid_teams_for_user, has_role, log_error
+from press.utils import clear_user_team_context, get_valid_teams_for_user, has_role, log_error
 from press.utils.billing import (
 	get_frappe_io_connection,
 	get_stripe,
@@ -452,6 +452,7 @@ class Team(Document):
 					capture("added_card_or_prepaid_credits", "fc_signup", self.user)
 
 	def on_update(self):
+		self.clear_user_team_context()
 		if not self.enabled:
 			return
 
@@ -468,6 +469,16 @@ class Team(Document):
 		):
 			self.update_billing_details_on_frappeio()
 
+	def on_trash(self):
+		self.clear_user_team_context()
+
+	def clear_user_team_context(self):
+		"""Clear cached team context of current and previous members"""
+		users = {self.user, *self.get_user_list()}
+		if doc_before_save := self.get_doc_before_save():
+			users.update({doc_before_save.user, *doc_before_save.get_user_list()})
+		clear_user_team_context(users)
+
 	def validate_partnership_date(self):
 		if self.erpnext_partner or not self.partnership_date:
 			return
@@ -12,6 +12,7 @@ from press.press.doctype.account_request.test_account_request import (
 	create_test_account_request,
 )
 from press.press.doctype.team.team import Team
+from press.utils import get_current_team, get_user_team_context
 
 
 def create_test_press_admin_team(email: str | None = None) -> Team:
@@ -81,3 +82,38 @@ class TestTeam(unittest.TestCase):
 				account_request2, "John", "Meyer", "jonmeyer@gmail.com", country="Pakistan"
 			)
 		self.assertEqual(team2.currency, "USD")
+
+	def test_team_member_changes_clear_cached_team_context(self):
+		team = create_test_team()
+		user = create_test_team().user
+		self.assertNotIn(team.name, get_user_team_context(user)["teams"])
+
+		team.append("team_members", {"user": user})
+		team.save()
+		self.assertIn(team.name, get_user_team_context(user)["teams"])
+
+		team.remove_team_member(user)
+		self.assertNotIn(team.name, get_user_team_context(user)["teams"])
+
+	def test_removed_member_cannot_use_team_after_commit(self):
+		team = create_test_team()
+		email = frappe.mock("email")
+		create_test_user(email)
+		user = frappe.get_value("User", {"email": email}, "name")
+		team.append("team_members", {"user": user})
+		team.save()
+		stale_context = get_user_team_context(user)
+
+		team.remove_team_member(user)
+		# A concurrent request rebuilds the context before the removal is committed
+		frappe.cache.set_value(f"user_team_context:{user}", stale_context)
+		frappe.db.after_commit.run()
+
+		frappe.set_user(user)
+		frappe.local.request = frappe._dict()
+		try:
+			with patch("press.utils.frappe.get_request_header", return_value=team.name):
+				self.assertRaises(frappe.AuthenticationError, get_current_team)
+		finally:
+			del frappe.local.request
+			frappe.set_user("Administrator")
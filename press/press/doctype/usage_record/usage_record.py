@@ -2,9 +2,13 @@
 # For license information, please see license.txt
 from __future__ import annotations
 
+from collections import defaultdict
+
 import frappe
 from frappe.model.document import Document
 
+from press.utils import log_error
+
 
 class UsageRecord(Document):
 	# begin: auto-generated types
@@ -44,22 +48,19 @@ class UsageRecord(Document):
 		self.validate_duplicate_usage_record()
 
 	def on_submit(self):
-		self.update_usage_in_invoice()
+		# Batched callers apply usage to invoices with update_usage_in_invoices
+		if not self.flags.defer_invoice_update:
+			self.update_usage_in_invoice()
 
 	def on_cancel(self):
 		self.remove_usage_from_invoice()
 
 	def update_usage_in_invoice(self):
-		team = frappe.get_doc("Team", self.team)
-
-		if team.parent_team:
-			team = frappe.get_doc("Team", team.parent_team)
-
-		if team.billing_team:
-			team = frappe.get_doc("Team", team.billing_team)
-
-		if team.free_account:
+		team = get_billing_team(self.team)
+		if not team:
 			return
+
+		team = frappe.get_doc("Team", team)
 		# Get a read lock on this invoice
 		# We're going to update the invoice and we don't want any other process to update it
 		invoice = team.get_upcoming_invoice(for_update=True)
@@ -116,11 +117,66 @@ def link_unlinked_usage_records():
 		ignore_ifnull=True,
 	)
 
-	for usage_record in usage_records:
+	update_usage_in_invoices(usage_records)
+
+
+def update_usage_in_invoices(usage_records: list[str]):
+	"""Apply usage records to upcoming invoices with one locked save per billing team"""
+	if not usage_records:
+		return
+
+	records = frappe.get_all(
+		"Usage Record",
+		filters={"name": ("in", usage_records), "docstatus": 1, "invoice": ("is", "not set")},
+		fields=[
+			"name",
+			"team",
+			"document_type",
+			"document_name",
+			"plan",
+			"amount",
+			"site",
+			"payout",
+			"date",
+			"invoice",
+		],
+		order_by="creation asc",
+		ignore_ifnull=True,
+	)
+
+	billing_teams = {}
+	records_by_team = defaultdict(list)
+	for record in records:
+		if record.team not in billing_teams:
+			billing_teams[record.team] = get_billing_team(record.team)
+		if team := billing_teams[record.team]:
+			records_by_team[team].append(record)
+
+	for team, team_records in records_by_team.items():
 		try:
-			frappe.get_doc("Usage Record", usage_record).update_usage_in_invoice()
+			team_doc = frappe.get_doc("Team", team)
+			invoice = team_doc.get_upcoming_invoice(for_update=True) or team_doc.create_upcoming_invoice()
+			invoice.add_usage_records(team_records)
+			frappe.db.commit()
 		except Exception:
-			frappe.log_error("Failed to Link UR to Invoice")
+			frappe.db.rollback()
+			log_error("Failed to Link UR to Invoice", team=team)
+
+
+def get_billing_team(team: str) -> str | None:
+	"""Team whose invoice is charged for usage of `team`, None for free accounts"""
+	fields = ["name", "parent_team", "billing_team", "free_account"]
+	team = frappe.db.get_value("Team", team, fields, as_dict=True)
+
+	if team.parent_team:
+		team = frappe.db.get_value("Team", team.parent_team, fields, as_dict=True)
+
+	if team.billing_team:
+		team = frappe.db.get_value("Team", team.billing_team, fields, as_dict=True)
+
+	if team.free_account:
+		return None
+	return team.name
 
 
 def on_doctype_update():
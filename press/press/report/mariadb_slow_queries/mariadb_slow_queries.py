@@ -3,12 +3,15 @@
 
 from __future__ import annotations
 
-import re
-from collections import defaultdict
+import functools
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
 
 import frappe
 import requests
 import sqlparse
+import sqlparse.keywords
 from frappe.core.doctype.access_log.access_log import make_access_log
 from frappe.utils import convert_utc_to_timezone, get_system_timezone
 from frappe.utils.password import get_decrypted_password
@@ -144,18 +147,223 @@ def get_slow_query_logs(database, start_datetime, end_datetime, search_pattern,
 	return out
 
 
-def normalize_query(query: str) -> str:
-	q = sqlparse.parse(query)[0]
-	for token in q.flatten():
-		token_type = str(token.ttype)
-		if "Token.Literal" in token_type or token_type == "Token.Keyword.Order":
-			token.value = "?"
+SQL_KEYWORDS = frozenset(
+	keyword
+	for keywords in (
+		sqlparse.keywords.KEYWORDS_COMMON,
+		sqlparse.keywords.KEYWORDS_MYSQL,
+		sqlparse.keywords.KEYWORDS,
+	)
+	for keyword in keywords
+)
+ORDER_KEYWORDS = frozenset(("ASC", "DESC"))
+OPERATOR_CHARACTERS = frozenset("<>=!:|&")
+# Keywords followed by a spaced out list or subquery, anything else before `(` is a function call
+LIST_KEYWORDS = frozenset(
+	[
+		"ALL",
+		"AND",
+		"ANY",
+		"AS",
+		"BETWEEN",
+		"BY",
+		"ELSE",
+		"EXISTS",
+		"FROM",
+		"HAVING",
+		"IN",
+		"INTO",
+		"IS",
+		"JOIN",
+		"LIKE",
+		"NOT",
+		"ON",
+		"OR",
+		"SELECT",
+		"SET",
+		"SOME",
+		"THEN",
+		"UNION",
+		"USING",
+		"VALUE",
+		"VALUES",
+		"WHEN",
+		"WHERE",
+	]
+)
+FINGERPRINT_CACHE_SIZE = 4096
 
-	# Format query consistently so identical queries can be matched
-	q = format_query(q, strip_comments=True)
+_fingerprints = OrderedDict()
+_fingerprints_lock = threading.Lock()
 
-	# Transform IN parts like this: IN (?, ?, ?) -> IN (?)
-	return re.sub(r" IN \(\?[\s\n\?\,]*\)", " IN (?)", q, flags=re.IGNORECASE)
+
+def normalize_query(query: str) -> str:
+	"""Fingerprint of `query`, formatted for display"""
+	return format_fingerprint(fingerprint_query(query))
+
+
+@functools.lru_cache(maxsize=FINGERPRINT_CACHE_SIZE)
+def format_fingerprint(fingerprint: str) -> str:
+	return format_query(fingerprint)
+
+
+def fingerprint_query(query: str) -> str:
+	"""Reduce `query` to a fingerprint shared by all queries that only differ in values
+
+	Literals become `?`, lists of them like `IN (?, ?)` or rows of a multi row
+	INSERT collapse to a single `(?)`, comments are dropped, tokens are spaced
+	consistently and keywords are upper cased. Fingerprints are memoized by a hash of the query.
+	"""
+	key = hashlib.blake2b(query.encode(errors="surrogatepass"), digest_size=16).digest()
+	with _fingerprints_lock:
+		if (fingerprint := _fingerprints.get(key)) is not None:
+			_fingerprints.move_to_end(key)
+			return fingerprint
+
+	fingerprint = _fingerprint_query(query)
+	with _fingerprints_lock:
+		_fingerprints[key] = fingerprint
+		if len(_fingerprints) > FINGERPRINT_CACHE_SIZE:
+			_fingerprints.popitem(last=False)
+	return fingerprint
+
+
+def _is_word(token: str) -> bool:
+	return token[0].isalnum() or token[0] in "_$?`"
+
+
+def _follows_operand(tokens: list[str]) -> bool:
+	if not tokens:
+		return False
+	return tokens[-1] == ")" or (_is_word(tokens[-1]) and tokens[-1] not in SQL_KEYWORDS)
+
+
+def _scan_string(query: str, start: int) -> int:
+	"""Return the index after the quoted string starting at `start`"""
+	quote, i, n = query[start], start + 1, len(query)
+	while i < n:
+		if query[i] == "\\":
+			i += 2
+		elif query[i] == quote:
+			if i + 1 < n and query[i + 1] == quote:  # doubled quote
+				i += 2
+			else:
+				return i + 1
+		else:
+			i += 1
+	return n
+
+
+def _scan_number(query: str, start: int) -> int:
+	"""Return the index after the number starting at `start`, including hex and exponents"""
+	is_hex = query[start : start + 2].lower() == "0x"
+	i, n = start, len(query)
+	while i < n and (query[i].isalnum() or query[i] in "._"):
+		if not is_hex and query[i] in "eE" and query[i + 1 : i + 2] in ("+", "-"):
+			i += 1
+		i += 1
+	return i
+
+
+def _close_parenthesis(tokens: list[str], start: int):
+	"""Collapse `(?, ?, ?)` to `(?)` and then `(?), (?)` following it to nothing"""
+	if len(tokens) > start + 1 and all(token in ("?", ",") for token in tokens[start + 1 :]):
+		del tokens[start + 1 :]
+		tokens.append("?")
+		if start >= 4 and tokens[start - 4 : start] == ["(", "?", ")", ","]:
+			del tokens[start - 1 :]
+			return
+	tokens.append(")")
+
+
+def _fingerprint_query(query: str) -> str:  # noqa: C901
+	tokens = []
+	parentheses = []
+	i, n = 0, len(query)
+	while i < n:
+		char = query[i]
+		next_char = query[i + 1] if i + 1 < n else ""
+		if char.isspace():
+			i += 1
+		elif char in "'\"":
+			i = _scan_string(query, i)
+			tokens.append("?")
+		elif char == "`":
+			end = query.find("`", i + 1)
+			end = n if end == -1 else end + 1
+			tokens.append(query[i:end])
+			i = end
+		elif char == "#" or (char == "-" and next_char == "-" and query[i + 2 : i + 3].isspace()):
+			end = query.find("\n", i)
+			i = n if end == -1 else end + 1
+		elif char == "/" and next_char == "*":
+			end = query.find("*/", i + 2)
+			i = n if end == -1 else end + 2
+		elif char.isdigit() or (char == "." and next_char.isdigit() and not _follows_operand(tokens)):
+			i = _scan_number(query, i)
+			tokens.append("?")
+		elif char == "-" and next_char.isdigit() and not _follows_operand(tokens):
+			# Unary minus is part of the literal
+			i = _scan_number(query, i + 1)
+			tokens.append("?")
+		elif char.isalpha() or char in "_$":
+			end = i + 1
+			while end < n and (query[end].isalnum() or query[end] in "_$"):
+				end += 1
+			word = query[i:end]
+			upper = word.upper()
+			if (tokens and tokens[-1] == ".") or query[end : end + 1] == ".":
+				tokens.append(word)  # qualified names are never keywords
+			elif upper in ORDER_KEYWORDS:
+				tokens.append("?")
+			elif upper in SQL_KEYWORDS:
+				tokens.append(upper)
+			else:
+				tokens.append(word)
+			i = end
+		elif char == "%" and next_char == "s":  # unsubstituted placeholder
+			tokens.append("%s")
+			i += 2
+		elif char in OPERATOR_CHARACTERS:
+			end = i + 1
+			while end < n and query[end] in OPERATOR_CHARACTERS:
+				end += 1
+			tokens.append(query[i:end])
+			i = end
+		elif char == "@":
+			end = i + 1
+			while end < n and (query[end].isalnum() or query[end] in "_$@"):
+				end += 1
+			tokens.append(query[i:end])
+			i = end
+		elif char == "(":
+			parentheses.append(len(tokens))
+			tokens.append(char)
+			i += 1
+		elif char == ")" and parentheses:
+			_close_parenthesis(tokens, parentheses.pop())
+			i += 1
+		else:
+			tokens.append(char)
+			i += 1
+
+	return _join_tokens(tokens).rstrip(" ;")
+
+
+def _join_tokens(tokens: list[str]) -> str:
+	"""Join tokens with one space, the same way no matter how the query was spaced"""
+	joined = []
+	previous = None
+	for token in tokens:
+		if previous is not None and not (
+			token in (",", ")", ".")
+			or previous in ("(", ".")
+			or (token == "(" and _is_word(previous) and previous not in LIST_KEYWORDS)  # function call
+		):
+			joined.append(" ")
+		joined.append(token)
+		previous = token
+	return "".join(joined)
 
 
 def format_query(q, strip_comments=False):
@@ -175,10 +383,10 @@ def summarize_by_query(data):
 			# These are mysqldump queries, there's no real way to optimize these, it's just dumping entire table.
 			continue
 
-		normalized_query = normalize_query(query)
-		entry = queries[normalized_query]
+		fingerprint = fingerprint_query(query)
+		entry = queries[fingerprint]
 		entry["count"] += 1
-		entry["query"] = normalized_query
+		entry["query"] = format_fingerprint(fingerprint)
 		entry["duration"] += row["duration"]
 		entry["rows_examined"] += row["rows_examined"]
 		entry["rows_sent"] += row["rows_sent"]
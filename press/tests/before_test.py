@@ -9,7 +9,7 @@ from frappe import set_user as _set_user
 from frappe.model.document import Document
 from frappe.tests.utils import FrappeTestCase
 
-from press.utils import _get_current_team, _system_user
+from press.utils import _get_current_team, _system_user, clear_user_team_context
 
 
 def doc_equal(self: Document, other: Document) -> bool:
@@ -33,7 +33,7 @@ def execute():
 	# Monkey patch certain methods for when tests are running
 	Document.__eq__ = doc_equal
 
-	FrappeTestCase.setUp = lambda self: frappe.db.truncate("Agent Request Failure")
+	FrappeTestCase.setUp = lambda self: truncate_agent_request_failures()
 
 	# patch frappe.set_user that
 	frappe.set_user = set_user_with_current_team
@@ -43,9 +43,18 @@ def execute():
 	frappe.local.system_user = _system_user
 
 
+def truncate_agent_request_failures():
+	from press.agent import agent_circuit_breaker
+
+	frappe.db.truncate("Agent Request Failure")
+	agent_circuit_breaker.invalidate()
+
+
 def set_user_with_current_team(user):
 	_set_user(user)
 	frappe.local._current_team = None
+	# Team context cached by earlier tests may point to rolled back teams
+	clear_user_team_context(user)
 
 
 def create_test_stripe_credentials():
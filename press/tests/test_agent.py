@@ -1,12 +1,14 @@
 # Copyright (c) 2024, Frappe and contributors
 # For license information, please see license.txt
 
+import tempfile
+
 import frappe
 import requests
 import responses
 from frappe.tests.utils import FrappeTestCase
 
-from press.agent import Agent, AgentRequestSkippedException
+from press.agent import Agent, AgentRequestSkippedException, agent_circuit_breaker, agent_sessions
 from press.press.doctype.agent_request_failure.agent_request_failure import (
 	remove_old_failures,
 )
@@ -112,6 +114,7 @@ class TestAgent(FrappeTestCase):
 			json={"message": "pong"},
 		)
 		frappe.db.delete("Agent Request Failure", {"server": server.name})
+		agent_circuit_breaker.invalidate()
 		self.assertEqual(agent.request("GET", "ping"), {"message": "pong"})
 
 	@responses.activate
@@ -130,3 +133,100 @@ class TestAgent(FrappeTestCase):
 
 		responses.assert_call_count(f"https://{server.name}:443/agent/ping", 1)
 		self.assertEqual(frappe.db.count("Agent Request Failure", {"server": server.name}), 0)
+
+	@responses.activate
+	def test_requests_reuse_session_for_server(self):
+		server = create_test_server()
+		responses.add(
+			responses.GET,
+			f"https://{server.name}:443/agent/ping",
+			status=200,
+			json={"message": "pong"},
+		)
+
+		agent = Agent(server.name, server.doctype)
+		agent.request("GET", "ping")
+		session = agent_sessions.get(server.doctype, server.name)
+		agent.request("GET", "ping")
+
+		self.assertIs(agent_sessions.get(server.doctype, server.name), session)
+		self.assertEqual(
+			responses.calls[0].request.headers["Authorization"],
+			f"bearer {server.get_password('agent_password')}",
+		)
+
+	@responses.activate
+	def test_request_retries_with_fresh_session_on_unauthorized(self):
+		server = create_test_server()
+		url = f"https://{server.name}:443/agent/ping"
+		responses.add(responses.GET, url, status=401, json={})
+		responses.add(responses.GET, url, status=200, json={"message": "pong"})
+
+		agent = Agent(server.name, server.doctype)
+		session = agent_sessions.get(server.doctype, server.name)
+
+		self.assertEqual(agent.request("GET", "ping"), {"message": "pong"})
+		self.assertIsNot(agent_sessions.get(server.doctype, server.name), session)
+
+	@responses.activate
+	def test_unauthorized_upload_is_retried_with_full_file(self):
+		server = create_test_server()
+		url = f"https://{server.name}:443/agent/upload"
+		responses.add(responses.POST, url, status=401, json={})
+		responses.add(responses.POST, url, status=200, json={})
+
+		with tempfile.NamedTemporaryFile() as tmp:
+			tmp.write(b"build context")
+			tmp.flush()
+			with open(tmp.name, "rb") as f:
+				Agent(server.name, server.doctype).request("POST", "upload", data={}, files={"context": f})
+
+		self.assertIn(b"build context", responses.calls[1].request.body)
+
+	@responses.activate
+	def test_half_open_circuit_lets_single_probe_through_and_closes(self):
+		server = create_test_server()
+
+		failure = create_test_agent_request_failure(server)
+		backoff = agent_circuit_breaker.get_backoff(server.name, failure.failure_count)
+		failure.db_set("last_failure_at", frappe.utils.add_to_date(None, seconds=-backoff - 1))
+		agent_circuit_breaker.invalidate()
+		self.assertEqual(agent_circuit_breaker.get_state(server.name), "Half Open")
+
+		responses.add(
+			responses.GET,
+			f"https://{server.name}:443/agent/ping",
+			status=200,
+			json={"message": "pong"},
+		)
+		agent = Agent(server.name, server.doctype)
+		self.assertFalse(agent.should_skip_requests())
+		self.assertEqual(agent.request("GET", "ping"), {"message": "pong"})
+
+		self.assertEqual(frappe.db.count("Agent Request Failure", {"server": server.name}), 0)
+		self.assertEqual(agent_circuit_breaker.get_state(server.name), "Closed")
+
+	def test_health_checks_do_not_extend_backoff(self):
+		server = create_test_server()
+
+		failure = create_test_agent_request_failure(server)
+		backoff = agent_circuit_breaker.max_backoff * 1.2
+		failure.db_set("last_failure_at", frappe.utils.add_to_date(None, seconds=-backoff - 1))
+		# remove_old_failures bumps failure_count, and with it modified, while the agent is down
+		frappe.db.set_value("Agent Request Failure", failure.name, "failure_count", failure.failure_count + 1)
+		agent_circuit_breaker.invalidate()
+
+		self.assertEqual(agent_circuit_breaker.get_state(server.name), "Half Open")
+
+	def test_half_open_circuit_skips_requests_while_probe_is_in_flight(self):
+		server = create_test_server()
+
+		failure = create_test_agent_request_failure(server)
+		backoff = agent_circuit_breaker.get_backoff(server.name, failure.failure_count)
+		failure.db_set("last_failure_at", frappe.utils.add_to_date(None, seconds=-backoff - 1))
+		agent_circuit_breaker.invalidate()
+
+		self.assertTrue(agent_circuit_breaker.allow_request(server.name))
+		frappe.flags.agent_probes = set()  # another request
+		self.assertFalse(agent_circuit_breaker.allow_request(server.name))
+		frappe.cache.delete(agent_circuit_breaker.get_probe_key(server.name))
@@ -4,7 +4,7 @@ from unittest.mock import Mock, patch
 import frappe
 from frappe.tests.utils import FrappeTestCase
 
-from press.press.audit import BackupRecordCheck, OffsiteBackupCheck
+from press.press.audit import BackupRecordCheck, HashedKeySet, OffsiteBackupCheck
 from press.press.doctype.agent_job.agent_job import AgentJob
 from press.press.doctype.press_settings.test_press_settings import (
 	create_test_press_settings,
@@ -107,3 +107,11 @@ class TestOffsiteBackupCheck(FrappeTestCase):
 			OffsiteBackupCheck()
 		audit_log = frappe.get_last_doc("Audit Log", {"audit_type": OffsiteBackupCheck.audit_type})
 		self.assertEqual(audit_log.status, "Failure")
+
+	def test_hashed_key_set_membership(self):
+		keys = [f"site{i}.example.com/backup.sql.gz" for i in range(10)]
+		with patch.object(HashedKeySet, "run_length", new=3):
+			key_set = HashedKeySet(reversed(keys))
+		self.assertEqual(len(key_set), 10)
+		self.assertTrue(all(key in key_set for key in keys))
+		self.assertNotIn("site10.example.com/backup.sql.gz", key_set)
@@ -0,0 +1,50 @@
+# Copyright (c) 2026, Frappe and contributors
+# For license information, please see license.txt
+
+import time
+from unittest.mock import Mock, patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from press.metrics import (
+	METRICS_REFRESH_INTERVAL,
+	METRICS_REFRESH_LOCK_KEY,
+	METRICS_SNAPSHOT_KEY,
+	MetricsRenderer,
+	get_metrics,
+)
+
+
+@patch.object(MetricsRenderer, "metrics", new=Mock(return_value="press_site_total 1.0\n"))
+class TestMetrics(FrappeTestCase):
+	def setUp(self):
+		MetricsRenderer.metrics.reset_mock()
+		frappe.cache.delete_value(METRICS_SNAPSHOT_KEY)
+		frappe.cache.delete_keys(METRICS_REFRESH_LOCK_KEY)
+
+	def tearDown(self):
+		frappe.cache.delete_value(METRICS_SNAPSHOT_KEY)
+		frappe.cache.delete_keys(METRICS_REFRESH_LOCK_KEY)
+
+	def test_scrapes_are_served_from_snapshot(self):
+		first = get_metrics()
+		second = get_metrics()
+
+		MetricsRenderer.metrics.assert_called_once()
+		self.assertIn("press_site_total 1.0", first)
+		self.assertIn("press_site_total 1.0", second)
+		self.assertIn("press_metrics_snapshot_age_seconds", second)
+
+	@patch("press.metrics.frappe.enqueue")
+	def test_stale_snapshot_is_refreshed_once_in_background(self, enqueue):
+		frappe.cache.set_value(
+			METRICS_SNAPSHOT_KEY,
+			{"metrics": "press_site_total 2.0\n", "refreshed_at": time.time() - METRICS_REFRESH_INTERVAL - 1},
+		)
+
+		self.assertIn("press_site_total 2.0", get_metrics())
+		self.assertIn("press_site_total 2.0", get_metrics())
+
+		enqueue.assert_called_once()
+		MetricsRenderer.metrics.assert_not_called()
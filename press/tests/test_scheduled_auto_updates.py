@@ -1,8 +1,12 @@
+from datetime import datetime
 from unittest import TestCase
+from unittest.mock import patch
 
 import frappe
 
 from press.press.doctype.site_update.scheduled_auto_updates import (
+	get_next_auto_update_at,
+	get_sites_due_for_auto_update,
 	should_update_trigger_for_daily,
 	should_update_trigger_for_monthly,
 	should_update_trigger_for_weekly,
@@ -89,6 +93,72 @@ class TestScheduledAutoUpdates(TestCase):
 				should_update_trigger_for_monthly(frappe._dict(obj), obj["current_datetime"]), obj
 			)
 
+	def test_next_auto_update_at_agrees_with_schedule_checks(self):
+		groups = (
+			("Daily", TEST_DATA_DAILY_TRUE, True),
+			("Daily", TEST_DATA_DAILY_FALSE, False),
+			("Weekly", TEST_DATA_WEEKLY_TRUE, True),
+			("Weekly", TEST_DATA_WEEKLY_FALSE, False),
+			("Monthly", TEST_DATA_MONTHLY_TRUE, True),
+			("Monthly", TEST_DATA_MONTHLY_FALSE, False),
+			("Monthly", TEST_DATA_MONTHLY_MONTH_END, True),
+		)
+		for frequency, data, due in groups:
+			for obj in data:
+				doc = frappe._dict(obj, update_trigger_frequency=frequency)
+				with patch(
+					"press.press.doctype.site_update.scheduled_auto_updates.now_datetime",
+					return_value=obj["current_datetime"],
+				):
+					next_auto_update_at = get_next_auto_update_at(doc)
+				self.assertEqual(bool(next_auto_update_at <= obj["current_datetime"]), due, obj)
+
+	def test_site_is_due_when_update_becomes_available_after_todays_slot(self):
+		# Last run yesterday, today's 10:00 slot passed while no update was
+		# available, so next_auto_update_at still points at it
+		site = frappe._dict(
+			name="stale.frappe.cloud",
+			next_auto_update_at=datetime(2026, 10, 17, 10, 0),
+			auto_update_last_triggered_on=datetime(2026, 10, 17, 10, 0, 5),
+			update_trigger_time="10:00:00",
+			update_trigger_frequency="Daily",
+		)
+		module = "press.press.doctype.site_update.scheduled_auto_updates"
+		with patch(f"{module}.now_datetime", return_value=datetime(2026, 10, 18, 15, 0)), patch(
+			f"{module}.frappe.get_all", return_value=[site]
+		), patch(f"{module}.frappe.db.set_value") as set_value:
+			due = get_sites_due_for_auto_update({})
+
+		self.assertEqual(due, [site])
+		set_value.assert_not_called()
+
+	def test_site_created_after_todays_slot_is_not_updated_today(self):
+		site = frappe.new_doc("Site")
+		site.update({"update_trigger_time": "15:30:00", "update_trigger_frequency": "Daily"})
+		with patch("press.press.doctype.site.site.now_datetime", return_value=datetime(2026, 10, 18, 17, 0)):
+			site.set_next_auto_update_at()
+
+		self.assertEqual(site.next_auto_update_at, datetime(2026, 10, 19, 15, 30))
+
+	def test_windowed_run_skips_slots_that_passed_earlier_today(self):
+		site = frappe._dict(
+			name="late.frappe.cloud",
+			next_auto_update_at=datetime(2026, 10, 18, 15, 30),
+			auto_update_last_triggered_on=datetime(2026, 10, 17, 15, 30, 5),
+			update_trigger_time="15:30:00",
+			update_trigger_frequency="Daily",
+		)
+		module = "press.press.doctype.site_update.scheduled_auto_updates"
+		with patch(f"{module}.frappe.get_all", return_value=[site]), patch(
+			f"{module}.frappe.db.set_value"
+		) as set_value:
+			with patch(f"{module}.now_datetime", return_value=datetime(2026, 10, 18, 15, 34)):
+				self.assertEqual(get_sites_due_for_auto_update({}, window=300), [site])
+			with patch(f"{module}.now_datetime", return_value=datetime(2026, 10, 18, 17, 0)):
+				self.assertEqual(get_sites_due_for_auto_update({}, window=300), [])
+
+		set_value.assert_not_called()
+
 
 def set_last_triggered_to_none(obj):
 	obj_copy = dict(obj)
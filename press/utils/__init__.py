@@ -91,10 +91,15 @@ def log_error(title, **kwargs):
 		)
 
 
+USER_TEAM_CONTEXT_TTL = 60 * 60
+
+
 def get_current_team(get_doc=False):
 	if frappe.session.user == "Guest":
 		frappe.throw("Not Permitted", frappe.AuthenticationError)
 
+	context = get_user_team_context(frappe.session.user)
+
 	if not hasattr(frappe.local, "request"):
 		# if this is not a request, send the current user as default team
 		# always use parent_team for background jobs
@@ -104,11 +109,7 @@ def get_current_team(get_doc=False):
 				{"user": frappe.session.user, "enabled": 1, "parent_team": ("is", "not set")},
 			)
 			if get_doc
-			else frappe.get_value(
-				"Team",
-				{"user": frappe.session.user, "enabled": 1, "parent_team": ("is", "not set")},
-				"name",
-			)
+			else context["root_team"]
 		)
 
 	system_user = frappe.session.data.user_type == "System User"
@@ -119,22 +120,22 @@ def get_current_team(get_doc=False):
 	# `team_name` getting injected by press.saas.api.whitelist_saas_api decorator
 	team = x_press_team if x_press_team else getattr(frappe.local, "team_name", "")
 
-	user_is_press_admin = frappe.db.exists("Has Role", {"parent": frappe.session.user, "role": "Press Admin"})
+	user_is_press_admin = "Press Admin" in context["roles"]
 
-	if not team and user_is_press_admin and frappe.db.exists("Team", {"user": frappe.session.user}):
+	if not team and user_is_press_admin and context["owns_team"]:
 		# if user has_role of Press Admin then just return current user as default team
 		return (
 			frappe.get_doc("Team", {"user": frappe.session.user, "enabled": 1})
 			if get_doc
-			else frappe.get_value("Team", {"user": frappe.session.user, "enabled": 1}, "name")
+			else context["own_team"]
 		)
 
 	# if team is not passed via header, get the default team for user
-	team = team if team else get_default_team_for_user(frappe.session.user)
+	team = team if team else context["default_team"]
 
-	if not system_user and not is_user_part_of_team(frappe.session.user, team):
+	if not system_user and team not in context["teams"]:
 		# if user is not part of the team, get the default team for user
-		team = get_default_team_for_user(frappe.session.user)
+		team = context["default_team"]
 
 	if not team:
 		frappe.throw(
@@ -142,7 +143,8 @@ def get_current_team(get_doc=False):
 			frappe.AuthenticationError,
 		)
 
-	if not frappe.db.exists("Team", {"name": team, "enabled": 1}):
+	# System users can pass any team, which won't be in their context
+	if team not in context["enabled_teams"] and not frappe.db.exists("Team", {"name": team, "enabled": 1}):
 		frappe.throw("Invalid Team", frappe.AuthenticationError)
 
 	if get_doc:
@@ -151,9 +153,81 @@ def get_current_team(get_doc=False):
 	return team
 
 
+def get_user_team_context(user: str) -> dict:
+	"""
+	Returns the teams and roles of user used to resolve the current team.
+	Cached in Redis until a Team of the user or the User itself is updated.
+	"""
+	key = f"user_team_context:{user}"
+	if context := frappe.cache.get_value(key):
+		return context
+
+	teams = frappe.get_all("Team Member", {"parenttype": "Team", "user": user}, pluck="parent")
+	own_team = frappe.get_value("Team", {"user": user, "enabled": 1}, "name")
+	enabled_teams = [own_team] if own_team else []
+	if teams:
+		enabled_teams += frappe.get_all("Team", {"name": ("in", teams), "enabled": 1}, pluck="name")
+
+	context = {
+		"roles": frappe.get_all("Has Role", {"parenttype": "User", "parent": user}, pluck="role"),
+		"teams": teams,
+		"enabled_teams": enabled_teams,
+		"own_team": own_team,
+		"owns_team": bool(frappe.db.exists("Team", {"user": user})),
+		"root_team": frappe.get_value(
+			"Team",
+			{"user": user, "enabled": 1, "parent_team": ("is", "not set")},
+			"name",
+		),
+		"default_team": get_default_team_for_user(user),
+	}
+	frappe.cache.set_value(key, context, expires_in_sec=USER_TEAM_CONTEXT_TTL)
+	return context
+
+
+def clear_user_team_context(users: str | list[str] | set[str]):
+	"""
+	Clears the cached team context of users now and again after commit, since
+	a concurrent request can rebuild it from the not yet committed state.
+	"""
+	if isinstance(users, str):
+		users = [users]
+
+	keys = [f"user_team_context:{user}" for user in users if user]
+	if not keys:
+		return
+
+	frappe.cache.delete_value(keys)
+	frappe.db.after_commit.add(lambda: frappe.cache.delete_value(keys))
+
+
+class CurrentTeam:
+	"""
+	Returned by `frappe.local.team()`. `name` is known without loading the
+	Team doc, which is fetched on first access of any other attribute.
+	"""
+
+	def __init__(self, name: str):
+		self.name = name
+		self._doc = None
+
+	def __getattr__(self, attr):
+		if attr.startswith("__") or attr == "_doc":
+			raise AttributeError(attr)
+
+		if self._doc is None:
+			self._doc = frappe.get_doc("Team", self.name)
+		return getattr(self._doc, attr)
+
+	def __str__(self):
+		return f"Team({self.name})"
+
+
 def _get_current_team():
 	if not getattr(frappe.local, "_current_team", None):
-		frappe.local._current_team = get_current_team(get_doc=True)
+		if not (team := get_current_team()):
+			raise frappe.DoesNotExistError("Team not found")
+		frappe.local._current_team = CurrentTeam(team)
 	return frappe.local._current_team
 
 
@@ -165,7 +239,7 @@ def has_role(role, user=None):
 	if not user:
 		user = frappe.session.user
 
-	return frappe.db.exists("Has Role", {"parenttype": "User", "parent": user, "role": role})
+	return role in get_user_team_context(user)["roles"]
 
 
 @functools.lru_cache(maxsize=1024)
@@ -291,6 +365,58 @@ def chunk(iterable, size):
 		yield iterable[i : i + size]
 
 
+def bulk_set_values(doctype: str, updates: dict[str, dict], update_modified=True, chunk_size=100):
+	"""Update many rows of `doctype` with one UPDATE statement per chunk
+
+	`updates` maps document names to the field values to set on them. Every
+	dict must have the same keys. Like `frappe.db.set_value` this skips
+	document hooks and validation.
+	"""
+	from frappe.query_builder import Case
+
+	if not updates:
+		return
+
+	table = frappe.qb.DocType(doctype)
+	fields = list(next(iter(updates.values())).keys())
+	names = list(updates)
+	for names_chunk in chunk(names, chunk_size):
+		query = frappe.qb.update(table).where(table.name.isin(names_chunk))
+		for field in fields:
+			case = Case()
+			for name in names_chunk:
+				case = case.when(table.name == name, updates[name][field])
+			query = query.set(table[field], case)
+		if update_modified:
+			query = query.set(table.modified, frappe.utils.now()).set(table.modified_by, frappe.session.user)
+		query.run()
+
+
+def bulk_insert_docs(docs: list, chunk_size=1000):
+	"""Insert new documents and their child rows with one INSERT per doctype per chunk
+
+	Only naming runs; like `frappe.db.bulk_insert` this skips validation and
+	document hooks. A `creation` already set on a document is kept.
+	"""
+	now = frappe.utils.now()
+	user = frappe.session.user
+	rows: dict[str, list[dict]] = {}
+	for doc in docs:
+		doc.set_new_name()
+		doc.set_parent_in_children()
+		for d in [doc, *doc.get_all_children()]:
+			d.owner = d.modified_by = user
+			d.creation = d.creation or now
+			d.modified = now
+			rows.setdefault(d.doctype, []).append(d.get_valid_dict(convert_dates_to_str=True))
+
+	for doctype, values in rows.items():
+		fields = list(values[0])
+		frappe.db.bulk_insert(
+			doctype, fields, [[row[field] for field in fields] for row in values], chunk_size=chunk_size
+		)
+
+
 @cache(seconds=1800)
 def get_minified_script():
 	migration_script = "../apps/press/press/scripts/migrate.py"
@@ -0,0 +1,98 @@
+# Copyright (c) 2026, Frappe and contributors
+# For license information, please see license.txt
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+
+import frappe
+import requests
+from frappe.utils.password import get_decrypted_password
+from requests.adapters import HTTPAdapter
+
+PROMETHEUS_RESULT_TTL = 60
+
+
+class PrometheusClient:
+	"""Process wide keep-alive session to the monitor server's Prometheus
+
+	The monitor server and its password are re-read every `auth_ttl` seconds and
+	the session is rebuilt if either has changed.
+	"""
+
+	pool_maxsize = 8
+	auth_ttl = 300
+	timeout = 60
+
+	def __init__(self):
+		self.sessions = {}
+		self.lock = threading.Lock()
+
+	def get_session(self) -> frappe._dict | None:
+		entry = self.sessions.get(frappe.local.site)
+		if entry and entry.expires_at > time.monotonic():
+			return entry
+
+		monitor_server = frappe.db.get_single_value("Press Settings", "monitor_server")
+		if not monitor_server:
+			return None
+
+		password = get_decrypted_password("Monitor Server", monitor_server, "grafana_password")
+		if entry and entry.monitor_server == monitor_server and entry.password == password:
+			entry.expires_at = time.monotonic() + self.auth_ttl
+			return entry
+
+		session = requests.Session()
+		session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize))
+		session.auth = ("frappe", password)
+		new_entry = frappe._dict(
+			monitor_server=monitor_server,
+			password=password,
+			session=session,
+			expires_at=time.monotonic() + self.auth_ttl,
+		)
+		with self.lock:
+			if entry := self.sessions.pop(frappe.local.site, None):
+				entry.session.close()
+			self.sessions[frappe.local.site] = new_entry
+		return new_entry
+
+	def get(self, path: str, params: dict) -> list[dict]:
+		"""Return the `result` of a Prometheus API response, empty if there's no monitor server"""
+		entry = self.get_session()
+		if not entry:
+			return []
+
+		url = f"https://{entry.monitor_server}/prometheus/api/v1/{path}"
+		response = entry.session.get(url, params=params, timeout=self.timeout)
+		return response.json()["data"]["result"]
+
+	def query(self, query: str, time: float | None = None) -> list[dict]:
+		params = {"query": query}
+		if time is not None:
+			params["time"] = time
+		return self.get("query", params)
+
+	def query_range(self, query: str, start: float, end: float, step: str) -> list[dict]:
+		return self.get("query_range", {"query": query, "start": start, "end": end, "step": step})
+
+
+prometheus = PrometheusClient()
+
+
+def get_values_by_instance(query: str, label: str) -> dict[str, dict[str, float]]:
+	"""Evaluate an instant `query` across all servers and map instance -> `label` value -> value
+
+	Sweeps over many servers look up one server at a time, so the whole result is
+	cached for `PROMETHEUS_RESULT_TTL` seconds and the query is sent only once.
+	"""
+	cache_key = f"prometheus_instant:{hashlib.sha1(f'{query}:{label}'.encode()).hexdigest()}"
+	values = frappe.cache.get_value(cache_key)
+	if values is None:
+		values = {}
+		for series in prometheus.query(query):
+			metric = series["metric"]
+			values.setdefault(metric.get("instance"), {})[metric.get(label)] = float(series["value"][1])
+		frappe.cache.set_value(cache_key, values, expires_in_sec=PROMETHEUS_RESULT_TTL)
+	return values